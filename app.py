@@ -2,13 +2,24 @@
 from dotenv import load_dotenv
 
 load_dotenv()
-from flask import Flask, send_from_directory, abort 
-from flask_wtf import CSRFProtect
-from flask_login import LoginManager
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 from extensions import db, login_manager, csrf
+from jobs import job_queue
+from summary_cache import summary_cache
+from summarizer import summarizer_service
+from media import send_media
+from storage import blob_store, attach_material
+from metrics import metrics
+from fragment_cache import fragment_cache
+from user_cache import user_cache
+from database import configure_engines, pool_samples
+from assets import assets
+from passwords import passwords
+from login_throttle import login_throttle
 import os
-from sqlalchemy import inspect, text
+import click
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'mp3', 'mp4'}
@@ -21,10 +32,32 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['ALLOWED_EXTENSIONS'] = ALLOWED_EXTENSIONS
     app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+    if app.config['PROXY_HOPS']:
+        # request.remote_addr is then the client, which the login throttle counts per address
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_HOPS'], x_proto=app.config['PROXY_HOPS'])
 
+    configure_engines(app)
     db.init_app(app)
     login_manager.init_app(app) 
     csrf.init_app(app)
+    job_queue.init_app(app)
+    summary_cache.init_app(app)
+    summarizer_service.init_app(app)
+    blob_store.init_app(app)
+    metrics.init_app(app)
+    fragment_cache.init_app(app)
+    user_cache.init_app(app)
+    assets.init_app(app)
+    passwords.init_app(app)
+    login_throttle.init_app(app)
+    metrics.register_collector(job_queue.metric_samples)
+    metrics.register_collector(summary_cache.metric_samples)
+    metrics.register_collector(summarizer_service.metric_samples)
+    metrics.register_collector(fragment_cache.metric_samples)
+    metrics.register_collector(user_cache.metric_samples)
+    metrics.register_collector(pool_samples)
+    metrics.register_collector(passwords.metric_samples)
+    metrics.register_collector(login_throttle.metric_samples)
 
 
     login_manager.login_view = 'auth.login'  
@@ -35,31 +68,133 @@ def create_app():
     from routes.students import students_bp
     from routes.courses import courses_bp
     from routes.main import main_bp 
+    from routes.uploads import uploads_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(students_bp, url_prefix="/students")
     app.register_blueprint(courses_bp, url_prefix="/courses")
     app.register_blueprint(main_bp)
+    app.register_blueprint(uploads_bp, url_prefix="/upload-sessions")
 
     @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
-        try:
-            upload_dir = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
-            return send_from_directory(upload_dir, filename, as_attachment=False)
-        except FileNotFoundError:
-             abort(404)
-
+        upload_dir = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+        return send_media(upload_dir, filename)
+
+    @app.cli.command('reindex-courses')
+    def reindex_courses():
+        """Queues a search-index job for every course."""
+        from models import Course
+        for course in Course.query.all():
+            job_queue.enqueue('index', course)
+        db.session.commit()
+        click.echo("Queued index jobs; they run in the app's job workers.")
+
+    @app.cli.command('reconcile-counters')
+    def reconcile_counters():
+        """Recomputes the enrollment counters and the dashboard totals from the tables they count."""
+        from counters import recount, recount_totals
+        from models import Course, Student
+        connection = db.session.connection()
+        courses, students = recount(connection, Course), recount(connection, Student)
+        totals = recount_totals(connection)
+        db.session.commit()
+        click.echo(f"Fixed the enrollment count of {courses} course(s) and {students} student(s), and {totals} total(s).")
+
+    @app.cli.command('clear-fragment-cache')
+    def clear_fragment_cache():
+        """Drops every cached page fragment."""
+        fragment_cache.clear()
+        click.echo("Fragment cache cleared.")
+
+    @app.cli.command('build-assets')
+    @click.option('--offline', is_flag=True, help="Do not download missing vendor files; they stay on the CDN.")
+    @click.option('--refresh', is_flag=True, help="Download vendor files again even if present.")
+    def build_assets(offline, refresh):
+        """Vendors and fingerprints static files and precompiles templates into the bytecode cache."""
+        if not offline:
+            fetched, failed = assets.fetch_vendor(refresh=refresh)
+            click.echo(f"Fetched {len(fetched)} vendor file(s).")
+            if failed:
+                click.echo(f"{len(failed)} vendor file(s) could not be fetched and will load from the CDN.")
+        manifest = assets.build()
+        click.echo(f"Fingerprinted {len(manifest)} static file(s) into {assets.dist_dir}.")
+        if app.config['TEMPLATE_CACHE_DIR']:
+            click.echo(f"Compiled {assets.compile_templates()} template(s) into {app.config['TEMPLATE_CACHE_DIR']}.")
+
+    @app.cli.command('gc-blobs')
+    def gc_blobs():
+        """Deletes stored files that no course has referenced for BLOB_GC_GRACE seconds."""
+        from resumable import expire_uploads
+        expired = expire_uploads()
+        removed = blob_store.collect_garbage()
+        click.echo(f"Expired {expired} abandoned upload(s); removed {removed} unreferenced file(s).")
+
+    @app.cli.command('store-legacy-uploads')
+    def store_legacy_uploads():
+        """Moves materials saved under their original filename into the blob store."""
+        from models import Course
+        migrated = set()
+        for course in Course.query.filter(Course.material_path.isnot(None), Course.material_blob_id.is_(None)).all():
+            legacy_path = os.path.join(blob_store.root, course.material_path)
+            if not os.path.isfile(legacy_path):
+                click.echo(f"Course {course.id}: {course.material_path} not found, skipped.")
+                continue
+            name = course.material_path
+            with open(legacy_path, 'rb') as f:
+                blob = blob_store.save(f, name.rsplit('.', 1)[-1])
+            attach_material(course, blob, name)
+            db.session.commit()
+            migrated.add(legacy_path)
+        for legacy_path in migrated:
+            os.remove(legacy_path)
+        click.echo(f"Stored {len(migrated)} legacy file(s).")
+
+    @app.cli.command('migrate')
+    @click.option('--target', type=int, help="Stop after this schema version.")
+    @click.option('--status', is_flag=True, help="Only show the current version and pending migrations.")
+    def migrate_command(target, status):
+        """Brings the database schema up to date."""
+        from migrations import migrate, pending, current_version
+        if status:
+            with db.engine.connect() as connection:
+                click.echo(f"Schema version {current_version(connection)}.")
+                for version, description in pending(connection):
+                    click.echo(f"Pending {version}: {description}")
+            return
+        applied = migrate(db.engine, target=target, log=click.echo)
+        click.echo(f"Applied {len(applied)} migration(s)." if applied else "Schema is up to date.")
+
+    import counters  # registers the enrollment counter events
     with app.app_context():
-        import models
-        db.create_all()
+        from migrations import migrate, pending
+        if app.config['AUTO_MIGRATE']:
+            migrate(db.engine, log=app.logger.info)
+        else:
+            with db.engine.connect() as connection:
+                behind = pending(connection)
+            if behind:
+                app.logger.warning(f"Database schema is {len(behind)} migration(s) behind; run `flask migrate`.")
 
     upload_dir_abs = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
     os.makedirs(upload_dir_abs, exist_ok=True)
 
+    from utils import summarize_course_material, index_course_material
+    job_queue.register('summary', summarize_course_material, error_attr='material_summary')
+    job_queue.register('index', index_course_material, status_attr=None)
+    from transcode import process_course_media
+    job_queue.register('media', process_course_media, status_attr='media_status')
+    job_queue.start()
+
+    if app.config['WARMUP_ON_START']:
+        seconds = assets.warm_up()
+        app.logger.info(f"Warmed up templates in {seconds * 1000:.0f} ms")
+
     return app
 
 
 if __name__ == "__main__":
+    Config.WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") == "1"
     app = create_app()
     app.run(debug=True)
 
@@ -0,0 +1,225 @@
+# template bytecode cache, vendored fingerprinted static assets and start-up warmup
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import time
+import urllib.request
+from base64 import b64encode
+from flask import request, url_for
+from markupsafe import Markup
+from jinja2 import FileSystemBytecodeCache
+
+DIST = 'dist'
+# environ key marking the warmup request, which metrics leaves out
+WARMUP_ENVIRON = 'assets.warmup'
+BOOTSTRAP_CDN = 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist'
+FONTAWESOME_CDN = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0'
+# third-party assets served from static/vendor/ once `flask build-assets` has fetched them:
+# name -> (CDN url, Subresource Integrity hash); fetch_vendor refuses content that does not match
+VENDOR = {
+    'vendor/bootstrap/css/bootstrap.min.css': (
+        f'{BOOTSTRAP_CDN}/css/bootstrap.min.css',
+        'sha384-9ndCyUaIbzAi2FUVXJi0CjmCapSmO7SnpJef0486qhLnuZ2cdeRhO02iuK6FUUVM'),
+    'vendor/bootstrap/js/bootstrap.bundle.min.js': (
+        f'{BOOTSTRAP_CDN}/js/bootstrap.bundle.min.js',
+        'sha384-geWF76RCwLtnZ8qwWowPQNguL3RmwHVBC9FhGdlKrxdiJJigb/j/68SIy3Te4Bkz'),
+    'vendor/fontawesome/css/all.min.css': (
+        f'{FONTAWESOME_CDN}/css/all.min.css',
+        'sha512-9usAa10IRO0HhonpyAIVpjrylPvoDwiPUiKdWk5t3PyolY1cOd4DSE0Ga+ri4AuTroPR5aQvXU9xC6qOPnzFeg=='),
+    'vendor/fontawesome/webfonts/fa-solid-900.woff2': (
+        f'{FONTAWESOME_CDN}/webfonts/fa-solid-900.woff2',
+        'sha384-S46FmqZ47S5h3fMjlByi6EM1R//zc6OTMQtNCVwEKuk8RoJSUpjViXnIPQuBFZG/'),
+    'vendor/fontawesome/webfonts/fa-solid-900.ttf': (
+        f'{FONTAWESOME_CDN}/webfonts/fa-solid-900.ttf',
+        'sha384-M/hyedEsR1+cg5ImGfJFWBQq038c68dpWtpADWNHYurE2wqI3gRBV6sKiX2Q+6xc'),
+    'vendor/fontawesome/webfonts/fa-regular-400.woff2': (
+        f'{FONTAWESOME_CDN}/webfonts/fa-regular-400.woff2',
+        'sha384-0oBEwJwxzA2GSAdhmFtu95H/IktlISPyPn1QrPHWkSprdRx/awhNvKXWgsDzYLkF'),
+    'vendor/fontawesome/webfonts/fa-regular-400.ttf': (
+        f'{FONTAWESOME_CDN}/webfonts/fa-regular-400.ttf',
+        'sha384-sOCXV3/bWeJG/yVqjPdYCvrbRww1hfWgsb7TTQdAVu7BbHm2VmhTTPy3N3GGQzr5'),
+    'vendor/fontawesome/webfonts/fa-brands-400.woff2': (
+        f'{FONTAWESOME_CDN}/webfonts/fa-brands-400.woff2',
+        'sha384-K0oO3lgfzCR21mC2MtrmDvfaePYJ0kObdjG0XBaj9BpbrfNCvP7zfJePDUKYUfNg'),
+    'vendor/fontawesome/webfonts/fa-brands-400.ttf': (
+        f'{FONTAWESOME_CDN}/webfonts/fa-brands-400.ttf',
+        'sha384-y7y16nC7jZ8a61w+7TUAkRrn2JcLlRfiH8s3d4Bom0Rc24vOFFfHidJJ1u3PSf2+'),
+    'vendor/fontawesome/webfonts/fa-v4compatibility.woff2': (
+        f'{FONTAWESOME_CDN}/webfonts/fa-v4compatibility.woff2',
+        'sha384-pGzeCSsvTxg9ixjxqrpa2CfvXLOfZsbmJhb4ESMzSpVGxbmZT2q7Y8ToQnm1Ge44'),
+    'vendor/fontawesome/webfonts/fa-v4compatibility.ttf': (
+        f'{FONTAWESOME_CDN}/webfonts/fa-v4compatibility.ttf',
+        'sha384-nZitnY/s3LAvyV2jkrGM3TbWWsPikoLZ4rgbprNcn6itbC2iDW7U2aEHEadcZkLU'),
+}
+CSS_URL = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+
+
+class Assets:
+    """
+    Serves templates from a Jinja bytecode cache and static files under
+    content-hashed names listed in static/dist/manifest.json, with far-future
+    cache headers. Templates call asset_url('js/picker.js'); names missing from
+    the manifest fall back to the plain static file, or to the CDN for vendor files.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['assets'] = self
+        if app.config['TEMPLATE_CACHE_DIR']:
+            os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+        self.load_manifest()
+        app.add_template_global(self.url, 'asset_url')
+        app.add_template_global(self.integrity, 'asset_integrity')
+        app.after_request(self._cache_headers)
+
+    @property
+    def dist_dir(self):
+        return os.path.join(self.app.static_folder, DIST)
+
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.dist_dir, 'manifest.json'), encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        except ValueError as e:
+            self.app.logger.error(f"Ignoring unreadable asset manifest: {e}")
+            self.manifest = {}
+
+    def url(self, name):
+        if name in self.manifest:
+            return url_for('static', filename=f'{DIST}/{self.manifest[name]}')
+        if name in VENDOR:
+            return VENDOR[name][0]
+        return url_for('static', filename=name)
+
+    def integrity(self, name):
+        """integrity/crossorigin attributes for a tag whose asset_url(name) points at the CDN."""
+        if name not in VENDOR or self.url(name) != VENDOR[name][0]:
+            return Markup('')
+        return Markup(' integrity="{}" crossorigin="anonymous" referrerpolicy="no-referrer"').format(VENDOR[name][1])
+
+    def _cache_headers(self, response):
+        # fingerprinted names change with their content, so browsers may keep them forever
+        if request.endpoint == 'static' and request.view_args.get('filename', '').startswith(DIST + '/') \
+                and response.status_code in (200, 304):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = self.app.config['ASSET_MAX_AGE']
+            response.cache_control.immutable = True
+        return response
+
+    def template_names(self):
+        return [name for name in self.app.jinja_env.list_templates() if name.endswith('.html')]
+
+    def compile_templates(self):
+        """Loads every template, which compiles it into the bytecode cache if it is not there yet."""
+        names = self.template_names()
+        for name in names:
+            self.app.jinja_env.get_template(name)
+        return len(names)
+
+    def fetch_vendor(self, refresh=False):
+        """Downloads missing vendor files into static/. Returns (fetched, failed) names."""
+        fetched, failed = [], []
+        for name, (source, integrity) in VENDOR.items():
+            target = os.path.join(self.app.static_folder, name)
+            if os.path.exists(target) and not refresh:
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                with urllib.request.urlopen(source, timeout=30) as response, open(target + '.tmp', 'wb') as f:
+                    shutil.copyfileobj(response, f)
+                if not _matches(target + '.tmp', integrity):
+                    os.remove(target + '.tmp')
+                    raise OSError("content does not match its integrity hash")
+                os.replace(target + '.tmp', target)
+                fetched.append(name)
+            except OSError as e:
+                self.app.logger.warning(f"Could not fetch {source}: {e}")
+                failed.append(name)
+        return fetched, failed
+
+    def build(self):
+        """
+        Copies every static file to static/dist/ under a name carrying a hash of its
+        content and writes the manifest. url() references inside CSS are rewritten to
+        the hashed names first, so a stylesheet's hash covers its fonts and images.
+        """
+        static = self.app.static_folder
+        sources = []
+        for root, dirs, files in os.walk(static):
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != self.dist_dir]
+            for filename in files:
+                name = os.path.relpath(os.path.join(root, filename), static).replace(os.sep, '/')
+                if not filename.startswith('.') and not filename.endswith('.tmp'):
+                    sources.append(name)
+        # stylesheets last, once the files they point at have their hashed names
+        sources.sort(key=lambda name: (name.endswith('.css'), name))
+
+        manifest = {}
+        for name in sources:
+            with open(os.path.join(static, name), 'rb') as f:
+                content = f.read()
+            if name.endswith('.css'):
+                content = self._rewrite_css(name, content.decode('utf-8'), manifest).encode('utf-8')
+            stem, ext = posixpath.splitext(name)
+            hashed = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+            target = os.path.join(self.dist_dir, hashed)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target + '.tmp', 'wb') as f:
+                    f.write(content)
+                os.replace(target + '.tmp', target)
+            manifest[name] = hashed
+
+        # earlier builds stay in dist/ for pages still open in a browser during a deploy
+        os.makedirs(self.dist_dir, exist_ok=True)
+        with open(os.path.join(self.dist_dir, 'manifest.json.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(os.path.join(self.dist_dir, 'manifest.json.tmp'), os.path.join(self.dist_dir, 'manifest.json'))
+        self.manifest = manifest
+        return manifest
+
+    def _rewrite_css(self, name, css, manifest):
+        directory = posixpath.dirname(name)
+
+        def replace(match):
+            reference = match.group(2)
+            path = re.split(r'[?#]', reference, maxsplit=1)[0]
+            target = posixpath.normpath(posixpath.join(directory, path))
+            if re.match(r'^([a-z]+:|/)', path) or target not in manifest:
+                return match.group(0)
+            return f"url({posixpath.relpath(manifest[target], directory)}{reference[len(path):]})"
+
+        return CSS_URL.sub(replace, css)
+
+    def warm_up(self):
+        """
+        Compiles (or loads from the bytecode cache) every template and serves one real
+        request, so the first user after a worker starts does not pay for either.
+        Returns the seconds spent.
+        """
+        start = time.perf_counter()
+        self.compile_templates()
+        self.app.test_client().get(self.app.config['WARMUP_PATH'], environ_base={WARMUP_ENVIRON: True})
+        return time.perf_counter() - start
+
+
+def _matches(path, integrity):
+    algorithm, expected = integrity.split('-', 1)
+    with open(path, 'rb') as f:
+        return b64encode(hashlib.new(algorithm, f.read()).digest()).decode('ascii') == expected
+
+
+assets = Assets()
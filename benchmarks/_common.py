@@ -0,0 +1,16 @@
+# helpers shared by the benchmark scripts; correctness is covered by tests/, not here
+
+FIRST = ["Anna", "Ivan", "Dana", "Aruzhan", "Timur", "Maria", "Nurlan", "Elena", "Sergei", "Aigerim", "Oleg", "Zarina"]
+LAST = ["Petrov", "Ivanova", "Sadykov", "Kim", "Nazarbayeva", "Smirnov", "Akhmetov", "Lee", "Bekova", "Orlov", "Tsoi"]
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else 0.0
+
+
+def check(condition, message):
+    """Asserts a performance expectation: prints it, or exits with status 1 if it does not hold."""
+    if not condition:
+        raise SystemExit(f"FAIL: {message}")
+    print(f"ok   {message}")
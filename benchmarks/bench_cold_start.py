@@ -0,0 +1,114 @@
+# benchmark: time to first response of a freshly started worker
+#
+# Starts a new Python process per run and measures create_app(), the first
+# response (GET /login) and the first course and student detail pages, in three
+# setups: no template bytecode cache and no warmup (before), a bytecode cache
+# filled by `flask build-assets`, and the cache plus the start-up warmup.
+#
+#   python benchmarks/bench_cold_start.py [--runs 5]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from _common import check
+
+START = time.perf_counter()
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAGES = ('/courses/1', '/students/1')
+
+
+def child():
+    from app import create_app
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    ready = time.perf_counter()
+    client = app.test_client()
+    timings = {'create_app_ms': (ready - START) * 1000}
+    start = time.perf_counter()
+    client.get('/login')
+    timings['first_response_ms'] = (time.perf_counter() - start) * 1000
+    client.post('/login', data={'username': 'bench', 'password': 'bench-password'})
+    for page in PAGES:
+        start = time.perf_counter()
+        response = client.get(page)
+        timings[f'first {page} ms'] = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise SystemExit(f"FAIL: {page} returned {response.status_code}")
+    print(json.dumps(timings))
+
+
+def environment(db_path, cache_dir, warmup):
+    return dict(
+        os.environ, DATABASE_URI=f"sqlite:///{db_path}", JOB_WORKERS='0',
+        TEMPLATE_CACHE_DIR=cache_dir, WARMUP_ON_START='1' if warmup else '0'
+    )
+
+
+def measure(env, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], env=env, cwd=ROOT,
+                                check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(r[key] for r in results) for key in results[0]}
+
+
+def setup(db_path, cache_dir):
+    os.environ.update(environment(db_path, cache_dir, warmup=False), AUTO_MIGRATE='1')
+    from datetime import date
+    from app import create_app
+    from extensions import db
+    from models import User, Course, Student
+    from assets import assets
+    app = create_app()
+    with app.app_context():
+        user = User(username='bench')
+        user.set_password('bench-password')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Course(title='Harmony I', start_date=date(2025, 9, 1), user_id=user.id))
+        db.session.add(Student(first_name='Anna', last_name='Ivanova', email='anna@example.org'))
+        db.session.commit()
+        return assets.compile_templates()
+
+
+def main():
+    if '--child' in sys.argv:
+        return child()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path, cache_dir = os.path.join(workdir, 'bench.db'), os.path.join(workdir, 'templates')
+    compiled = setup(db_path, cache_dir)  # what `flask build-assets` does for templates
+    print(f"compiled {compiled} templates into the bytecode cache")
+
+    setups = [
+        ('no cache, no warmup', environment(db_path, '', warmup=False)),
+        ('bytecode cache', environment(db_path, cache_dir, warmup=False)),
+        ('bytecode cache + warmup', environment(db_path, cache_dir, warmup=True)),
+    ]
+    rows = [(name, measure(env, args.runs)) for name, env in setups]
+    keys = list(rows[0][1])
+    print(f"\n{'median of ' + str(args.runs) + ' runs':<26}" + "".join(f"{key:>22}" for key in keys))
+    for name, row in rows:
+        print(f"{name:<26}" + "".join(f"{row[key]:>22.1f}" for key in keys))
+    print()
+
+    before, cached, warmed = (row for _, row in rows)
+    for page in PAGES:
+        key = f'first {page} ms'
+        check(cached[key] < before[key], f"the bytecode cache speeds up the first {page}")
+        check(warmed[key] < before[key], f"with warmup the first {page} skips template compilation")
+    check(warmed['first_response_ms'] < before['first_response_ms'], "with warmup the first response is faster")
+
+
+if __name__ == '__main__':
+    main()
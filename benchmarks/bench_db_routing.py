@@ -0,0 +1,106 @@
+# benchmark: concurrent requests against a small connection pool, with and without a replica
+#
+# primary.db and a copy of it, replica.db, stand in for MySQL primary and replica.
+# Several threads request a @read_only page (courses.list) and a primary page
+# (courses.search) at each pool size; pool waits come from /metrics.
+# tests/test_db_routing.py covers which database serves which request.
+#
+#   python benchmarks/bench_db_routing.py [--threads 8] [--requests 25] [--pool-sizes 1,10]
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAGES = ('/courses/', '/courses/search?q=course')
+
+
+def pool_wait(metrics, pool):
+    """(checkouts, seconds waited) for the pool, from the /metrics text."""
+    count = re.search(rf'db_pool_wait_seconds_count\{{pool="{pool}"\}} (\S+)', metrics)
+    total = re.search(rf'db_pool_wait_seconds_sum\{{pool="{pool}"\}} (\S+)', metrics)
+    return (float(count.group(1)), float(total.group(1))) if count else (0.0, 0.0)
+
+
+def run(app, threads, requests):
+    errors = []
+
+    def browse():
+        client = app.test_client()
+        client.post('/login', data={'username': 'bench', 'password': 'bench-password'})
+        for i in range(requests):
+            if client.get(PAGES[i % len(PAGES)]).status_code != 200:
+                errors.append(1)
+
+    workers = [threading.Thread(target=browse) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise SystemExit(f"{len(errors)} request(s) failed; the timings are not comparable")
+    return threads * requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=25)
+    parser.add_argument('--pool-sizes', default='1,10')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    primary, replica = os.path.join(tmp, 'primary.db'), os.path.join(tmp, 'replica.db')
+    os.environ['DATABASE_URI'] = f"sqlite:///{primary}"
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['AUTO_MIGRATE'] = '1'
+    os.environ['WARMUP_ON_START'] = '0'
+    from config import Config
+    from app import create_app
+    from extensions import db
+    from models import User, Course
+
+    app = create_app()
+    with app.app_context():
+        user = User(username='bench')
+        user.set_password('bench-password')
+        db.session.add(user)
+        db.session.add_all([Course(title=f'Course {i}', start_date=date(2025, 1, 1)) for i in range(200)])
+        db.session.commit()
+        db.engine.dispose()
+    shutil.copyfile(primary, replica)
+
+    Config.DB_MAX_OVERFLOW = 0
+    Config.FRAGMENT_CACHE_BACKEND = 'none'  # every request goes to a database
+    print(f"{'setup':<26}{'req/s':>10}{'avg wait ms':>14}")
+    for replica_uri in (None, f"sqlite:///{replica}"):
+        for size in (int(s) for s in args.pool_sizes.split(',')):
+            Config.DATABASE_REPLICA_URI = replica_uri
+            Config.DB_POOL_SIZE = size
+            app = create_app()
+            app.config['WTF_CSRF_ENABLED'] = False
+            client = app.test_client()
+            before = {pool: pool_wait(client.get('/metrics').get_data(as_text=True), pool)
+                      for pool in ('primary', 'replica')}
+            rate = run(app, args.threads, args.requests)
+            after = client.get('/metrics').get_data(as_text=True)
+            count = total = 0.0
+            for pool in ('primary', 'replica'):
+                pool_count, pool_total = pool_wait(after, pool)
+                count += pool_count - before[pool][0]
+                total += pool_total - before[pool][1]
+            label = f"{'replica' if replica_uri else 'primary only'}, pool of {size}"
+            print(f"{label:<26}{rate:>10.1f}{total * 1000 / max(count, 1):>14.2f}")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
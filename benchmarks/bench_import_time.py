@@ -0,0 +1,83 @@
+# benchmark: import time of the web app, with a budget
+#
+# Runs `python -X importtime` on `from app import create_app; create_app()` in
+# fresh processes against an already migrated database and reports the slowest
+# top-level imports. Fails if the median total exceeds --budget-ms. Also shows
+# what the lazily imported modules (PyMuPDF, the Gemini client) would add;
+# tests/test_imports.py checks that start-up does not import them.
+#
+#   python benchmarks/bench_import_time.py [--runs 5] [--budget-ms 1200] [--top 15]
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from _common import check
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY = ('fitz', 'pymupdf', 'google.generativeai')
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+STARTUP = "from app import create_app; create_app()"
+
+
+def run(code, env, importtime=True):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    result = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"FAIL: {code!r} exited with {result.returncode}\n{result.stderr[-2000:]}")
+    return result.stderr
+
+
+def parse(stderr):
+    """Returns ({module: cumulative us} for top-level imports, every module name imported)."""
+    top, names = {}, set()
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        names.add(name)
+        if len(indent) == 1:
+            top[name] = int(cumulative)
+    return top, names
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1200)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    env = dict(os.environ, DATABASE_URI=f"sqlite:///{db_path}", JOB_WORKERS='0', WARMUP_ON_START='0',
+               AUTO_MIGRATE='0')
+    run(STARTUP, dict(env, AUTO_MIGRATE='1'), importtime=False)  # migrate once, outside the measurement
+
+    totals, per_module = [], {}
+    for _ in range(args.runs):
+        top, _ = parse(run(STARTUP, env))
+        totals.append(sum(top.values()) / 1000)
+        for name, cumulative in top.items():
+            per_module.setdefault(name, []).append(cumulative / 1000)
+
+    print(f"{'top-level import':<40}{'median ms':>12}")
+    ranked = sorted(per_module.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, timings in ranked[:args.top]:
+        print(f"{name:<40}{statistics.median(timings):>12.1f}")
+    total = statistics.median(totals)
+    print(f"{'total':<40}{total:>12.1f}\n")
+
+    for name in LAZY:
+        try:
+            lazy_ms = parse(run(f"import {name}", env))[0].get(name, 0) / 1000
+        except SystemExit:
+            continue  # not installed here
+        print(f"{name} is imported lazily, saving {lazy_ms:.0f} ms at start-up")
+    check(total <= args.budget_ms, f"start-up imports take {total:.0f} ms, budget {args.budget_ms:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
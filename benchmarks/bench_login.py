@@ -0,0 +1,123 @@
+# benchmark: login throughput at concurrency 50, hashing inline vs in the process pool
+#
+# 50 threads log in repeatedly (a fresh client per login) while one logged-in
+# user keeps requesting /students/search.json. Inline hashing lets every login
+# thread run scrypt at once; the pool caps it at PASSWORD_HASH_PROCESSES, which
+# keeps the other user's requests responsive. tests/test_login.py covers
+# rehash-on-login, the login rate limit and the busy response.
+#
+#   python benchmarks/bench_login.py [--concurrency 50] [--logins 2] [--processes 2]
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from _common import check, percentile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'bench-password'
+
+
+def make_app(**settings):
+    from config import Config  # read once at import, so set the class attributes directly
+    defaults = {'PASSWORD_HASH_PROCESSES': 0, 'PASSWORD_HASH_QUEUE': 1000, 'PASSWORD_HASH_WAIT': 60,
+                'LOGIN_MAX_ATTEMPTS_PER_IP': 10 ** 6, 'LOGIN_MAX_FAILURES_PER_USER': 5}
+    for name, value in {**defaults, **settings}.items():
+        setattr(Config, name, value)
+    from app import create_app
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    return app
+
+
+def login(app, username, password=PASSWORD):
+    return app.test_client().post('/login', data={'username': username, 'password': password})
+
+
+def burst(app, concurrency, logins):
+    bystander = app.test_client()
+    bystander.post('/login', data={'username': 'user0', 'password': PASSWORD})
+    done = threading.Event()
+    login_times, other_times, statuses = [], [], []
+
+    def log_in(i):
+        for _ in range(logins):
+            start = time.perf_counter()
+            response = login(app, f'user{i}')
+            login_times.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    def browse():
+        while not done.is_set():
+            start = time.perf_counter()
+            bystander.get('/students/search.json?q=an')
+            other_times.append(time.perf_counter() - start)
+
+    browser = threading.Thread(target=browse)
+    threads = [threading.Thread(target=log_in, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    browser.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    browser.join()
+    return {
+        'logins/s': len(login_times) / elapsed,
+        'login p50 ms': percentile(login_times, 0.5) * 1000,
+        'login p95 ms': percentile(login_times, 0.95) * 1000,
+        'other p50 ms': percentile(other_times, 0.5) * 1000,
+        'other p95 ms': percentile(other_times, 0.95) * 1000,
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--logins', type=int, default=2, help="logins per thread")
+    parser.add_argument('--processes', type=int, default=2)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['AUTO_MIGRATE'] = '1'
+    os.environ['WARMUP_ON_START'] = '0'
+    app = make_app()
+    from extensions import db
+    from models import User
+    from passwords import passwords
+    from werkzeug.security import generate_password_hash
+    with app.app_context():
+        pwhash = generate_password_hash(PASSWORD, method=app.config['PASSWORD_HASH_METHOD'])
+        db.session.add_all([User(username=f'user{i}', password_hash=pwhash) for i in range(args.concurrency)])
+        db.session.commit()
+
+    rows = []
+    for name, settings in (
+        ('inline', {}),
+        (f'pool of {args.processes}', {'PASSWORD_HASH_PROCESSES': args.processes, 'PASSWORD_HASH_QUEUE': 16}),
+    ):
+        app = make_app(**settings)
+        rows.append((name, burst(app, args.concurrency, args.logins)))
+    keys = [key for key in rows[0][1] if key != 'statuses']
+    print(f"\n{'concurrency ' + str(args.concurrency):<18}" + "".join(f"{key:>15}" for key in keys))
+    for name, row in rows:
+        print(f"{name:<18}" + "".join(f"{row[key]:>15.1f}" for key in keys))
+    print(f"peak RSS of the web process: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB\n")
+
+    (_, inline), (_, pooled) = rows
+    failed = sum(status != 302 for _, row in rows for status in row['statuses'])
+    if failed:
+        raise SystemExit(f"{failed} login(s) failed; the timings above are not comparable")
+    check(pooled['other p95 ms'] < inline['other p95 ms'], "other requests stay faster while logins hash in the pool")
+    passwords.shutdown()
+
+
+if __name__ == '__main__':
+    main()
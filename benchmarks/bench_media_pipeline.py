@@ -0,0 +1,106 @@
+# benchmark: background media processing on generated sample files
+#
+# Generates a 720p test video and a stereo 320 kbps tone with ffmpeg's lavfi sources,
+# uploads them as course material and times the 'media' jobs and the rendition
+# sizes. tests/test_media_pipeline.py covers the outputs.
+#
+#   python benchmarks/bench_media_pipeline.py [--seconds 30] [--ffmpeg ffmpeg]
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def generate_samples(ffmpeg, seconds, workdir):
+    video = os.path.join(workdir, 'lesson.mp4')
+    audio = os.path.join(workdir, 'scales.mp3')
+    subprocess.run([
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '4M', '-c:a', 'aac', '-b:a', '192k', video
+    ], check=True)
+    subprocess.run([
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f"aevalsrc='sin(2*PI*(220+110*floor(t))*t)*(0.2+0.8*abs(sin(PI*t/4)))':s=44100:d={seconds}",
+        '-ac', '2', '-c:a', 'libmp3lame', '-b:a', '320k', audio
+    ], check=True)
+    return video, audio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=int, default=30)
+    parser.add_argument('--ffmpeg', default=os.getenv('FFMPEG_BINARY', 'ffmpeg'))
+    args = parser.parse_args()
+    if shutil.which(args.ffmpeg) is None:
+        raise SystemExit(f"ffmpeg not found: {args.ffmpeg}")
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['AUTO_MIGRATE'] = '1'
+    os.environ['FFMPEG_BINARY'] = args.ffmpeg
+    from app import create_app
+    from extensions import db
+    from jobs import job_queue
+    from models import Course
+    from storage import blob_store, attach_material, detach_material
+    from transcode import release_media
+
+    video, audio = generate_samples(args.ffmpeg, args.seconds, tmp)
+    app = create_app()
+    with app.app_context():
+        courses = []
+        for title, path in (('Video lesson', video), ('Audio lesson', audio)):
+            course = Course(title=title, start_date=date.today())
+            with open(path, 'rb') as f:
+                attach_material(course, blob_store.save(f, path.rsplit('.', 1)[1]), os.path.basename(path))
+            db.session.add(course)
+            db.session.flush()
+            job_queue.enqueue('media', course)
+            courses.append(course.id)
+        db.session.commit()
+
+        start = time.perf_counter()
+        job_queue.run_pending()
+        elapsed = time.perf_counter() - start
+        print(f"processed {len(courses)} uploads ({args.seconds}s each) in {elapsed:.1f}s\n")
+
+        video_course, audio_course = (db.session.get(Course, i) for i in courses)
+        for course in (video_course, audio_course):
+            if course.media_status != 'done':
+                raise SystemExit(f"{course.material_name}: media job ended as {course.media_status}")
+            original = os.path.getsize(blob_store.full_path(course.material_path))
+            light = os.path.getsize(blob_store.full_path(course.rendition_path))
+            print(f"{course.material_name}: rendition {light / 1024:.0f} KiB vs original "
+                  f"{original / 1024:.0f} KiB ({100 * (1 - light / original):.0f}% smaller)")
+
+        # an identical upload reuses the existing variants instead of transcoding again
+        twin = Course(title='Video lesson (copy)', start_date=video_course.start_date)
+        with open(video, 'rb') as f:
+            attach_material(twin, blob_store.save(f, 'mp4'), 'lesson.mp4')
+        db.session.add(twin)
+        db.session.flush()
+        job_queue.enqueue('media', twin)
+        db.session.commit()
+        start = time.perf_counter()
+        job_queue.run_pending()
+        print(f"identical upload processed in {time.perf_counter() - start:.2f}s")
+
+        for course in Course.query.all():
+            release_media(course)
+            detach_material(course)
+        db.session.commit()
+        blob_store.collect_garbage(grace_seconds=0)
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
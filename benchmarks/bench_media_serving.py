@@ -0,0 +1,78 @@
+# benchmark: serving uploaded media - full downloads, seeks (Range requests) and offload
+#
+# Measures throughput only; tests/test_media_serving.py covers correctness.
+#
+#   python benchmarks/bench_media_serving.py [--size-mb 64] [--requests 200]
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def throughput(label, func, count, nbytes=None):
+    start = time.perf_counter()
+    total = 0
+    for _ in range(count):
+        total += func()
+    elapsed = time.perf_counter() - start
+    rate = f"{total / elapsed / 1024 / 1024:9.1f} MB/s" if total else ""
+    print(f"{label:<34} {count / elapsed:9.1f} req/s {rate}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['AUTO_MIGRATE'] = '1'
+    os.environ['WARMUP_ON_START'] = '0'  # the legacy route is added after create_app
+    from flask import send_from_directory
+    from app import create_app
+
+    app = create_app()
+    upload_dir = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+    bench_dir = tempfile.mkdtemp(prefix='bench-media-', dir=upload_dir)
+    name = os.path.basename(bench_dir)
+    try:
+        data = os.urandom(args.size_mb * 1024 * 1024)
+        with open(os.path.join(bench_dir, 'lecture.mp4'), 'wb') as f:
+            f.write(data)
+        url = f'/uploads/{name}/lecture.mp4'
+
+        app.add_url_rule('/legacy/<path:filename>', 'legacy_uploaded_file',
+                         lambda filename: send_from_directory(upload_dir, filename, as_attachment=False))
+        client = app.test_client()
+        size = len(data)
+        seek = 1024 * 1024
+
+        def full(path):
+            return lambda: len(client.get(path).data)
+
+        def ranged(path):
+            def request():
+                start = random.randrange(0, size - seek)
+                return len(client.get(path, headers={'Range': f'bytes={start}-{start + seek - 1}'}).data)
+            return request
+
+        full_count = max(1, args.requests // 20)
+        throughput("legacy full download", full(f'/legacy/{name}/lecture.mp4'), full_count)
+        throughput("media full download", full(url), full_count)
+        throughput("media 1 MB seek (206)", ranged(url), args.requests)
+        app.config['MEDIA_OFFLOAD'] = 'x-accel'
+        throughput("x-accel offload (app side only)", lambda: len(client.get(url).data), args.requests)
+        app.config['MEDIA_OFFLOAD'] = ''
+    finally:
+        shutil.rmtree(bench_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
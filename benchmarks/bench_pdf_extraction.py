@@ -0,0 +1,72 @@
+# benchmark: PDF text extraction on a synthetic 500-page document
+#
+#   python benchmarks/bench_pdf_extraction.py [--pages 500] [--processes 4]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+from utils import extract_text_from_pdf, SUMMARY_MAX_CHARS
+
+
+def legacy_extract_text_from_pdf(pdf_path):
+    """The original implementation, kept here as the baseline."""
+    doc = fitz.open(pdf_path)
+    text = ""
+    for page_num in range(len(doc)):
+        page = doc.load_page(page_num)
+        text += page.get_text("text")
+    doc.close()
+    return text
+
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    line = "Allegro con brio. Exposition, development and recapitulation of the sonata form. "
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), f"Page {i + 1}\n" + line * 40, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def timed(label, func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<40} {best * 1000:9.1f} ms   {len(result):>10} chars")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic.pdf')
+        make_pdf(path, args.pages)
+        print(f"{args.pages} pages, {os.path.getsize(path) / 1024:.0f} KiB, best of {args.repeat}\n")
+
+        baseline = timed("legacy (text +=, all pages)", lambda: legacy_extract_text_from_pdf(path), args.repeat)
+        timed("streaming, all pages", lambda: extract_text_from_pdf(path), args.repeat)
+        budget = timed(f"streaming, budget {SUMMARY_MAX_CHARS} chars",
+                       lambda: extract_text_from_pdf(path, max_chars=SUMMARY_MAX_CHARS), args.repeat)
+        pooled = timed(f"process pool ({args.processes}), all pages",
+                       lambda: extract_text_from_pdf(path, processes=args.processes), args.repeat)
+
+        print(f"\nbudgeted speedup vs legacy: {baseline / budget:.1f}x")
+        print(f"process pool speedup vs legacy: {baseline / pooled:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# benchmark: student search at 100k rows, old contains() LIKE scan vs the search index
+#
+#   python benchmarks/bench_student_search.py [--students 100000] [--queries 200]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from _common import FIRST, LAST, percentile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(label, func, queries):
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        func(q)
+        timings.append(time.perf_counter() - start)
+    print(f"{label:<28} p50 {percentile(timings, 0.5) * 1000:8.2f} ms   p95 {percentile(timings, 0.95) * 1000:8.2f} ms")
+    return percentile(timings, 0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['AUTO_MIGRATE'] = '1'
+    from app import create_app
+    from extensions import db
+    from models import Student
+    from search import search_students, student_search_filter
+
+    app = create_app()
+    random.seed(42)
+    with app.app_context():
+        rows = []
+        for i in range(args.students):
+            first, last = random.choice(FIRST), random.choice(LAST)
+            rows.append({'first_name': f"{first}{i % 97}", 'last_name': f"{last}{i % 1013}",
+                         'email': f"{first.lower()}.{last.lower()}{i}@school.kz"})
+        start = time.perf_counter()
+        db.session.execute(Student.__table__.insert(), rows)
+        db.session.commit()
+        print(f"seeded {args.students} students in {time.perf_counter() - start:.1f}s\n")
+
+        queries = [random.choice([random.choice(LAST)[:4], f"{random.choice(FIRST)}{random.randrange(97)}",
+                                  f"{random.choice(LAST).lower()}{random.randrange(1013)}"])
+                   for _ in range(args.queries)]
+
+        def legacy(q):
+            return Student.query.filter(
+                (Student.first_name.contains(q)) | (Student.last_name.contains(q))
+            ).limit(50).all()
+
+        def listing(q):
+            return Student.query.filter(student_search_filter(q)).order_by(
+                Student.last_name, Student.first_name, Student.id).limit(50).all()
+
+        base = run("legacy contains() LIKE", legacy, queries)
+        run("indexed filter (list page)", listing, queries)
+        ranked = run("ranked typeahead (limit 10)", lambda q: search_students(q, limit=10), queries)
+        print(f"\ntypeahead speedup vs legacy (p50): {base / ranked:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# benchmark: SQL statements per request with and without the login user cache
+#
+# Logs in once, then requests a few @login_required pages N times with
+# USER_CACHE_BACKEND=none and =memory, counting statements from the Server-Timing
+# header. tests/test_user_cache.py covers invalidation.
+#
+#   python benchmarks/bench_user_loader.py [--requests 500]
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from _common import check
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERIES = re.compile(r'db;desc="(\d+) queries"')
+PAGES = ('/courses/', '/students/', '/students/search.json?q=an')
+
+
+def make_app(backend, db_path):
+    os.environ['DATABASE_URI'] = f"sqlite:///{db_path}"
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['AUTO_MIGRATE'] = '1'
+    from config import Config  # read once at import, so set the class attributes directly
+    Config.USER_CACHE_BACKEND = backend
+    Config.FRAGMENT_CACHE_BACKEND = 'none'
+    from app import create_app
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    return app
+
+
+def run(app, requests):
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench-password'})
+    queries, timings = [], []
+    for _ in range(requests):
+        for page in PAGES:
+            start = time.perf_counter()
+            response = client.get(page)
+            timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise SystemExit(f"FAIL: {page} returned {response.status_code}")
+            queries.append(int(QUERIES.search(response.headers['Server-Timing']).group(1)))
+    return statistics.mean(queries), statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app('none', db_path)
+    from extensions import db
+    from models import User
+    from user_cache import user_cache
+    with app.app_context():
+        user = User(username='bench')
+        user.set_password('bench-password')
+        db.session.add(user)
+        db.session.commit()
+
+    uncached_queries, uncached_ms = run(app, args.requests)
+    app = make_app('memory', db_path)
+    cached_queries, cached_ms = run(app, args.requests)
+    print(f"user cache off: {uncached_queries:.2f} statements/request, median {uncached_ms:.2f} ms")
+    print(f"user cache on:  {cached_queries:.2f} statements/request, median {cached_ms:.2f} ms")
+    print(f"hit rate {user_cache.stats()['hit_rate']:.1%}\n")
+    check(uncached_queries - cached_queries > 0.9, "the cache saves the per-request user SELECT")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+# load test: seeds a SQLite database and drives the real blueprints from several processes
+#
+#   python benchmarks/loadtest.py --students 100000 --courses 5000 --enrollments 1000000 \
+#       --processes 4 --requests 200 --save-baseline benchmarks/baseline.json
+#   python benchmarks/loadtest.py ... --compare benchmarks/baseline.json --tolerance 0.25
+#
+# The seeded database is kept as a template (--db) and copied for every run, so runs
+# start from the same data even though some scenarios write. Query counts come from
+# the Server-Timing header added by metrics.py. --compare exits with status 1 when an
+# endpoint's p95 is more than --tolerance slower than the baseline.
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from _common import FIRST, LAST, percentile  # noqa: E402
+
+TOPICS = ["Piano", "Violin", "Solfege", "Harmony", "Choir", "Guitar", "Composition", "Jazz", "Dombra", "Theory"]
+USERNAME = 'loadtest'
+PASSWORD = 'loadtest'
+QUERIES = re.compile(r'db;desc="(\d+) queries"')
+BATCH = 20000
+JSON_ENDPOINTS = {'students.search.json', 'courses.available_students.json', 'students.available_courses.json',
+                  'courses.enroll_bulk', 'main.dashboard.json'}
+
+
+def make_app(db_path):
+    os.environ['DATABASE_URI'] = f"sqlite:///{db_path}"
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['AUTO_MIGRATE'] = '1'
+    # Pool workers are daemonic and may not start a hashing pool of their own
+    os.environ['PASSWORD_HASH_PROCESSES'] = '0'
+    from app import create_app
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(db_path), 'uploads')
+    return app
+
+
+def seed(db_path, students, courses, enrollments):
+    app = make_app(db_path)
+    from extensions import db
+    from models import User, Student, Course, Enrollment
+
+    rng = random.Random(1)
+    with app.app_context():
+        user = User(username=USERNAME)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+
+        start = time.perf_counter()
+        for offset in range(0, students, BATCH):
+            db.session.execute(Student.__table__.insert(), [
+                {'first_name': f"{rng.choice(FIRST)}{i % 97}", 'last_name': f"{rng.choice(LAST)}{i % 1013}",
+                 'email': f"student{i}@school.kz"}
+                for i in range(offset, min(offset + BATCH, students))
+            ])
+        first_day = date(2024, 1, 1)
+        db.session.execute(Course.__table__.insert(), [
+            {'title': f"{rng.choice(TOPICS)} {i}", 'start_date': first_day + timedelta(days=i % 700), 'user_id': user.id}
+            for i in range(courses)
+        ])
+        # pair i -> (student i % S, course (31 * s + i // S) % C) is unique while enrollments <= S * C
+        for offset in range(0, enrollments, BATCH):
+            db.session.execute(Enrollment.__table__.insert(), [
+                {'student_id': i % students + 1, 'course_id': (31 * (i % students) + i // students) % courses + 1}
+                for i in range(offset, min(offset + BATCH, enrollments))
+            ])
+        from counters import recount, recount_totals
+        recount(db.session.connection(), Course)
+        recount(db.session.connection(), Student)
+        recount_totals(db.session.connection())
+        db.session.commit()
+        print(f"seeded {students} students, {courses} courses, {enrollments} enrollments "
+              f"in {time.perf_counter() - start:.1f}s")
+
+
+def scenarios(volumes):
+    students, courses = volumes['students'], volumes['courses']
+
+    def random_course(rng):
+        return rng.randint(1, courses)
+
+    def random_student(rng):
+        return rng.randint(1, students)
+
+    return {
+        'courses.list': lambda c, rng: c.get('/courses/'),
+        'courses.detail': lambda c, rng: c.get(f'/courses/{random_course(rng)}'),
+        'courses.search': lambda c, rng: c.get(f'/courses/search?q={rng.choice(TOPICS)}'),
+        'students.list': lambda c, rng: c.get('/students/'),
+        'students.list?q=': lambda c, rng: c.get(f'/students/?q={rng.choice(LAST)[:4]}'),
+        'students.search.json': lambda c, rng: c.get(f'/students/search.json?q={rng.choice(FIRST)}{rng.randrange(97)}'),
+        'students.detail': lambda c, rng: c.get(f'/students/{random_student(rng)}'),
+        'courses.available_students.json': lambda c, rng: c.get(
+            f'/courses/{random_course(rng)}/available_students.json?q={rng.choice(FIRST)[:3]}'),
+        'students.available_courses.json': lambda c, rng: c.get(
+            f'/students/{random_student(rng)}/available_courses.json?q={rng.choice(TOPICS)}'),
+        'courses.add_student_enrollment': lambda c, rng: c.post(
+            f'/courses/{random_course(rng)}/add_student/{random_student(rng)}'),
+        'courses.enroll_bulk': lambda c, rng: c.post(
+            f'/courses/{random_course(rng)}/enroll_bulk',
+            json={'student_ids': [random_student(rng) for _ in range(25)]}),
+        'main.dashboard.json': lambda c, rng: c.get('/dashboard.json'),
+        'courses.add(upload)': lambda c, rng: c.post('/courses/add', data={
+            'title': f"Load {rng.randrange(10 ** 9)}", 'start_date': '2025-09-01',
+            'material': (io.BytesIO(os.urandom(64 * 1024)), 'notes.txt')
+        }, content_type='multipart/form-data'),
+    }
+
+
+def failed(name, response):
+    """Errors, bounces to the login page and JSON endpoints answering with HTML."""
+    if response.status_code >= 400:
+        return True
+    if 300 <= response.status_code < 400 and urlsplit(response.location).path == '/login':
+        return True
+    return name in JSON_ENDPOINTS and not response.is_json
+
+
+def worker(args):
+    db_path, volumes, names, requests, seed_value = args
+    app = make_app(db_path)
+    client = app.test_client()
+    response = client.post('/login', data={'username': USERNAME, 'password': PASSWORD})
+    if response.status_code != 302 or urlsplit(response.location).path != '/':
+        # not SystemExit, which a Pool would swallow by restarting the worker
+        raise RuntimeError(f"login failed with {response.status_code}; the timings would be meaningless")
+    rng = random.Random(seed_value)
+    table = scenarios(volumes)
+    results = {name: {'timings': [], 'queries': [], 'errors': 0} for name in names}
+    for name in names:
+        table[name](client, rng)  # warm-up
+    for _ in range(requests):
+        for name in names:
+            start = time.perf_counter()
+            response = table[name](client, rng)
+            elapsed = time.perf_counter() - start
+            result = results[name]
+            result['timings'].append(elapsed)
+            if failed(name, response):
+                result['errors'] += 1
+            match = QUERIES.search(response.headers.get('Server-Timing', ''))
+            if match:
+                result['queries'].append(int(match.group(1)))
+    return results
+
+
+def summarize(merged):
+    report = {}
+    for name, result in merged.items():
+        timings = result['timings']
+        queries = result['queries']
+        report[name] = {
+            'requests': len(timings),
+            'errors': result['errors'],
+            'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+            'rps': round(len(timings) / sum(timings), 1) if timings else 0.0,
+            'queries_avg': round(sum(queries) / len(queries), 1) if queries else None,
+            'queries_max': max(queries) if queries else None,
+        }
+    return report
+
+
+def print_report(report, total, wall):
+    print(f"\n{'endpoint':<32}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}{'errors':>8}")
+    for name, row in report.items():
+        queries = '-' if row['queries_avg'] is None else f"{row['queries_avg']:g}"
+        print(f"{name:<32}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+              f"{row['rps']:>9.1f}{queries:>9}{row['errors']:>8}")
+    print(f"\n{total} requests in {wall:.1f}s: {total / wall:.1f} req/s overall")
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for name, row in report.items():
+        before = baseline['endpoints'].get(name)
+        if not before:
+            continue
+        if row['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f} -> {row['p95_ms']:.2f} ms")
+        if before.get('queries_max') is not None and (row['queries_max'] or 0) > before['queries_max']:
+            regressions.append(f"{name}: up to {row['queries_max']} queries (baseline {before['queries_max']})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--courses', type=int, default=5000)
+    parser.add_argument('--enrollments', type=int, default=1000000)
+    parser.add_argument('--db', help="seeded template database (created if missing)")
+    parser.add_argument('--processes', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--requests', type=int, default=100, help="requests per endpoint per process")
+    parser.add_argument('--endpoints', help="comma-separated subset of endpoint names")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save-baseline')
+    parser.add_argument('--compare')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    volumes = {'students': args.students, 'courses': args.courses, 'enrollments': args.enrollments}
+    if args.enrollments > args.students * args.courses:
+        parser.error("--enrollments cannot exceed students * courses")
+    template = args.db or os.path.join(
+        tempfile.gettempdir(), f"loadtest-{args.students}-{args.courses}-{args.enrollments}.db")
+    meta_path = template + '.json'
+    seeded = None
+    if os.path.exists(template) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            seeded = json.load(f)
+    if seeded != volumes:
+        for path in (template, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        seed(template, **volumes)
+        with open(meta_path, 'w') as f:
+            json.dump(volumes, f)
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'run.db')
+    shutil.copyfile(template, db_path)
+    names = list(scenarios(volumes))
+    if args.endpoints:
+        names = [n for n in names if n in args.endpoints.split(',')]
+
+    jobs = [(db_path, volumes, names, args.requests, args.seed + i) for i in range(args.processes)]
+    start = time.perf_counter()
+    if args.processes == 1:
+        results = [worker(jobs[0])]
+    else:
+        with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+            results = pool.map(worker, jobs)
+    wall = time.perf_counter() - start
+
+    merged = {name: {'timings': [], 'queries': [], 'errors': 0} for name in names}
+    for result in results:
+        for name, data in result.items():
+            merged[name]['timings'] += data['timings']
+            merged[name]['queries'] += data['queries']
+            merged[name]['errors'] += data['errors']
+    report = summarize(merged)
+    total = sum(row['requests'] for row in report.values())
+    print_report(report, total, wall)
+
+    output = {
+        'volumes': volumes,
+        'processes': args.processes,
+        'requests_per_endpoint': args.requests,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'throughput_rps': round(total / wall, 1),
+        'endpoints': report,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nno endpoint regressed by more than {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# bulk CSV/XLSX import and streaming CSV export
+import csv
+import io
+from itertools import islice
+from sqlalchemy import insert, select
+from werkzeug.datastructures import MultiDict
+from extensions import db
+from forms import StudentForm
+from models import Student
+from fragment_cache import fragment_cache
+from counters import add_totals
+
+STUDENT_COLUMNS = ('first_name', 'last_name', 'email')
+MAX_REPORTED_ERRORS = 500
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def _header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def iter_upload_rows(file):
+    """Yields one dict per data row of an uploaded .csv or .xlsx file, reading it incrementally."""
+    filename = (file.filename or '').lower()
+    if filename.endswith('.csv'):
+        reader = csv.reader(io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline=''))
+    elif filename.endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportFormatError('Excel import requires the openpyxl package; upload a CSV file instead.')
+        workbook = load_workbook(file.stream, read_only=True, data_only=True)
+        reader = workbook.active.iter_rows(values_only=True)
+    else:
+        raise ImportFormatError('Unsupported file type. Upload a .csv or .xlsx file.')
+
+    headers = [_header(h) for h in next(reader, [])]
+    missing = [c for c in STUDENT_COLUMNS if c not in headers]
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}.")
+    for values in reader:
+        if not values or all(v in (None, '') for v in values):
+            continue
+        yield {h: ('' if v is None else str(v).strip()) for h, v in zip(headers, values)}
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_students(rows, batch_size=500):
+    """
+    Validates rows with the StudentForm rules and inserts the valid ones batch by batch:
+    one SELECT per batch to find emails that already exist, one executemany INSERT and
+    one commit. Returns (inserted count, [(row number, message), ...]).
+    """
+    inserted = 0
+    errors = []
+    seen_emails = set()
+
+    def error(row_number, message):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append((row_number, message))
+
+    for batch in _chunks(enumerate(rows, start=2), batch_size):
+        valid = []
+        for row_number, row in batch:
+            form = StudentForm(formdata=MultiDict({c: row.get(c, '') for c in STUDENT_COLUMNS}), meta={'csrf': False})
+            if not form.validate():
+                messages = [f"{name}: {', '.join(errs)}" for name, errs in form.errors.items() if name != 'submit']
+                error(row_number, '; '.join(messages))
+                continue
+            email = form.email.data
+            if email in seen_emails:
+                error(row_number, f'Duplicate email in file: {email}')
+                continue
+            seen_emails.add(email)
+            valid.append((row_number, {c: getattr(form, c).data for c in STUDENT_COLUMNS}))
+
+        if not valid:
+            continue
+        emails = [values['email'] for _, values in valid]
+        existing = set(db.session.scalars(select(Student.email).where(Student.email.in_(emails))))
+        new_rows = []
+        for row_number, values in valid:
+            if values['email'] in existing:
+                error(row_number, f"Email address already exists: {values['email']}")
+            else:
+                new_rows.append(values)
+        if new_rows:
+            db.session.execute(insert(Student), new_rows)
+            add_totals(db.session.connection(), students=len(new_rows))  # a bulk INSERT skips the mapper events
+            fragment_cache.mark_changed(db.session, 'students')
+            db.session.commit()
+            inserted += len(new_rows)
+    return inserted, errors
+
+
+def stream_csv(header, statement, batch_size=1000):
+    """Yields CSV text for a SELECT, fetching rows from a server-side cursor in batches."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        writer.writerows(partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
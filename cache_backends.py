@@ -0,0 +1,161 @@
+# cache backends shared by the fragment and user caches
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemoryBackend:
+    """Per-process LRU with TTL. Other processes do not see its invalidations."""
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemBackend:
+    """One file per key, shared by every process on the host; written atomically."""
+
+    def __init__(self, directory, max_entries=5000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            return None
+        return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((time.time() + ttl if ttl else None, value), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _prune(self):
+        # oldest files go first once the directory holds more than max_entries
+        entries = []
+        for entry in os.scandir(self.directory):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                continue
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class RedisBackend:
+    """Any server speaking the Redis protocol (Redis, Valkey, KeyDB, a local stand-in)."""
+
+    def __init__(self, url, prefix):
+        if redis is None:
+            raise RuntimeError("The redis cache backend needs the 'redis' package.")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def get_many(self, keys):
+        values = self.client.mget([self.prefix + key for key in keys]) if keys else []
+        return [value.decode('utf-8') if value is not None else None for value in values]
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value.encode('utf-8'), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+def make_backend(kind, max_entries, directory, redis_url, prefix):
+    """Backend for a *_CACHE_BACKEND setting, or None when caching is off."""
+    if kind == 'memory':
+        return MemoryBackend(max_entries)
+    if kind == 'filesystem':
+        return FileSystemBackend(directory, max_entries)
+    if kind == 'redis':
+        return RedisBackend(redis_url, prefix)
+    if kind in ('', 'none'):
+        return None
+    raise ValueError(f"Unknown cache backend {kind!r}.")
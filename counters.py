@@ -0,0 +1,143 @@
+# denormalized enrollment counters, dashboard totals and the daily enrollment rollup
+from datetime import datetime
+from sqlalchemy import event, update, delete, select, func, insert
+from models import Course, Student, Enrollment, EnrollmentDaily, Total
+
+RECOUNT_BATCH = 1000
+TOTALS = {'courses': Course, 'students': Student, 'enrollments': Enrollment}
+
+
+def _count_column(model):
+    return Enrollment.course_id if model is Course else Enrollment.student_id
+
+
+def _add(connection, model, id, amount):
+    connection.execute(update(model).where(model.id == id).values(enrollment_count=model.enrollment_count + amount))
+
+
+def _batches(ids, size=RECOUNT_BATCH):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def add_daily(connection, counts, day, column):
+    """Adds counts ({course_id: n}) to the `column` ('enrolled' or 'unenrolled') of each (course, day) row."""
+    rows = [
+        {'course_id': course_id, 'day': day, 'enrolled': 0, 'unenrolled': 0, column: n}
+        for course_id, n in sorted(counts.items()) if n
+    ]
+    if not rows:
+        return
+    target = EnrollmentDaily.__table__.c[column]
+    # dialect modules load on first use; importing all of them costs start-up time
+    if connection.dialect.name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(EnrollmentDaily).values(rows)
+        statement = statement.on_duplicate_key_update({column: target + statement.inserted[column]})
+    else:
+        if connection.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(EnrollmentDaily).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=['course_id', 'day'], set_={column: target + statement.excluded[column]}
+        )
+    connection.execute(statement)
+
+
+def add_totals(connection, **amounts):
+    """Adds to the dashboard totals, e.g. add_totals(connection, students=25)."""
+    for name, amount in amounts.items():
+        if amount:
+            connection.execute(update(Total).where(Total.name == name).values(value=Total.value + amount))
+
+
+def recount_totals(connection):
+    """Sets every dashboard total to the real COUNT(*). Returns how many were off."""
+    stored = dict(connection.execute(select(Total.name, Total.value)).all())
+    fixed = 0
+    for name, model in TOTALS.items():
+        actual = connection.execute(select(func.count()).select_from(model)).scalar()
+        if name not in stored:
+            connection.execute(insert(Total).values(name=name, value=actual))
+        elif stored[name] != actual:
+            connection.execute(update(Total).where(Total.name == name).values(value=actual))
+        else:
+            continue
+        fixed += 1
+    return fixed
+
+
+def recount(connection, model, ids=None):
+    """
+    Sets enrollment_count of `model` (Course or Student) to the real COUNT(*) for
+    `ids`, or for every row in id-range batches. Returns how many rows were off.
+    """
+    actual = select(func.count(Enrollment.id)).where(_count_column(model) == model.id).scalar_subquery()
+    if ids is not None:
+        conditions = [model.id.in_(batch) for batch in _batches(sorted(ids))]
+    else:
+        low, high = connection.execute(select(func.min(model.id), func.max(model.id))).one()
+        conditions = [model.id.between(start, start + RECOUNT_BATCH - 1)
+                      for start in range(low, high + 1, RECOUNT_BATCH)] if low is not None else []
+    fixed = 0
+    for condition in conditions:
+        fixed += connection.execute(
+            update(model).where(condition, model.enrollment_count != actual).values(enrollment_count=actual)
+        ).rowcount
+    return fixed
+
+
+def enrollments_inserted(connection, rows, inserted):
+    """
+    Counter upkeep for a bulk INSERT of enrollment rows, which the mapper events
+    do not see. Counts are recomputed for the touched courses and students, so
+    rows a concurrent request inserted first are not counted twice; the rollup
+    adds `inserted` ({course_id: rows that went in}) for the same reason.
+    """
+    if not rows:
+        return
+    recount(connection, Course, {row['course_id'] for row in rows})
+    recount(connection, Student, {row['student_id'] for row in rows})
+    add_totals(connection, enrollments=sum(inserted.values()))
+    add_daily(connection, inserted, datetime.utcnow().date(), 'enrolled')
+
+
+@event.listens_for(Enrollment, 'after_insert')
+def _enrollment_added(mapper, connection, target):
+    _add(connection, Course, target.course_id, 1)
+    _add(connection, Student, target.student_id, 1)
+    add_totals(connection, enrollments=1)
+    day = (target.enrolled_on or datetime.utcnow()).date()
+    add_daily(connection, {target.course_id: 1}, day, 'enrolled')
+
+
+@event.listens_for(Enrollment, 'after_delete')
+def _enrollment_removed(mapper, connection, target):
+    _add(connection, Course, target.course_id, -1)
+    _add(connection, Student, target.student_id, -1)
+    add_totals(connection, enrollments=-1)
+    add_daily(connection, {target.course_id: 1}, datetime.utcnow().date(), 'unenrolled')
+
+
+@event.listens_for(Course, 'after_insert')
+def _course_added(mapper, connection, target):
+    add_totals(connection, courses=1)
+
+
+@event.listens_for(Student, 'after_insert')
+def _student_added(mapper, connection, target):
+    add_totals(connection, students=1)
+
+
+@event.listens_for(Student, 'after_delete')
+def _student_removed(mapper, connection, target):
+    add_totals(connection, students=-1)
+
+
+@event.listens_for(Course, 'before_delete')
+def _course_removed(mapper, connection, target):
+    # runs after the course's enrollments were deleted in the same flush
+    connection.execute(delete(EnrollmentDaily).where(EnrollmentDaily.course_id == target.id))
+    add_totals(connection, courses=-1)
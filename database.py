@@ -0,0 +1,125 @@
+# engine options, pool instrumentation and read-replica routing
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session as http_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from metrics import metrics
+
+REPLICA_BIND = 'replica'
+PRIMARY_UNTIL = 'db_primary_until'
+WROTE_KEY = 'database_wrote'
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.pool_timeouts.inc(self.logging_name)
+            raise
+        finally:
+            metrics.observe_pool_wait(self.logging_name, time.perf_counter() - start)
+
+
+def engine_options(uri, config, name):
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING'], 'pool_logging_name': name}
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options  # Flask-SQLAlchemy gives in-memory SQLite a StaticPool
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE'],
+    )
+    return options
+
+
+def configure_engines(app):
+    """
+    Fills in engine options for the primary database and, with DATABASE_REPLICA_URI,
+    a 'replica' bind. Call before db.init_app(). Options already present in
+    SQLALCHEMY_ENGINE_OPTIONS win over the DB_* settings.
+    """
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config['SQLALCHEMY_DATABASE_URI'], config, 'primary'),
+        **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    if config['DATABASE_REPLICA_URI']:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {
+            'url': config['DATABASE_REPLICA_URI'],
+            **engine_options(config['DATABASE_REPLICA_URI'], config, REPLICA_BIND)
+        }
+        config['SQLALCHEMY_BINDS'] = binds
+    if not getattr(Session, '_replica_listening', False):
+        event.listen(Session, 'after_flush', _note_write)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+        Session._replica_listening = True
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that sends the queries of @read_only views to the
+    replica bind. Flushes, and anything after the session holds changes, use
+    the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('db_read_only') and not self._flushing and self._is_clean():
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """
+    Marks a view whose queries may run on the replica. For DB_REPLICA_STICKY_SECONDS
+    after a user's own write their reads stay on the primary, so replication lag
+    never hides the change they just made.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if http_session.get(PRIMARY_UNTIL, 0) < time.time():
+            g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def pool_samples():
+    samples = []
+    for engine in current_app.extensions['sqlalchemy'].engines.values():
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        labels = {'pool': pool.logging_name or 'default'}
+        samples += [
+            ("db_pool_size", "Connections the pool keeps open.", "gauge", labels, pool.size()),
+            ("db_pool_checked_out", "Connections currently in use.", "gauge", labels, pool.checkedout()),
+            ("db_pool_overflow", "Connections open beyond pool_size.", "gauge", labels, max(pool.overflow(), 0)),
+        ]
+    return samples
+
+
+def _note_write(session, flush_context):
+    session.info[WROTE_KEY] = True
+
+
+def _after_commit(session):
+    if session.info.pop(WROTE_KEY, False) and has_request_context() and current_app.config['DATABASE_REPLICA_URI']:
+        http_session[PRIMARY_UNTIL] = time.time() + current_app.config['DB_REPLICA_STICKY_SECONDS']
+
+
+def _after_rollback(session):
+    session.info.pop(WROTE_KEY, None)
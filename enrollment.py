@@ -0,0 +1,112 @@
+# set-based enrollment
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from sqlalchemy import insert, exists
+from extensions import db
+from models import Student, Course, Enrollment
+from fragment_cache import fragment_cache
+from counters import enrollments_inserted
+from search import student_search_filter, course_search_filter
+
+
+def parse_ids(values):
+    """Distinct positive integer ids from form/JSON values, in the order given."""
+    ids = []
+    seen = set()
+    for value in values or []:
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0 and value not in seen:
+            seen.add(value)
+            ids.append(value)
+    return ids
+
+
+def available_students(course_id, q=''):
+    """Students not enrolled in the course (NOT EXISTS on the enrollment index), optionally matching q."""
+    query = Student.query.filter(
+        ~exists().where(Enrollment.student_id == Student.id, Enrollment.course_id == course_id)
+    )
+    if q.strip():
+        query = query.filter(student_search_filter(q))
+    return query
+
+
+def available_courses(student_id, q=''):
+    """Courses the student is not enrolled in, optionally matching q."""
+    query = Course.query.filter(
+        ~exists().where(Enrollment.course_id == Course.id, Enrollment.student_id == student_id)
+    )
+    if q.strip():
+        query = query.filter(course_search_filter(q))
+    return query
+
+
+def _insert_ignoring_duplicates(rows):
+    """
+    Inserts enrollment rows, skipping pairs that exist by then, and returns the rows
+    that went in. The unique constraint on (student_id, course_id) settles races
+    between concurrent requests; the rows it drops are neither counted nor returned.
+    """
+    statement = (
+        insert(Enrollment.__table__)
+        .prefix_with('IGNORE', dialect='mysql')
+        .prefix_with('OR IGNORE', dialect='sqlite')
+    )
+    connection = db.session.connection()
+    if connection.dialect.insert_executemany_returning:
+        result = db.session.execute(statement.returning(Enrollment.course_id, Enrollment.student_id), rows)
+        pairs = {(course_id, student_id) for course_id, student_id in result}
+        inserted = [row for row in rows if (row['course_id'], row['student_id']) in pairs]
+    else:
+        # MySQL: one statement per course; a short rowcount means a concurrent request won
+        # some of the rows, and only then are they retried one at a time to see which
+        inserted = []
+        for course_id, group in groupby(sorted(rows, key=itemgetter('course_id')), itemgetter('course_id')):
+            group = list(group)
+            savepoint = db.session.begin_nested()
+            if db.session.execute(statement, group).rowcount == len(group):
+                savepoint.commit()
+                inserted += group
+            else:
+                savepoint.rollback()
+                inserted += [row for row in group if db.session.execute(statement, row).rowcount]
+    enrollments_inserted(connection, rows, Counter(row['course_id'] for row in inserted))
+    # a Core INSERT skips the flush events the fragment cache listens to
+    tags = {f"course:{row['course_id']}" for row in rows} | {f"student:{row['student_id']}" for row in rows}
+    fragment_cache.mark_changed(db.session, *tags)
+    return inserted
+
+
+def bulk_enroll(course_id=None, student_id=None, student_ids=(), course_ids=()):
+    """
+    Enrolls many students in one course (course_id + student_ids) or one student in
+    many courses (student_id + course_ids) with one existence check and a single
+    multi-row INSERT. The caller commits.
+    Returns (enrolled ids, already enrolled ids, unknown ids) for the "many" side;
+    ids a concurrent request enrolled first count as already enrolled.
+    """
+    if course_id is not None:
+        fixed, many_ids, many_model = Enrollment.course_id == course_id, student_ids, Student
+        many_column, row = Enrollment.student_id, lambda other: {'course_id': course_id, 'student_id': other}
+    else:
+        fixed, many_ids, many_model = Enrollment.student_id == student_id, course_ids, Course
+        many_column, row = Enrollment.course_id, lambda other: {'student_id': student_id, 'course_id': other}
+
+    if not many_ids:
+        return [], [], []
+    known = {i for (i,) in db.session.query(many_model.id).filter(many_model.id.in_(many_ids))}
+    already = {i for (i,) in db.session.query(many_column).filter(fixed, many_column.in_(many_ids))}
+
+    candidates = [i for i in many_ids if i in known and i not in already]
+    if candidates:
+        key = many_column.key
+        inserted = {r[key] for r in _insert_ignoring_duplicates([row(i) for i in candidates])}
+        already |= set(candidates) - inserted
+    else:
+        inserted = set()
+    return ([i for i in many_ids if i in inserted], [i for i in many_ids if i in already],
+            [i for i in many_ids if i not in known])
@@ -1,6 +1,6 @@
 # forms
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, BooleanField, DateField, FileField
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, DateField, FileField, HiddenField
 from wtforms.validators import DataRequired, Email, EqualTo, Length
 
 class LoginForm(FlaskForm):
@@ -25,4 +25,9 @@ class CourseForm(FlaskForm):
     title = StringField('Title', validators=[DataRequired(), Length(max=128)])
     start_date = DateField('Start Date', validators=[DataRequired()])
     material = FileField('Course Material')
+    upload_id = HiddenField()
     submit = SubmitField('Save')
+
+class ImportForm(FlaskForm):
+    file = FileField('CSV or Excel file', validators=[DataRequired()])
+    submit = SubmitField('Import')
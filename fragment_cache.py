@@ -0,0 +1,181 @@
+# rendered-fragment cache keyed by entity versions, invalidated after commit
+import hashlib
+import threading
+import time
+import uuid
+from flask import g
+from markupsafe import Markup
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from flask_wtf.csrf import generate_csrf
+from cache_backends import make_backend
+from models import Course, Student, Enrollment
+
+CSRF_PLACEHOLDER = '\x00csrf-token\x00'
+PENDING_KEY = 'fragment_cache_tags'
+
+
+class FragmentCache:
+    """
+    Caches rendered template fragments (course list, rosters, pickers) under keys
+    built from the current version of each entity they show. Commits touching a
+    Course, Student or Enrollment bump those versions, so the next read renders
+    fresh HTML and the stale entries simply age out. CSRF tokens are stored as a
+    placeholder and filled in per request.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = None
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['fragment_cache'] = self
+        config = app.config
+        self.backend = make_backend(
+            config['FRAGMENT_CACHE_BACKEND'], config['FRAGMENT_CACHE_MAX_ENTRIES'],
+            config['FRAGMENT_CACHE_DIR'], config['CACHE_REDIS_URL'], config['CACHE_KEY_PREFIX'] + 'fragments:'
+        )
+        if not getattr(Session, '_fragment_cache_listening', False):
+            event.listen(Session, 'after_flush', _collect_changes)
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_rollback', _after_rollback)
+            Session._fragment_cache_listening = True
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def metric_samples(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return [
+            ("fragment_cache_requests_total", "Fragment cache lookups.", "counter", {"result": "hit"}, counters['hits']),
+            ("fragment_cache_requests_total", "Fragment cache lookups.", "counter", {"result": "miss"}, counters['misses']),
+            ("fragment_cache_invalidations_total", "Entity versions bumped after commit.", "counter", {}, counters['invalidations']),
+            ("fragment_cache_errors_total", "Backend errors (the fragment was rendered uncached).", "counter", {}, counters['errors']),
+        ]
+
+    def _versions(self, tags):
+        keys = [f'version:{tag}' for tag in tags]
+        versions = self.backend.get_many(keys)
+        for i, version in enumerate(versions):
+            if version is None:
+                # a lost version must never fall back to one an old fragment was stored under
+                versions[i] = _new_version()
+                self.backend.set(keys[i], versions[i])
+        return versions
+
+    def _replica_may_lag(self, versions):
+        # HTML read from a replica shortly after a write may predate it: serve it, don't keep it
+        config = self.app.config
+        if not (config['DATABASE_REPLICA_URI'] and g.get('db_read_only')):
+            return False
+        newest = max(_version_time(version) for version in versions)
+        return time.time() - newest < config['DB_REPLICA_STICKY_SECONDS']
+
+    def fragment(self, name, tags, render, *vary):
+        """
+        Returns the cached HTML for `name`, or calls render() and stores it. `tags`
+        name the entities shown ('courses', 'course:7', ...); `vary` holds anything
+        else the output depends on (cursor, current user).
+        """
+        if not self.enabled:
+            return Markup(render())
+        try:
+            versions = self._versions(tags)
+            key = 'fragment:' + hashlib.sha1(repr((name, versions, vary)).encode('utf-8')).hexdigest()
+            html = self.backend.get(key)
+        except Exception as e:
+            self._count('errors')
+            self.app.logger.warning(f"Fragment cache unavailable, rendering {name} uncached: {e}")
+            return Markup(render())
+
+        token = generate_csrf()
+        if html is None:
+            self._count('misses')
+            html = str(render()).replace(token, CSRF_PLACEHOLDER)
+            try:
+                if not self._replica_may_lag(versions):
+                    self.backend.set(key, html, self.app.config['FRAGMENT_CACHE_TTL'])
+            except Exception as e:
+                self._count('errors')
+                self.app.logger.warning(f"Could not store fragment {name}: {e}")
+        else:
+            self._count('hits')
+        return Markup(html.replace(CSRF_PLACEHOLDER, token))
+
+    def invalidate(self, *tags):
+        """Bumps the versions right away; normally done for you after commit."""
+        if not self.enabled or not tags:
+            return
+        for tag in tags:
+            try:
+                self.backend.set(f'version:{tag}', _new_version())
+            except Exception as e:
+                self._count('errors')
+                self.app.logger.error(f"Could not invalidate fragment tag {tag}: {e}")
+        self._count('invalidations', len(tags))
+
+    def mark_changed(self, session, *tags):
+        """For bulk statements the flush events cannot see: invalidates `tags` when `session` commits."""
+        session.info.setdefault(PENDING_KEY, set()).update(tags)
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+
+
+fragment_cache = FragmentCache()
+
+
+def _new_version():
+    return f'{uuid.uuid4().hex}-{time.time():.3f}'
+
+
+def _version_time(version):
+    try:
+        return float(version.rsplit('-', 1)[1])
+    except (IndexError, ValueError):
+        return 0.0
+
+
+def _collect_changes(session, flush_context):
+    tags = set()
+    renamed = []
+    modified = [obj for obj in session.dirty if session.is_modified(obj)]
+    for obj in list(session.new) + modified + list(session.deleted):
+        if isinstance(obj, Course):
+            tags.update(('courses', f'course:{obj.id}'))
+        elif isinstance(obj, Student):
+            tags.update(('students', f'student:{obj.id}'))
+            if obj in modified:
+                renamed.append(obj.id)
+        elif isinstance(obj, Enrollment):
+            tags.update((f'course:{obj.course_id}', f'student:{obj.student_id}'))
+    if renamed:
+        # rosters show student names
+        course_ids = session.connection().execute(
+            select(Enrollment.course_id).where(Enrollment.student_id.in_(renamed)).distinct()
+        ).scalars()
+        tags.update(f'course:{course_id}' for course_id in course_ids)
+    if tags:
+        session.info.setdefault(PENDING_KEY, set()).update(tags)
+
+
+def _after_commit(session):
+    tags = session.info.pop(PENDING_KEY, None)
+    if tags:
+        fragment_cache.invalidate(*sorted(tags))
+
+
+def _after_rollback(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,10 @@
+# gunicorn settings for production: gunicorn -c gunicorn.conf.py
+import os
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+
+# each worker compiles the templates and serves one request before it takes traffic;
+# CLI commands do not read this file, so they start without the warmup
+raw_env = [f"WARMUP_ON_START={os.getenv('WARMUP_ON_START', '1')}"]
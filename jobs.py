@@ -0,0 +1,205 @@
+# background job queue
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import update, func
+from extensions import db
+from models import Job, Course
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobError(Exception):
+    """Raised by a handler to fail its job with this message; logged without a traceback."""
+
+
+class JobQueue:
+    """
+    Small DB-backed job queue. Jobs are rows in the `job` table and are
+    claimed with a conditional UPDATE, so several threads (or gunicorn
+    workers) can poll the same table without running a job twice.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.handlers = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['job_queue'] = self
+
+    def register(self, kind, func, status_attr='summary_status', error_attr=None):
+        """
+        func(course) returns True on success; False or an exception means retry.
+        The exception's message is stored as the job's last_error; for False it is
+        the Course column named by error_attr, if any.
+        status_attr names the Course column mirroring the job status (None for none).
+        """
+        self.handlers[kind] = (func, status_attr, error_attr)
+
+    def enqueue(self, kind, course):
+        """Adds a job for the course to the session. The caller commits, then calls notify()."""
+        func, status_attr, error_attr = self.handlers[kind]
+        self._set_status(course, status_attr, PENDING)
+        job = Job(
+            kind=kind,
+            course_id=course.id,
+            status=PENDING,
+            max_attempts=self.app.config['JOB_MAX_ATTEMPTS'],
+            run_after=datetime.utcnow()
+        )
+        db.session.add(job)
+        return job
+
+    def _set_status(self, course, status_attr, status):
+        if status_attr:
+            setattr(course, status_attr, status)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def latest_job(self, course_id, kind):
+        return Job.query.filter_by(course_id=course_id, kind=kind).order_by(Job.id.desc()).first()
+
+    def metric_samples(self):
+        counts = dict(db.session.query(Job.status, func.count()).group_by(Job.status).all())
+        return [
+            ("jobs", "Jobs in the queue by status.", "gauge", {"status": status}, counts.get(status, 0))
+            for status in (PENDING, RUNNING, DONE, FAILED)
+        ]
+
+    def run_pending(self, limit=None):
+        """Runs due jobs in the current app context. Returns the number of jobs processed."""
+        processed = 0
+        while limit is None or processed < limit:
+            job = self._claim()
+            if job is None:
+                break
+            self._run(job)
+            processed += 1
+        return processed
+
+    def _claim(self):
+        while True:
+            now = datetime.utcnow()
+            job = Job.query.filter(Job.status == PENDING, Job.run_after <= now).order_by(Job.id).first()
+            if job is None:
+                db.session.commit()
+                return None
+            claimed = db.session.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == PENDING)
+                .values(status=RUNNING, attempts=Job.attempts + 1, updated_on=now)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                db.session.refresh(job)
+                return job
+
+    def _run(self, job):
+        func, status_attr, error_attr = self.handlers.get(job.kind, (None, None, None))
+        course = db.session.get(Course, job.course_id)
+        if func is None or course is None:
+            job.status = FAILED
+            job.last_error = f"No handler for job kind '{job.kind}'." if func is None else "Course no longer exists."
+            db.session.commit()
+            return
+
+        self._set_status(course, status_attr, RUNNING)
+        db.session.commit()
+
+        error = None
+        try:
+            ok = func(course)
+        except Exception as e:
+            db.session.rollback()
+            ok = False
+            error = str(e) or type(e).__name__
+            if isinstance(e, JobError):
+                self.app.logger.warning(f"Job {job.id} ({job.kind}) for course ID {job.course_id} failed: {e}")
+            else:
+                self.app.logger.exception(f"Job {job.id} ({job.kind}) for course ID {job.course_id} raised.")
+            job = db.session.get(Job, job.id)
+            course = db.session.get(Course, job.course_id)
+            if course is None:
+                job.status = FAILED
+                job.last_error = "Course no longer exists."
+                db.session.commit()
+                return
+
+        if not ok and error is None:
+            error = (getattr(course, error_attr) if error_attr else None) or "Handler reported failure."
+
+        if ok:
+            job.status = DONE
+            job.last_error = None
+            self._set_status(course, status_attr, DONE)
+        elif job.attempts < job.max_attempts:
+            delay = min(
+                self.app.config['JOB_RETRY_BACKOFF'] * 2 ** (job.attempts - 1),
+                self.app.config['JOB_RETRY_BACKOFF_MAX']
+            )
+            job.status = PENDING
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            job.last_error = error
+            self._set_status(course, status_attr, PENDING)
+            self.app.logger.warning(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}, retrying in {delay:.0f}s.")
+        else:
+            job.status = FAILED
+            job.last_error = error
+            self._set_status(course, status_attr, FAILED)
+            self.app.logger.error(f"Job {job.id} ({job.kind}) failed after {job.attempts} attempts.")
+        db.session.commit()
+
+    def requeue_stale(self):
+        """Puts jobs left in 'running' by a crashed worker back in the queue."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config['JOB_STALE_AFTER'])
+        db.session.execute(
+            update(Job)
+            .where(Job.status == RUNNING, Job.updated_on < cutoff)
+            .values(status=PENDING, run_after=datetime.utcnow())
+        )
+        db.session.commit()
+
+    def start(self, workers=None):
+        workers = self.app.config['JOB_WORKERS'] if workers is None else workers
+        if self._threads or workers <= 0:
+            return
+        with self.app.app_context():
+            self.requeue_stale()
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        self._stopping.clear()
+
+    def _work(self):
+        poll_interval = self.app.config['JOB_POLL_INTERVAL']
+        while not self._stopping.is_set():
+            with self.app.app_context():
+                try:
+                    processed = self.run_pending(limit=1)
+                except Exception as e:
+                    self.app.logger.error(f"Job worker error: {e}")
+                    db.session.rollback()
+                    processed = 0
+            if not processed:
+                self._wakeup.wait(poll_interval)
+                self._wakeup.clear()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,97 @@
+# per-username and per-IP limits on login attempts
+import threading
+import time
+from cache_backends import make_backend
+
+
+class LoginThrottle:
+    """
+    Counts login attempts in fixed windows of LOGIN_THROTTLE_WINDOW seconds: every
+    attempt per client IP, and failed attempts per username. Once either count
+    reaches its limit, further attempts are refused until the window ends. The
+    'filesystem' backend shares the counts between the workers on one host, and
+    'redis' shares them between all workers.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = None
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self.counters = {'blocked': 0, 'errors': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['login_throttle'] = self
+        config = app.config
+        self.window = config['LOGIN_THROTTLE_WINDOW']
+        self.limits = {'ip': config['LOGIN_MAX_ATTEMPTS_PER_IP'], 'user': config['LOGIN_MAX_FAILURES_PER_USER']}
+        self.backend = make_backend(
+            config['LOGIN_THROTTLE_BACKEND'], 100000, config['LOGIN_THROTTLE_DIR'],
+            config['CACHE_REDIS_URL'], config['CACHE_KEY_PREFIX'] + 'login:'
+        )
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _key(self, kind, value, now):
+        return f'{kind}:{value}:{int(now // self.window)}'
+
+    def _get(self, key):
+        try:
+            return int(self.backend.get(key) or 0)
+        except Exception as e:
+            with self._lock:
+                self.counters['errors'] += 1
+            self.app.logger.warning(f"Login throttle unavailable: {e}")
+            return 0
+
+    def _add(self, key):
+        # get + set is not atomic across workers; a few extra attempts may slip through
+        with self._update_lock:
+            try:
+                self.backend.set(key, str(self._get(key) + 1), self.window)
+            except Exception as e:
+                with self._lock:
+                    self.counters['errors'] += 1
+                self.app.logger.warning(f"Could not count a login attempt: {e}")
+
+    def check(self, username, ip):
+        """
+        Counts an attempt from `ip`. Returns 0 if it may proceed, or the seconds
+        until the current window ends if the IP or the username is over its limit.
+        """
+        if not self.enabled:
+            return 0
+        now = time.time()
+        ip_key, user_key = self._key('ip', ip, now), self._key('user', username.lower(), now)
+        if self._get(ip_key) >= self.limits['ip'] or self._get(user_key) >= self.limits['user']:
+            with self._lock:
+                self.counters['blocked'] += 1
+            return int(self.window - now % self.window) + 1
+        self._add(ip_key)
+        return 0
+
+    def failed(self, username):
+        if self.enabled:
+            self._add(self._key('user', username.lower(), time.time()))
+
+    def succeeded(self, username):
+        if self.enabled:
+            try:
+                self.backend.delete(self._key('user', username.lower(), time.time()))
+            except Exception as e:
+                self.app.logger.warning(f"Could not reset login failures: {e}")
+
+    def metric_samples(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return [
+            ("login_throttled_total", "Login attempts refused by the rate limit.", "counter", {}, counters['blocked']),
+        ]
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,68 @@
+# serving uploaded material: conditional GETs, byte ranges and web-server offload
+import mimetypes
+import os
+from zlib import adler32
+from flask import Response, abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+X_SENDFILE = 'x-sendfile'
+X_ACCEL = 'x-accel'
+
+
+def media_etag(path, stat):
+    """Strong validator for a file: changes whenever its size, mtime or path does."""
+    check = adler32(path.encode()) & 0xFFFFFFFF
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}-{check:x}"
+
+
+def _cache_headers(response):
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['MEDIA_MAX_AGE']
+
+
+def _offloaded(path, filename, stat, mode):
+    # the web server sends the bytes and answers Range requests itself;
+    # the app only validates the request and sets the caching headers
+    response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    if mode == X_ACCEL:
+        prefix = current_app.config['MEDIA_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{filename}"
+    else:
+        response.headers['X-Sendfile'] = path
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.last_modified = stat.st_mtime
+    response.set_etag(media_etag(path, stat))
+    _cache_headers(response)
+    response.make_conditional(request)
+    if response.status_code in (304, 412):
+        response.headers.pop('X-Sendfile', None)
+        response.headers.pop('X-Accel-Redirect', None)
+    return response
+
+
+def send_media(directory, filename):
+    """
+    Sends an uploaded file with ETag/Last-Modified validators, Cache-Control and
+    HTTP Range support (206 Partial Content), or hands it to the web server when
+    MEDIA_OFFLOAD is 'x-sendfile' or 'x-accel'.
+    """
+    path = safe_join(directory, filename)
+    if path is None:
+        abort(404)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+
+    mode = current_app.config['MEDIA_OFFLOAD']
+    if mode in (X_SENDFILE, X_ACCEL):
+        return _offloaded(path, filename, stat, mode)
+
+    return send_file(
+        path,
+        conditional=True,
+        etag=media_etag(path, stat),
+        max_age=current_app.config['MEDIA_MAX_AGE'],
+    )
@@ -0,0 +1,249 @@
+# request, SQL and span timings exposed in Prometheus text format
+import cProfile
+import hmac
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from flask import Response, abort, current_app, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from assets import WARMUP_ENVIRON
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+PROFILE_SORTS = ('cumulative', 'tottime', 'ncalls')
+LOOPBACK = ('127.0.0.1', '::1')
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: ([*counts], total) for k, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_label_text({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{self.name}_count{_label_text(labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_text(dict(zip(self.labels, label_values)))} {value}")
+        return lines
+
+
+class Metrics:
+    """
+    In-process instrumentation: per-endpoint latency and SQL statement histograms,
+    timed spans, Server-Timing headers, a Prometheus /metrics endpoint and cProfile
+    reports for admins (?profile=1). Values are per process; with several gunicorn
+    workers each one reports its own.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.collectors = []
+        self.requests = Counter('http_requests_total', 'HTTP requests.', ('endpoint', 'method', 'status'))
+        self.request_latency = Histogram(
+            'http_request_duration_seconds', 'Request latency by endpoint.', ('endpoint', 'method'))
+        self.request_statements = Histogram(
+            'http_request_db_statements', 'SQL statements issued per request.', ('endpoint',), COUNT_BUCKETS)
+        self.sql_latency = Histogram('db_statement_duration_seconds', 'SQL statement latency.', ('operation',))
+        self.span_latency = Histogram('span_duration_seconds', 'Duration of timed code spans.', ('span',))
+        self.span_errors = Counter('span_errors_total', 'Timed spans that raised.', ('span',))
+        self.pool_wait = Histogram('db_pool_wait_seconds', 'Time spent waiting to check out a connection.', ('pool',))
+        self.pool_timeouts = Counter('db_pool_timeouts_total', 'Checkouts that gave up after pool_timeout.', ('pool',))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        if not getattr(Engine, '_metrics_listening', False):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            Engine._metrics_listening = True
+
+    def register_collector(self, func):
+        """func() returns [(name, help, type, {labels}, value), ...] read at scrape time."""
+        self.collectors.append(func)
+        return func
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_sql_count = 0
+        g.metrics_sql_time = 0.0
+        g.metrics_spans = {}
+        if request.args.get('profile') == '1' and self._may_profile():
+            g.metrics_profiler = cProfile.Profile()
+            g.metrics_profiler.enable()
+
+    def _may_profile(self):
+        admins = current_app.config['ADMIN_USERNAMES']
+        return current_user.is_authenticated and current_user.username in admins
+
+    def _may_scrape(self):
+        """
+        With METRICS_TOKEN only a matching bearer token may scrape. Without one,
+        local scrapers (loopback, not forwarded by a proxy) and admins may.
+        """
+        token = current_app.config['METRICS_TOKEN']
+        if token:
+            return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+        forwarded = 'X-Forwarded-For' in request.headers or 'Forwarded' in request.headers
+        return (request.remote_addr in LOOPBACK and not forwarded) or self._may_profile()
+
+    def _after_request(self, response):
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            response = self._profile_report(profiler)
+        start = g.get('metrics_start')
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        if endpoint != 'metrics' and not request.environ.get(WARMUP_ENVIRON):
+            self.requests.inc(endpoint, request.method, response.status_code)
+            self.request_latency.observe(elapsed, endpoint, request.method)
+            self.request_statements.observe(g.metrics_sql_count, endpoint)
+        timings = [f'db;desc="{g.metrics_sql_count} queries";dur={g.metrics_sql_time * 1000:.1f}']
+        timings += [f'{name};dur={duration * 1000:.1f}' for name, duration in g.metrics_spans.items()]
+        timings.append(f'app;dur={elapsed * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+    def _profile_report(self, profiler):
+        out = io.StringIO()
+        out.write(f"{request.method} {request.full_path}\n")
+        out.write(f"{g.metrics_sql_count} SQL statements, {g.metrics_sql_time * 1000:.1f} ms in the database\n\n")
+        sort = request.args.get('sort')
+        stats = pstats.Stats(profiler, stream=out)
+        stats.strip_dirs().sort_stats(sort if sort in PROFILE_SORTS else 'cumulative').print_stats(
+            current_app.config['PROFILE_MAX_ROWS'])
+        return Response(out.getvalue(), mimetype='text/plain')
+
+    def observe_sql(self, statement, duration):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        self.sql_latency.observe(duration, operation)
+        if has_request_context() and 'metrics_start' in g:
+            g.metrics_sql_count += 1
+            g.metrics_sql_time += duration
+
+    def observe_pool_wait(self, pool, duration):
+        self.pool_wait.observe(duration, pool)
+        if has_request_context() and 'metrics_start' in g:
+            g.metrics_spans['db-pool'] = g.metrics_spans.get('db-pool', 0.0) + duration
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.span_errors.inc(name)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.span_latency.observe(duration, name)
+            if has_request_context() and 'metrics_start' in g:
+                g.metrics_spans[name] = g.metrics_spans.get(name, 0.0) + duration
+
+    def metrics_view(self):
+        if not self._may_scrape():
+            abort(401 if current_app.config['METRICS_TOKEN'] else 403)
+        lines = []
+        for metric in (self.requests, self.request_latency, self.request_statements,
+                       self.sql_latency, self.pool_wait, self.pool_timeouts, self.span_latency, self.span_errors):
+            lines += metric.expose()
+        declared = set()
+        for collector in self.collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                current_app.logger.error(f"Metrics collector {collector.__name__} failed: {e}")
+                continue
+            for name, help, kind, labels, value in samples:
+                if name not in declared:
+                    lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                    declared.add(name)
+                lines.append(f"{name}{_label_text(labels)} {value}")
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+metrics = Metrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_start')
+    if starts:
+        metrics.observe_sql(statement, time.perf_counter() - starts.pop())
+
+
+def timed(name):
+    """Decorator recording each call of the function as a span."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,178 @@
+# versioned schema migrations, recorded in the schema_version table
+#
+# Run once per deploy with `flask migrate` (or AUTO_MIGRATE=1 for development).
+# Every step checks what already exists, so databases created by the old
+# db.create_all() at any point in the project's history upgrade cleanly.
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect, text, select, func, insert, literal
+from models import (
+    User, Student, Course, Enrollment, EnrollmentDaily, Total, Job, ExtractedText, SummaryCacheEntry,
+    CourseDocument, Blob, UploadSession
+)
+
+schema = MetaData()
+schema_version = Table(
+    'schema_version', schema,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String(255), nullable=False),
+    Column('applied_on', DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(function):
+        MIGRATIONS.append((version, description, function))
+        return function
+    return register
+
+
+def current_version(connection):
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def pending(connection):
+    version = current_version(connection)
+    return [(v, description) for v, description, _ in sorted(MIGRATIONS) if v > version]
+
+
+def migrate(engine, target=None, log=print):
+    """
+    Applies the migrations after the database's current version, each in its own
+    transaction, up to `target` (default: all). Returns the versions applied.
+    MySQL commits DDL implicitly, so a failed step is re-run from the start next
+    time; the steps are written to tolerate that.
+    """
+    with engine.begin() as connection:
+        schema.create_all(connection)
+        version = current_version(connection)
+    applied = []
+    for number, description, function in sorted(MIGRATIONS):
+        if number <= version or (target is not None and number > target):
+            continue
+        log(f"Applying migration {number}: {description}")
+        with engine.begin() as connection:
+            function(connection)
+            connection.execute(schema_version.insert().values(
+                version=number, description=description, applied_on=datetime.utcnow()
+            ))
+        applied.append(number)
+    return applied
+
+
+def _create_tables(connection, *models):
+    for model in models:
+        model.__table__.create(connection, checkfirst=True)
+
+
+def _add_columns(connection, model, *names):
+    table = model.__table__
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    quote = connection.dialect.identifier_preparer.quote
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(name)} {column.type.compile(connection.dialect)}"
+        if column.server_default is not None:
+            ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+        connection.execute(text(ddl))
+
+
+def _create_indexes(connection, model, *names):
+    table = model.__table__
+    inspector = inspect(connection)
+    existing = {index['name'] for index in inspector.get_indexes(table.name)}
+    existing |= {constraint['name'] for constraint in inspector.get_unique_constraints(table.name)}
+    for name in names:
+        if name not in existing:
+            next(index for index in table.indexes if index.name == name).create(connection)
+
+
+@migration(1, "students, courses, enrollments and users")
+def _initial(connection):
+    # course.material_blob_id references blob, which MySQL wants to exist first
+    _create_tables(connection, User, Blob, Student, Course, Enrollment)
+
+
+@migration(2, "background jobs and summary status")
+def _jobs(connection):
+    _add_columns(connection, Course, 'summary_status')
+    _create_tables(connection, Job)
+
+
+@migration(3, "extracted text and summary caches")
+def _summary_cache(connection):
+    _create_tables(connection, ExtractedText, SummaryCacheEntry)
+
+
+@migration(4, "unique enrollments and keyset pagination indexes")
+def _enrollment_indexes(connection):
+    inspector = inspect(connection)
+    names = {index['name'] for index in inspector.get_indexes('enrollment')}
+    names |= {constraint['name'] for constraint in inspector.get_unique_constraints('enrollment')}
+    if 'uq_enrollment_student_course' not in names:
+        # keep the first of any duplicate rows, then let the database refuse new ones
+        connection.execute(text(
+            "DELETE FROM enrollment WHERE id NOT IN ("
+            "SELECT id FROM (SELECT MIN(id) AS id FROM enrollment GROUP BY student_id, course_id) AS keep)"
+        ))
+        connection.execute(text(
+            "CREATE UNIQUE INDEX uq_enrollment_student_course ON enrollment (student_id, course_id)"
+        ))
+    _create_indexes(connection, Student, 'ix_student_name_id')
+    _create_indexes(connection, Course, 'ix_course_start_date_id')
+
+
+@migration(5, "course documents and full-text search")
+def _search(connection):
+    from search import ensure_search_indexes
+    _create_tables(connection, CourseDocument)
+    ensure_search_indexes(connection)
+    # titles only; `flask reindex-courses` adds the material text
+    connection.execute(insert(CourseDocument).from_select(
+        ['course_id', 'title', 'body', 'updated_on'],
+        select(Course.id, Course.title, literal(''), func.now())
+        .where(~select(CourseDocument.course_id).where(CourseDocument.course_id == Course.id).exists())
+    ))
+
+
+@migration(6, "content-addressed blobs, resumable uploads and media renditions")
+def _media(connection):
+    _create_tables(connection, Blob, UploadSession)
+    _add_columns(
+        connection, Course,
+        'material_blob_id', 'material_name', 'media_status', 'rendition_path', 'poster_path', 'waveform_path'
+    )
+    _create_indexes(connection, Course, 'ix_course_material_blob_id')
+
+
+@migration(7, "enrollment counters and the daily enrollment rollup")
+def _counters(connection):
+    from counters import recount
+    _add_columns(connection, Course, 'enrollment_count')
+    _add_columns(connection, Student, 'enrollment_count')
+    _create_indexes(connection, Course, 'ix_course_enrollment_count')
+    _create_indexes(connection, Student, 'ix_student_enrollment_count')
+    _create_indexes(connection, Enrollment, 'ix_enrollment_course_id')
+    _create_tables(connection, EnrollmentDaily)
+    recount(connection, Course)
+    recount(connection, Student)
+    if connection.execute(select(func.count()).select_from(EnrollmentDaily)).scalar() == 0:
+        day = func.date(Enrollment.enrolled_on)
+        connection.execute(insert(EnrollmentDaily).from_select(
+            ['course_id', 'day', 'enrolled', 'unenrolled'],
+            select(Enrollment.course_id, day, func.count(), literal(0))
+            .where(Enrollment.enrolled_on.isnot(None))
+            .group_by(Enrollment.course_id, day)
+        ))
+
+
+@migration(8, "dashboard totals")
+def _totals(connection):
+    from counters import recount_totals
+    _create_tables(connection, Total)
+    recount_totals(connection)
@@ -2,9 +2,12 @@
 # db models
 from datetime import datetime
 from extensions import db, login_manager
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin, current_user 
 from sqlalchemy import Text
+from sqlalchemy.dialects import mysql
+from passwords import passwords
+
+LongText = Text().with_variant(mysql.LONGTEXT(), 'mysql')
 
 
 class User(UserMixin, db.Model):
@@ -14,41 +17,148 @@ class User(UserMixin, db.Model):
     courses_created = db.relationship('Course', backref='creator', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """A right password stored with outdated hash settings is rehashed; the caller commits."""
+        valid, new_hash = passwords.verify_and_update(self.password_hash, password)
+        if new_hash:
+            self.password_hash = new_hash
+        return valid
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    from user_cache import user_cache  # user_cache imports this module
+    return user_cache.load(int(user_id))
 
 
 class Student(db.Model):
+    __table_args__ = (
+        db.Index('ix_student_name_id', 'last_name', 'first_name', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(64), nullable=False)
     last_name = db.Column(db.String(64), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
+    enrollment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
     enrollments = db.relationship(
         "Enrollment", backref="student", cascade="all, delete", lazy='dynamic'
     )
 
 
 class Course(db.Model):
+    __table_args__ = (
+        db.Index('ix_course_start_date_id', 'start_date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(128), nullable=False)
     start_date = db.Column(db.Date, nullable=False)
     enrollments = db.relationship("Enrollment", backref="course", cascade="all, delete", lazy='dynamic')
     material_path = db.Column(db.String(255))
     material_summary = db.Column(Text, nullable = True)
+    summary_status = db.Column(db.String(16), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    jobs = db.relationship("Job", backref="course", cascade="all, delete", lazy='dynamic')
+    document = db.relationship("CourseDocument", backref="course", cascade="all, delete-orphan", uselist=False)
+    material_blob_id = db.Column(db.Integer, db.ForeignKey('blob.id'), nullable=True, index=True)
+    material_name = db.Column(db.String(255), nullable=True)
+    material_blob = db.relationship("Blob")
+    media_status = db.Column(db.String(16), nullable=True)
+    rendition_path = db.Column(db.String(255), nullable=True)
+    poster_path = db.Column(db.String(255), nullable=True)
+    waveform_path = db.Column(db.String(255), nullable=True)
+    enrollment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
     
 
 
 
+class Blob(db.Model):
+    """A stored file, named by the SHA-256 of its content and shared by every course that uploads it."""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    path = db.Column(db.String(255), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False, default=0)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_on = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class UploadSession(db.Model):
+    """A resumable upload in progress; the bytes received so far live in a .part file in the blob store."""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    length = db.Column(db.BigInteger, nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    blob_id = db.Column(db.Integer, db.ForeignKey('blob.id'), nullable=True)
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_on = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    blob = db.relationship("Blob")
+
+
+class CourseDocument(db.Model):
+    """Searchable text of a course: its title and the text extracted from its material."""
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), primary_key=True)
+    title = db.Column(db.String(128), nullable=False)
+    body = db.Column(LongText, nullable=False, default='')
+    updated_on = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class Enrollment(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'course_id', name='uq_enrollment_student_course'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("student.id"))
-    course_id = db.Column(db.Integer, db.ForeignKey("course.id"))
-    enrolled_on = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), index=True)
+    enrolled_on = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class EnrollmentDaily(db.Model):
+    """Enrollments made and removed per course and day, maintained by counters.py."""
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id", ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    enrolled = db.Column(db.Integer, nullable=False, default=0)
+    unenrolled = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Total(db.Model):
+    """Row counts shown on the dashboard ('courses', 'students', 'enrollments'), maintained by counters.py."""
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(Text, nullable=True)
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_on = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ExtractedText(db.Model):
+    file_sha256 = db.Column(db.String(64), primary_key=True)
+    text_sha256 = db.Column(db.String(64), nullable=False)
+    text = db.Column(LongText, nullable=False)
+    complete = db.Column(db.Boolean, nullable=False, default=True)
+    size = db.Column(db.Integer, nullable=False, default=0)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_on = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class SummaryCacheEntry(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    text_sha256 = db.Column(db.String(64), nullable=False, index=True)
+    model_name = db.Column(db.String(64), nullable=False)
+    summary = db.Column(Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False, default=0)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_on = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,59 @@
+# keyset (cursor) pagination
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(values):
+    payload = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Returns the cursor's values converted to the columns' Python types, or None if it is invalid."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        decoded = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if python_type is date:
+                value = date.fromisoformat(value)
+            elif python_type is datetime:
+                value = datetime.fromisoformat(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+def _after(columns, values, descending):
+    # (a, b, c) > (x, y, z) spelled out as OR-ed prefixes, which every backend can match to a composite index
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+def keyset_page(query, columns, cursor=None, limit=50, descending=False):
+    """
+    Returns (rows, next_cursor) for the page of `query` after `cursor`, ordered by
+    `columns` (which must form a unique key, e.g. end with the primary key).
+    next_cursor is None on the last page.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if values is not None:
+            query = query.filter(_after(columns, values, descending))
+    order = [c.desc() for c in columns] if descending else list(columns)
+    rows = query.order_by(*order).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in columns])
+    return rows, next_cursor
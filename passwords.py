@@ -0,0 +1,123 @@
+# password hashing: configurable method and cost, rehash on login, bounded worker pool
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Every hashing slot stayed taken for PASSWORD_HASH_WAIT seconds."""
+
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with PASSWORD_HASH_METHOD (any werkzeug method,
+    e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'). With PASSWORD_HASH_PROCESSES
+    the work runs in a process pool, so a burst of logins uses at most that many
+    cores; at most PASSWORD_HASH_QUEUE hashes are in flight per web process and
+    callers beyond that get PasswordHasherBusy instead of piling up.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._prefix = None
+        self._lock = threading.Lock()
+        self.counters = {'hashes': 0, 'verifications': 0, 'rehashes': 0, 'busy': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['passwords'] = self
+        config = app.config
+        self.method = config['PASSWORD_HASH_METHOD']
+        self.salt_length = config['PASSWORD_SALT_LENGTH']
+        self.processes = config['PASSWORD_HASH_PROCESSES']
+        self.wait = config['PASSWORD_HASH_WAIT']
+        self._slots = threading.BoundedSemaphore(config['PASSWORD_HASH_QUEUE'])
+        self._in_flight = 0
+        self._prefix = None
+        self.shutdown()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # not fork: job worker threads may hold the logging or connection pool locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context('forkserver'))
+            return self._executor
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            self._count('busy')
+            raise PasswordHasherBusy()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            if not self.processes:
+                return function(*args)
+            return self._pool().submit(function, *args).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def hash(self, password):
+        self._count('hashes')
+        return self._run(_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        self._count('verifications')
+        return self._run(_verify, pwhash, password)
+
+    def verify_and_update(self, pwhash, password):
+        """
+        Returns (valid, new_hash). new_hash is set when the password is right but
+        pwhash was made with other settings than the configured ones.
+        """
+        if not self.verify(pwhash, password):
+            return False, None
+        if not self.needs_rehash(pwhash):
+            return True, None
+        self._count('rehashes')
+        return True, self.hash(password)
+
+    def needs_rehash(self, pwhash):
+        """True if pwhash was made with another method or other cost parameters than the configured ones."""
+        if self._prefix is None:
+            # werkzeug fills in default parameters ('pbkdf2' -> 'pbkdf2:sha256:1000000')
+            self._prefix = _hash('', self.method, 1).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
+
+    def metric_samples(self):
+        with self._lock:
+            counters, in_flight = dict(self.counters), self._in_flight
+        return [
+            ("password_hashes_total", "Passwords hashed.", "counter", {}, counters['hashes']),
+            ("password_verifications_total", "Password checks.", "counter", {}, counters['verifications']),
+            ("password_rehashes_total", "Hashes upgraded to the configured method at login.", "counter", {}, counters['rehashes']),
+            ("password_hasher_busy_total", "Requests turned away because every hashing slot was taken.", "counter", {}, counters['busy']),
+            ("password_hashes_in_flight", "Hashes running or queued in this process.", "gauge", {}, in_flight),
+        ]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+passwords = PasswordHasher()
@@ -0,0 +1,176 @@
+# resumable chunked uploads (the core of the tus 1.0 protocol plus its checksum extension)
+import base64
+import binascii
+import hashlib
+import os
+import secrets
+import shutil
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from extensions import db
+from models import UploadSession
+from storage import blob_store, attach_material, PART_SUFFIX
+
+COPY_SIZE = 1024 * 1024
+CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def part_path(upload):
+    return os.path.join(blob_store.tmp_dir, f"{upload.id}{PART_SUFFIX}")
+
+
+def extension_of(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def create_upload(user_id, filename, length):
+    """Starts an upload of `length` bytes. The caller commits."""
+    allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
+    if extension_of(filename) not in allowed_extensions:
+        raise UploadError(f'File type not allowed for "{filename}". Allowed: {", ".join(sorted(allowed_extensions))}')
+    if length < 0 or length > current_app.config['UPLOAD_MAX_SIZE']:
+        raise UploadError(f"Upload-Length must be between 0 and {current_app.config['UPLOAD_MAX_SIZE']} bytes.", 413)
+    upload = UploadSession(id=secrets.token_hex(16), user_id=user_id, filename=filename, length=length, offset=0)
+    os.makedirs(blob_store.tmp_dir, exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    db.session.add(upload)
+    return upload
+
+
+def current_offset(upload):
+    """The confirmed offset, never past the bytes actually on disk."""
+    if upload.blob_id is not None:
+        return upload.length
+    try:
+        size = os.path.getsize(part_path(upload))
+    except FileNotFoundError:
+        size = 0
+    return min(upload.offset, size)
+
+
+def _parse_checksum(header):
+    if not header:
+        return None, None
+    try:
+        algorithm, value = header.split(' ', 1)
+        algorithm = algorithm.lower()
+        digest = base64.b64decode(value.strip(), validate=True)
+    except (ValueError, binascii.Error):
+        raise UploadError('Malformed Upload-Checksum header.')
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f'Unsupported checksum algorithm "{algorithm}".')
+    return algorithm, digest
+
+
+def _set_offset(upload, old, new):
+    claimed = db.session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload.id, UploadSession.offset == old)
+        .values(offset=new, updated_on=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return claimed
+
+
+def append_chunk(upload, offset, stream, checksum=None):
+    """
+    Streams one chunk to disk at `offset`, verifying it against an Upload-Checksum
+    value ("sha256 <base64 digest>") before it becomes part of the file. Memory use is
+    bounded by COPY_SIZE whatever the chunk size. Returns the new offset.
+    """
+    expected = current_offset(upload)
+    if expected != upload.offset:
+        # a previous request claimed a range but died before writing it
+        _set_offset(upload, upload.offset, expected)
+        db.session.refresh(upload)
+    if upload.blob_id is not None or offset != expected:
+        raise UploadError(f'Upload-Offset {offset} does not match the current offset {expected}.', 409)
+    algorithm, expected_digest = _parse_checksum(checksum)
+    digest = hashlib.new(algorithm) if algorithm else None
+
+    # the chunk is staged next to the part file so a failed or corrupt chunk never touches it
+    chunk_path = f"{part_path(upload)}.{secrets.token_hex(4)}"
+    written = 0
+    try:
+        with open(chunk_path, 'wb') as f:
+            for data in iter(lambda: stream.read(COPY_SIZE), b''):
+                written += len(data)
+                if offset + written > upload.length:
+                    raise UploadError('Chunk runs past the declared Upload-Length.', 413)
+                if digest is not None:
+                    digest.update(data)
+                f.write(data)
+        if digest is not None and digest.digest() != expected_digest:
+            raise UploadError('Checksum mismatch.', 460)
+
+        # a concurrent PATCH for the same offset loses here
+        if not _set_offset(upload, offset, offset + written):
+            raise UploadError('Another request has already written this range.', 409)
+        with open(part_path(upload), 'r+b') as part, open(chunk_path, 'rb') as chunk:
+            part.seek(offset)
+            part.truncate()
+            shutil.copyfileobj(chunk, part, COPY_SIZE)
+            part.flush()
+            os.fsync(part.fileno())
+    finally:
+        if os.path.exists(chunk_path):
+            os.remove(chunk_path)
+
+    db.session.refresh(upload)
+    if upload.offset == upload.length:
+        finish(upload)
+    return upload.offset
+
+
+def finish(upload):
+    """Moves the assembled file into the blob store; the upload keeps one reference until it is used."""
+    if upload.blob_id is None:
+        upload.blob = blob_store.adopt(part_path(upload), extension_of(upload.filename))
+        db.session.commit()
+    return upload.blob
+
+
+def attach_upload(course, upload_id, user_id):
+    """
+    Hands a completed upload to the course material flow: the course takes over the
+    upload's blob reference and the upload is removed. The caller commits.
+    Returns the filename.
+    """
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != user_id:
+        raise UploadError('Upload not found.', 404)
+    if upload.blob_id is None:
+        if current_offset(upload) < upload.length:
+            raise UploadError('Upload is not complete yet.', 409)
+        finish(upload)
+    attach_material(course, upload.blob, upload.filename)
+    db.session.delete(upload)
+    return upload.filename
+
+
+def discard_upload(upload):
+    """Deletes an upload and its data. The caller commits."""
+    if upload.blob is not None:
+        blob_store.release(upload.blob)
+    if os.path.exists(part_path(upload)):
+        os.remove(part_path(upload))
+    db.session.delete(upload)
+
+
+def expire_uploads(max_age=None):
+    """Discards uploads that have not received data for UPLOAD_SESSION_TTL seconds."""
+    max_age = current_app.config['UPLOAD_SESSION_TTL'] if max_age is None else max_age
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    expired = UploadSession.query.filter(UploadSession.updated_on < cutoff).all()
+    for upload in expired:
+        discard_upload(upload)
+    db.session.commit()
+    return len(expired)
@@ -1,8 +1,12 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, session
+from flask import Blueprint, render_template, redirect, url_for, flash, session, request, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from models import User
 from forms import LoginForm, RegisterForm
+from passwords import PasswordHasherBusy
+from login_throttle import login_throttle
+
+BUSY_RETRY_AFTER = 5
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -18,11 +22,28 @@ def login():
         return redirect(url_for("auth.index"))
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
+        username = form.username.data
+        retry_after = login_throttle.check(username, request.remote_addr)
+        if retry_after:
+            flash("Too many login attempts. Please try again later.")
+            return render_template("login.html", form=form), 429, {"Retry-After": str(retry_after)}
+        user = User.query.filter_by(username=username).first()
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except PasswordHasherBusy:
+            flash("The server is busy. Please try again in a moment.")
+            return render_template("login.html", form=form), 503, {"Retry-After": str(BUSY_RETRY_AFTER)}
+        if valid:
+            try:
+                db.session.commit()  # saves a rehashed password
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Could not store the rehashed password of {username}: {e}")
+            login_throttle.succeeded(username)
             login_user(user, remember=form.remember.data)
             session.permanent = True
             return redirect(url_for("auth.index"))
+        login_throttle.failed(username)
         flash("Invalid credentials")
     return render_template("login.html", form=form)
 
@@ -35,7 +56,11 @@ def register():
             flash("Username taken")
             return redirect(url_for("auth.register"))
         user = User(username=form.username.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHasherBusy:
+            flash("The server is busy. Please try again in a moment.")
+            return render_template("register.html", form=form), 503, {"Retry-After": str(BUSY_RETRY_AFTER)}
         db.session.add(user)
         db.session.commit()
         flash("Account created")
@@ -1,24 +1,93 @@
-import os
 from flask import (
-    Blueprint, render_template, redirect, url_for, request, flash, current_app
+    Blueprint, render_template, redirect, url_for, request, flash, current_app, jsonify,
+    Response, stream_with_context
 )
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from flask_wtf import FlaskForm 
+from sqlalchemy.orm import joinedload, contains_eager
 
 from extensions import db
-from models import Course, Student, Enrollment
+from models import Course, Student, Enrollment, CourseDocument
 from forms import CourseForm
-from utils import generate_and_store_summary_for_course 
+from jobs import job_queue
+from pagination import keyset_page
+from search import search_courses
+from enrollment import bulk_enroll, parse_ids, available_students
+from bulk_io import stream_csv
+from storage import blob_store, attach_material, detach_material
+from resumable import attach_upload, UploadError
+from transcode import release_media, is_media
+from fragment_cache import fragment_cache
+from database import read_only
+from sqlalchemy import select
 
 courses_bp = Blueprint('courses', __name__)
 
 @courses_bp.route('/')
 @login_required
+@read_only
 def list():
-    courses = Course.query.order_by(Course.start_date.desc()).all()
-    csrf_form = FlaskForm()
-    return render_template('courses/list.html', courses=courses, csrf_form=csrf_form)
+    cursor = request.args.get('cursor')
+
+    def render_table():
+        courses, next_cursor = keyset_page(
+            Course.query,
+            [Course.start_date, Course.id],
+            cursor=cursor,
+            limit=current_app.config['PAGE_SIZE'],
+            descending=True
+        )
+        return render_template('courses/_list_table.html', courses=courses, next_cursor=next_cursor, csrf_form=FlaskForm())
+
+    table = fragment_cache.fragment('courses.list', ['courses'], render_table, cursor, current_user.id)
+    return render_template('courses/list.html', table=table)
+
+@courses_bp.route('/search')
+@login_required
+def search():
+    q = request.args.get('q', '')
+    limit = min(request.args.get('limit', 20, type=int), current_app.config['SEARCH_MAX_LIMIT'])
+    results = search_courses(q, limit=max(limit, 1))
+    if request.args.get('format') == 'json':
+        return jsonify([
+            {
+                'id': course.id,
+                'title': course.title,
+                'snippet': str(snippet),
+                'url': url_for('courses.detail', id=course.id)
+            }
+            for course, snippet in results
+        ])
+    return render_template('courses/search.html', q=q, results=results)
+
+@courses_bp.route('/export.csv')
+@login_required
+def export_csv():
+    statement = select(Course.id, Course.title, Course.start_date, Course.material_name, Course.user_id).order_by(Course.id)
+    return Response(
+        stream_with_context(stream_csv(['id', 'title', 'start_date', 'material', 'created_by'], statement)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=courses.csv'}
+    )
+
+
+@courses_bp.route('/<int:id>/roster.csv')
+@login_required
+def roster_csv(id):
+    course = Course.query.get_or_404(id)
+    statement = (
+        select(Student.id, Student.first_name, Student.last_name, Student.email, Enrollment.enrolled_on)
+        .join(Enrollment, Enrollment.student_id == Student.id)
+        .where(Enrollment.course_id == course.id)
+        .order_by(Student.last_name, Student.first_name, Student.id)
+    )
+    return Response(
+        stream_with_context(stream_csv(['student_id', 'first_name', 'last_name', 'email', 'enrolled_on'], statement)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=course-{course.id}-roster.csv'}
+    )
+
 
 @courses_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -31,24 +100,22 @@ def add():
             user_id=current_user.id
         )
         file = form.material.data
-        if file:
+        if form.upload_id.data:
+            try:
+                filename = attach_upload(new_course, form.upload_id.data, current_user.id)
+                flash(f'Material "{filename}" uploaded successfully.', 'success')
+            except UploadError as e:
+                db.session.rollback()
+                flash(f'Error attaching upload: {e}', 'danger')
+                return render_template('courses/form.html', form=form, action="Add")
+        elif file:
             filename = secure_filename(file.filename)
             allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', {'txt', 'pdf', 'mp3', 'mp4'})
-            upload_folder_abs = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER']) 
             if '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions:
-                new_course.material_path = filename
-                save_path = os.path.join(upload_folder_abs, filename)
                 try:
-                    os.makedirs(upload_folder_abs, exist_ok=True)
-                    file.save(save_path)
+                    blob = blob_store.save(file.stream, filename.rsplit('.', 1)[1])
+                    attach_material(new_course, blob, filename)
                     flash(f'Material "{filename}" uploaded successfully.', 'success')
-                    if new_course.material_path and new_course.material_path.lower().endswith('.pdf'):
-                        current_app.logger.info(f"Attempting to summarize new PDF: {new_course.material_path}")
-                        if not generate_and_store_summary_for_course(new_course, new_course.material_path):
-                            flash('PDF was saved, but summary generation failed. Check logs or the summary field for error details.', 'warning')
-                        else:
-                            if new_course.material_summary and not new_course.material_summary.startswith("Error:"):
-                                flash('PDF summary generated successfully.', 'info')
 
                 except Exception as e:
                     db.session.rollback()
@@ -60,7 +127,19 @@ def add():
 
         try:
             db.session.add(new_course)
+            new_course.document = CourseDocument(title=new_course.title, body='')
+            db.session.flush()
+            if new_course.material_path:
+                job_queue.enqueue('index', new_course)
+            if new_course.material_path and new_course.material_path.lower().endswith('.pdf'):
+                job_queue.enqueue('summary', new_course)
+                current_app.logger.info(f"Queued summary job for new PDF: {new_course.material_path}")
+            if is_media(new_course.material_path):
+                job_queue.enqueue('media', new_course)
             db.session.commit()
+            job_queue.notify()
+            if new_course.summary_status:
+                flash('PDF summary is being generated in the background.', 'info')
             flash('Course added successfully!', 'success')
             return redirect(url_for('courses.list'))
         except Exception as e:
@@ -82,61 +161,73 @@ def edit(id):
     if form.validate_on_submit():
         course.title = form.title.data
         course.start_date = form.start_date.data
+        if course.document is None:
+            course.document = CourseDocument(title=course.title, body='')
+        course.document.title = course.title
         if not course.user_id:
              course.user_id = current_user.id
 
         file = form.material.data
         material_path_changed = False
-        if file:
+        if form.upload_id.data:
+            previous_path = course.material_path
+            try:
+                filename = attach_upload(course, form.upload_id.data, current_user.id)
+                material_path_changed = course.material_path != previous_path
+                flash(f'New material "{filename}" uploaded.', 'success')
+            except UploadError as e:
+                db.session.rollback()
+                flash(f'Error attaching upload: {e}', 'danger')
+                current_material = course.material_path
+                return render_template('courses/form.html', form=form, course=course, action="Edit", current_material=current_material)
+        elif file:
             filename = secure_filename(file.filename)
             allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', {'txt', 'pdf', 'mp3', 'mp4'})
-            upload_folder_abs = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
 
             if '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions:
-                if course.material_path and course.material_path != filename:
-                    old_file_path = os.path.join(upload_folder_abs, course.material_path)
-                    if os.path.exists(old_file_path):
-                        try:
-                            os.remove(old_file_path)
-                            flash(f'Old material "{course.material_path}" removed.', 'info')
-                        except OSError as e:
-                            flash(f'Error removing old file: {e}', 'warning')
-                course.material_path = filename
-                material_path_changed = True
-                save_path = os.path.join(upload_folder_abs, filename)
+                previous_path = course.material_path
                 try:
-                    os.makedirs(upload_folder_abs, exist_ok=True)
-                    file.save(save_path)
+                    blob = blob_store.save(file.stream, filename.rsplit('.', 1)[1])
+                    attach_material(course, blob, filename)
+                    material_path_changed = course.material_path != previous_path
                     flash(f'New material "{filename}" uploaded.', 'success')
                 except Exception as e:
+                    db.session.rollback()
                     flash(f'Error saving new file: {e}', 'danger')
                     current_material = course.material_path
-                    material_path_changed = False
                     return render_template('courses/form.html', form=form, course=course, action="Edit", current_material=current_material)
             else:
                  flash(f'File type not allowed for "{filename}". Allowed: {", ".join(allowed_extensions)}', 'warning')
                  current_material = course.material_path
                  return render_template('courses/form.html', form=form, course=course, action="Edit", current_material=current_material)
+        if material_path_changed:
+            job_queue.enqueue('index', course)
+            release_media(course)
+            if is_media(course.material_path):
+                job_queue.enqueue('media', course)
+            else:
+                course.media_status = None
         if course.material_path and course.material_path.lower().endswith('.pdf'):
             needs_summary_update = False
             if material_path_changed:
                 needs_summary_update = True
+            elif course.summary_status in ('pending', 'running'):
+                needs_summary_update = False
             elif not course.material_summary or course.material_summary.startswith("Error:"):
                 needs_summary_update = True
             
             if needs_summary_update:
-                current_app.logger.info(f"Attempting to summarize/re-summarize PDF: {course.material_path} for course ID {course.id}")
-                if not generate_and_store_summary_for_course(course, course.material_path):
-                    flash(f'PDF "{course.material_path}" processed, but summary generation failed. Check logs or summary field for details.', 'warning')
-                else:
-                    if course.material_summary and not course.material_summary.startswith("Error:"):
-                         flash('PDF summary updated/generated successfully.', 'info')
-        elif course.material_summary:
+                current_app.logger.info(f"Queueing summary job for PDF: {course.material_path} for course ID {course.id}")
+                job_queue.enqueue('summary', course)
+                flash('PDF summary is being generated in the background.', 'info')
+        elif course.material_summary or course.summary_status:
             current_app.logger.info(f"Material for course {course.id} is no longer a PDF. Clearing summary.")
             course.material_summary = None
+            course.summary_status = None
             flash('Material is no longer a PDF;', 'info')
         try:
             db.session.commit()
+            job_queue.notify()
             flash('Course updated successfully!', 'success')
             return redirect(url_for('courses.list'))
         except Exception as e:
@@ -164,15 +255,9 @@ def delete(id):
 
     course = Course.query.get_or_404(id)
 
-    if course.material_path:
-        upload_folder_abs = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
-        file_path = os.path.join(upload_folder_abs, course.material_path)
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                flash(f'Material file "{course.material_path}" deleted.', 'info')
-            except OSError as e:
-                flash(f'Error deleting file: {e}', 'warning')
+    # the files themselves are removed by `flask gc-blobs` once no course references them
+    release_media(course)
+    detach_material(course)
 
     try:
         db.session.delete(course)
@@ -187,18 +272,96 @@ def delete(id):
 
 @courses_bp.route('/<int:id>')
 @login_required
+@read_only
 def detail(id):
-    course = Course.query.get_or_404(id)
-    all_students = Student.query.order_by(Student.last_name, Student.first_name).all()
-    enrolled_student_ids = {enrollment.student_id for enrollment in course.enrollments}
+    course = Course.query.options(joinedload(Course.creator)).filter_by(id=id).first_or_404()
     csrf_form = FlaskForm()
+    owner = course.user_id == current_user.id
+
+    def render_roster():
+        enrollments = (
+            Enrollment.query
+            .join(Enrollment.student)
+            .options(contains_eager(Enrollment.student))
+            .filter(Enrollment.course_id == course.id)
+            .order_by(Student.last_name, Student.first_name)
+            .all()
+        )
+        return render_template('courses/_roster.html', course=course, enrollments=enrollments, csrf_form=csrf_form)
+
+    picker_q = request.args.get('picker_q', '')
 
+    def render_picker():
+        students_to_add, picker_cursor = keyset_page(
+            available_students(course.id, picker_q),
+            [Student.last_name, Student.first_name, Student.id],
+            cursor=request.args.get('picker_cursor'),
+            limit=current_app.config['PICKER_PAGE_SIZE']
+        )
+        return render_template(
+            'courses/_student_picker.html',
+            course=course,
+            students_to_add=students_to_add,
+            picker_cursor=picker_cursor,
+            picker_q=picker_q,
+            csrf_form=csrf_form
+        )
+
+    tag = f'course:{course.id}'
     return render_template(
         'courses/detail.html',
         course=course,
-        all_students=all_students,
-        enrolled_student_ids=enrolled_student_ids,
-        csrf_form=csrf_form 
+        picker_q=picker_q,
+        roster=fragment_cache.fragment('courses.roster', [tag], render_roster, owner),
+        picker=fragment_cache.fragment(
+            'courses.picker', [tag, 'students'], render_picker,
+            request.args.get('picker_cursor'), picker_q, owner)
+    )
+
+
+@courses_bp.route('/<int:id>/available_students.json')
+@login_required
+@read_only
+def available_students_json(id):
+    """A page of students not yet enrolled in the course: ?q=&cursor=&limit=."""
+    course = Course.query.get_or_404(id)
+    limit = min(request.args.get('limit', current_app.config['PICKER_PAGE_SIZE'], type=int),
+                current_app.config['SEARCH_MAX_LIMIT'])
+    students, next_cursor = keyset_page(
+        available_students(course.id, request.args.get('q', '')),
+        [Student.last_name, Student.first_name, Student.id],
+        cursor=request.args.get('cursor'),
+        limit=max(limit, 1)
+    )
+    owner = course.user_id == current_user.id
+    return jsonify(
+        items=[
+            {
+                'id': s.id,
+                'name': f'{s.first_name} {s.last_name}',
+                'email': s.email,
+                'url': url_for('students.detail', id=s.id),
+                'enroll_url': url_for('courses.add_student_enrollment', course_id=course.id, student_id=s.id)
+                if owner else None
+            }
+            for s in students
+        ],
+        next_cursor=next_cursor
+    )
+
+
+@courses_bp.route('/<int:id>/summary_status')
+@login_required
+def summary_status(id):
+    course = Course.query.get_or_404(id)
+    job = job_queue.latest_job(course.id, 'summary')
+    return jsonify(
+        course_id=course.id,
+        status=course.summary_status,
+        summary=course.material_summary if course.summary_status in ('done', 'failed') else None,
+        attempts=job.attempts if job else 0,
+        next_attempt_at=job.run_after.isoformat() if job and job.status == 'pending' else None,
+        error=job.last_error if job else None
     )
 
 
@@ -228,6 +391,48 @@ def add_student_enrollment(course_id, student_id):
 
     return redirect(url_for('courses.detail', id=course_id))
 
+@courses_bp.route('/<int:id>/enroll_bulk', methods=['POST'])
+@login_required
+def enroll_bulk(id):
+    """Enrolls many students at once; accepts form field student_ids or JSON {"student_ids": [...]}."""
+    course = Course.query.get_or_404(id)
+    if request.is_json:
+        student_ids = parse_ids((request.get_json(silent=True) or {}).get('student_ids'))
+    else:
+        student_ids = parse_ids(request.form.getlist('student_ids'))
+
+    error = None
+    if course.user_id != current_user.id:
+        error = 'You can only enroll students in your own courses.'
+    elif len(student_ids) > current_app.config['BULK_ENROLL_MAX']:
+        error = f"At most {current_app.config['BULK_ENROLL_MAX']} students can be enrolled at once."
+    if error:
+        if request.is_json:
+            return jsonify(error=error), 403 if course.user_id != current_user.id else 400
+        flash(error, 'danger')
+        return redirect(url_for('courses.detail', id=id))
+
+    try:
+        enrolled, already, unknown = bulk_enroll(course_id=course.id, student_ids=student_ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if request.is_json:
+            return jsonify(error=str(e)), 500
+        flash(f'Error enrolling students: {e}', 'danger')
+        return redirect(url_for('courses.detail', id=id))
+
+    if request.is_json:
+        return jsonify(enrolled=enrolled, already_enrolled=already, unknown=unknown)
+    if enrolled:
+        flash(f'{len(enrolled)} student(s) successfully enrolled in {course.title}.', 'success')
+    if already:
+        flash(f'{len(already)} student(s) were already enrolled in {course.title}.', 'warning')
+    if not student_ids:
+        flash('No students selected.', 'warning')
+    return redirect(url_for('courses.detail', id=id))
+
+
 @courses_bp.route('/<int:course_id>/unenroll/<int:student_id>', methods=['POST'])
 @login_required
 def remove_student_enrollment(course_id, student_id):
@@ -1,7 +1,13 @@
 
-from flask import Blueprint, render_template
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, jsonify, current_app
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm 
+from sqlalchemy import func
+
+from extensions import db
+from models import Course, Student, EnrollmentDaily, Total
+from database import read_only
 
 class LogoutForm(FlaskForm):
     pass
@@ -13,3 +19,73 @@ main_bp = Blueprint('main', __name__)
 def index():
     logout_form = LogoutForm() if current_user.is_authenticated else None
     return render_template('index.html', logout_form=logout_form)
+
+
+def dashboard_data():
+    """
+    Dashboard figures read from the totals, the enrollment counters and the daily
+    rollup, so the cost does not grow with the number of rows.
+    """
+    weeks = current_app.config['DASHBOARD_WEEKS']
+    top = current_app.config['DASHBOARD_TOP']
+    today = datetime.utcnow().date()
+    first_week = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+
+    totals = dict(db.session.query(Total.name, Total.value).all())
+    courses, students, enrollments = (totals.get(name, 0) for name in ('courses', 'students', 'enrollments'))
+    top_courses = (
+        db.session.query(Course.id, Course.title, Course.enrollment_count)
+        .order_by(Course.enrollment_count.desc(), Course.id).limit(top).all()
+    )
+    top_students = (
+        db.session.query(Student.id, Student.first_name, Student.last_name, Student.enrollment_count)
+        .order_by(Student.enrollment_count.desc(), Student.id).limit(top).all()
+    )
+    daily = (
+        db.session.query(EnrollmentDaily.day, func.sum(EnrollmentDaily.enrolled), func.sum(EnrollmentDaily.unenrolled))
+        .filter(EnrollmentDaily.day >= first_week)
+        .group_by(EnrollmentDaily.day).all()
+    )
+    by_week = {first_week + timedelta(weeks=i): [0, 0] for i in range(weeks)}
+    for day, enrolled, unenrolled in daily:
+        week = by_week.get(day - timedelta(days=day.weekday()))
+        if week is None:
+            continue
+        week[0] += enrolled
+        week[1] += unenrolled
+
+    return {
+        'totals': {
+            'courses': courses,
+            'students': students,
+            'enrollments': int(enrollments),
+            'courses_per_student': round(enrollments / students, 2) if students else 0.0,
+        },
+        'top_courses': [
+            {'id': id, 'title': title, 'students': count} for id, title, count in top_courses
+        ],
+        'top_students': [
+            {'id': id, 'name': f"{first_name} {last_name}", 'courses': count}
+            for id, first_name, last_name, count in top_students
+        ],
+        'weekly': [
+            {'week': week.isoformat(), 'enrolled': enrolled, 'unenrolled': unenrolled}
+            for week, (enrolled, unenrolled) in sorted(by_week.items())
+        ],
+    }
+
+
+@main_bp.route('/dashboard')
+@login_required
+@read_only
+def dashboard():
+    data = dashboard_data()
+    busiest_week = max((week['enrolled'] for week in data['weekly']), default=0)
+    return render_template('dashboard.html', data=data, busiest_week=busiest_week)
+
+
+@main_bp.route('/dashboard.json')
+@login_required
+@read_only
+def dashboard_json():
+    return jsonify(dashboard_data())
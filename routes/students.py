@@ -1,27 +1,95 @@
 
-from flask import Blueprint, render_template, redirect, url_for, request, flash
-from flask_login import login_required
+from flask import (
+    Blueprint, render_template, redirect, url_for, request, flash, current_app, jsonify,
+    Response, stream_with_context
+)
+from flask_login import login_required, current_user
 try:
     from extensions import db
     from models import Student, Course, Enrollment
 except ImportError:
     from ..extensions import db
     from ..models import Student, Course, Enrollment
-from forms import StudentForm
+from forms import StudentForm, ImportForm
+from pagination import keyset_page
+from search import student_search_filter, search_students
+from enrollment import bulk_enroll, parse_ids, available_courses
+from bulk_io import iter_upload_rows, import_students, stream_csv, ImportFormatError
+from sqlalchemy import select
 from flask_wtf import FlaskForm
+from sqlalchemy.orm import contains_eager
+from fragment_cache import fragment_cache
+from database import read_only
 
 students_bp = Blueprint('students', __name__)
 
 
 @students_bp.route('/')
 @login_required
+@read_only
 def list():
     q = request.args.get('q', '')
-    students = Student.query.filter(
-        (Student.first_name.contains(q)) | (Student.last_name.contains(q))
-    ).all()
+    query = Student.query
+    if q.strip():
+        query = query.filter(student_search_filter(q))
+    students, next_cursor = keyset_page(
+        query,
+        [Student.last_name, Student.first_name, Student.id],
+        cursor=request.args.get('cursor'),
+        limit=current_app.config['PAGE_SIZE']
+    )
     csrf_form = FlaskForm()
-    return render_template('students/list.html', students=students, q=q, csrf_form=csrf_form)
+    return render_template('students/list.html', students=students, q=q, next_cursor=next_cursor, csrf_form=csrf_form)
+
+@students_bp.route('/search.json')
+@login_required
+def search():
+    limit = min(request.args.get('limit', 10, type=int), current_app.config['SEARCH_MAX_LIMIT'])
+    students = search_students(request.args.get('q', ''), limit=max(limit, 1))
+    return jsonify([
+        {
+            'id': s.id,
+            'name': f'{s.first_name} {s.last_name}',
+            'email': s.email,
+            'url': url_for('students.detail', id=s.id)
+        }
+        for s in students
+    ])
+
+@students_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_csv():
+    form = ImportForm()
+    inserted, errors = None, []
+    if form.validate_on_submit():
+        try:
+            inserted, errors = import_students(
+                iter_upload_rows(form.file.data),
+                batch_size=current_app.config['IMPORT_BATCH_SIZE']
+            )
+        except ImportFormatError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error importing students: {e}', 'danger')
+        else:
+            flash(f'{inserted} student(s) imported.', 'success')
+            if errors:
+                flash(f'{len(errors)} row(s) were skipped; see the report below.', 'warning')
+    return render_template('students/import.html', form=form, inserted=inserted, errors=errors)
+
+
+@students_bp.route('/export.csv')
+@login_required
+def export_csv():
+    statement = select(Student.id, Student.first_name, Student.last_name, Student.email).order_by(Student.id)
+    return Response(
+        stream_with_context(stream_csv(['id', 'first_name', 'last_name', 'email'], statement)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=students.csv'}
+    )
+
 
 @students_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -95,18 +163,83 @@ def delete(id):
 
 @students_bp.route('/<int:id>')
 @login_required
+@read_only
 def detail(id):
     student = Student.query.get_or_404(id)
-    all_courses = Course.query.order_by(Course.title).all()
-    enrolled_course_ids = {enrollment.course_id for enrollment in student.enrollments}
     csrf_form = FlaskForm()
 
+    def render_enrolled():
+        enrollments = (
+            Enrollment.query
+            .join(Enrollment.course)
+            .options(contains_eager(Enrollment.course))
+            .filter(Enrollment.student_id == student.id)
+            .order_by(Course.title)
+            .all()
+        )
+        return render_template('students/_enrollments.html', enrollments=enrollments)
+
+    picker_q = request.args.get('picker_q', '')
+
+    def render_picker():
+        courses_to_enroll, picker_cursor = keyset_page(
+            available_courses(student.id, picker_q),
+            [Course.start_date, Course.id],
+            cursor=request.args.get('picker_cursor'),
+            limit=current_app.config['PICKER_PAGE_SIZE'],
+            descending=True
+        )
+        return render_template(
+            'students/_course_picker.html',
+            student=student,
+            courses_to_enroll=courses_to_enroll,
+            picker_cursor=picker_cursor,
+            picker_q=picker_q,
+            csrf_form=csrf_form
+        )
+
+    # course titles and dates appear in both fragments, so any course change invalidates them
+    tags = [f'student:{student.id}', 'courses']
     return render_template(
         'students/detail.html',
         student=student,
-        all_courses=all_courses,
-        enrolled_course_ids=enrolled_course_ids,
-        csrf_form=csrf_form
+        picker_q=picker_q,
+        enrolled=fragment_cache.fragment('students.enrollments', tags, render_enrolled),
+        picker=fragment_cache.fragment(
+            'students.picker', tags, render_picker,
+            request.args.get('picker_cursor'), picker_q, current_user.id)
+    )
+
+
+@students_bp.route('/<int:id>/available_courses.json')
+@login_required
+@read_only
+def available_courses_json(id):
+    """A page of courses the student is not enrolled in, newest first: ?q=&cursor=&limit=."""
+    student = Student.query.get_or_404(id)
+    limit = min(request.args.get('limit', current_app.config['PICKER_PAGE_SIZE'], type=int),
+                current_app.config['SEARCH_MAX_LIMIT'])
+    courses, next_cursor = keyset_page(
+        available_courses(student.id, request.args.get('q', '')),
+        [Course.start_date, Course.id],
+        cursor=request.args.get('cursor'),
+        limit=max(limit, 1),
+        descending=True
+    )
+    return jsonify(
+        items=[
+            {
+                'id': c.id,
+                'title': c.title,
+                'start_date': c.start_date.isoformat() if c.start_date else None,
+                'url': url_for('courses.detail', id=c.id),
+                # only the creator of a course may enroll students into it
+                'enroll_url': url_for('students.enroll_in_course', student_id=student.id, course_id=c.id)
+                if c.user_id == current_user.id else None
+            }
+            for c in courses
+        ],
+        next_cursor=next_cursor
     )
 
 @students_bp.route('/<int:student_id>/enroll/<int:course_id>', methods=['POST'])
@@ -140,3 +273,52 @@ def enroll_in_course(student_id, course_id):
             flash(f'Error enrolling student: {e}', 'danger')
 
     return redirect(url_for('students.detail', id=student_id))
+
+
+@students_bp.route('/<int:id>/enroll_bulk', methods=['POST'])
+@login_required
+def enroll_bulk(id):
+    """Enrolls a student in many courses; accepts form field course_ids or JSON {"course_ids": [...]}."""
+    student = Student.query.get_or_404(id)
+    if request.is_json:
+        course_ids = parse_ids((request.get_json(silent=True) or {}).get('course_ids'))
+    else:
+        course_ids = parse_ids(request.form.getlist('course_ids'))
+
+    if len(course_ids) > current_app.config['BULK_ENROLL_MAX']:
+        error = f"At most {current_app.config['BULK_ENROLL_MAX']} courses can be selected at once."
+        if request.is_json:
+            return jsonify(error=error), 400
+        flash(error, 'danger')
+        return redirect(url_for('students.detail', id=id))
+
+    # only the creator of a course may enroll students into it
+    creators = dict(
+        db.session.query(Course.id, Course.user_id).filter(Course.id.in_(course_ids))
+    ) if course_ids else {}
+    unknown = [i for i in course_ids if i not in creators]
+    forbidden = [i for i in course_ids if i in creators and creators[i] != current_user.id]
+    try:
+        enrolled, already, _ = bulk_enroll(
+            student_id=student.id,
+            course_ids=[i for i in course_ids if creators.get(i) == current_user.id]
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if request.is_json:
+            return jsonify(error=str(e)), 500
+        flash(f'Error enrolling student: {e}', 'danger')
+        return redirect(url_for('students.detail', id=id))
+
+    if request.is_json:
+        return jsonify(enrolled=enrolled, already_enrolled=already, not_allowed=forbidden, unknown=unknown)
+    if enrolled:
+        flash(f'{student.first_name} successfully enrolled in {len(enrolled)} course(s).', 'success')
+    if already:
+        flash(f'{student.first_name} was already enrolled in {len(already)} of the selected course(s).', 'warning')
+    if forbidden:
+        flash(f'{len(forbidden)} course(s) were skipped: you can only enroll students in your own courses.', 'warning')
+    if not course_ids:
+        flash('No courses selected.', 'warning')
+    return redirect(url_for('students.detail', id=id))
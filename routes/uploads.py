@@ -0,0 +1,108 @@
+from flask import Blueprint, request, jsonify, url_for, current_app
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+
+from extensions import db
+from models import UploadSession
+from resumable import UploadError, create_upload, current_offset, append_chunk, discard_upload
+
+uploads_bp = Blueprint('uploads', __name__)
+
+TUS_VERSION = '1.0.0'
+
+
+@uploads_bp.after_request
+def tus_headers(response):
+    response.headers['Tus-Resumable'] = TUS_VERSION
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@uploads_bp.errorhandler(UploadError)
+def upload_error(e):
+    db.session.rollback()
+    return jsonify(error=str(e)), e.status
+
+
+def _get_upload(upload_id):
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != current_user.id:
+        raise UploadError('Upload not found.', 404)
+    return upload
+
+
+def _describe(upload):
+    return {
+        'id': upload.id,
+        'filename': upload.filename,
+        'length': upload.length,
+        'offset': current_offset(upload),
+        'complete': upload.blob_id is not None,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+        'url': url_for('uploads.upload', upload_id=upload.id)
+    }
+
+
+@uploads_bp.route('/', methods=['POST'])
+@login_required
+def create():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    length = data.get('length', request.headers.get('Upload-Length'))
+    try:
+        length = int(length)
+    except (TypeError, ValueError):
+        raise UploadError('The upload length is required.')
+    if not filename:
+        raise UploadError('A filename is required.')
+
+    upload = create_upload(current_user.id, filename, length)
+    db.session.commit()
+    current_app.logger.info(f"Started upload {upload.id} of {filename} ({length} bytes) for user {current_user.id}.")
+    response = jsonify(_describe(upload))
+    response.status_code = 201
+    response.headers['Location'] = url_for('uploads.upload', upload_id=upload.id)
+    return response
+
+
+@uploads_bp.route('/<upload_id>', methods=['HEAD', 'GET'])
+@login_required
+def upload(upload_id):
+    upload = _get_upload(upload_id)
+    response = jsonify(_describe(upload))
+    response.headers['Upload-Offset'] = str(current_offset(upload))
+    response.headers['Upload-Length'] = str(upload.length)
+    return response
+
+
+@uploads_bp.route('/<upload_id>', methods=['PATCH'])
+@login_required
+def patch(upload_id):
+    upload = _get_upload(upload_id)
+    if request.mimetype != 'application/offset+octet-stream':
+        raise UploadError('Content-Type must be application/offset+octet-stream.', 415)
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        raise UploadError('The Upload-Offset header is required.')
+    if (request.content_length or 0) > current_app.config['UPLOAD_CHUNK_SIZE']:
+        raise UploadError(f"Chunks may be at most {current_app.config['UPLOAD_CHUNK_SIZE']} bytes.", 413)
+
+    try:
+        new_offset = append_chunk(upload, offset, request.stream, request.headers.get('Upload-Checksum'))
+    except UploadError:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception(f"Upload {upload_id} failed at offset {offset}.")
+        return jsonify(error=str(e)), 500
+    response = current_app.response_class(status=204)
+    response.headers['Upload-Offset'] = str(new_offset)
+    return response
+
+
+@uploads_bp.route('/<upload_id>', methods=['DELETE'])
+@login_required
+def delete(upload_id):
+    discard_upload(_get_upload(upload_id))
+    db.session.commit()
+    return current_app.response_class(status=204)
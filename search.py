@@ -0,0 +1,206 @@
+# full-text search: SQLite FTS5 or MySQL FULLTEXT, with a prefix LIKE fallback
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import text, inspect, or_, and_
+from extensions import db
+from models import Student, Course
+
+STUDENT_FTS_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS student_fts USING fts5("
+    "first_name, last_name, email, content='student', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS student_fts_ai AFTER INSERT ON student BEGIN "
+    "INSERT INTO student_fts(rowid, first_name, last_name, email) VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS student_fts_ad AFTER DELETE ON student BEGIN "
+    "INSERT INTO student_fts(student_fts, rowid, first_name, last_name, email) VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS student_fts_au AFTER UPDATE ON student BEGIN "
+    "INSERT INTO student_fts(student_fts, rowid, first_name, last_name, email) VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    "INSERT INTO student_fts(rowid, first_name, last_name, email) VALUES (new.id, new.first_name, new.last_name, new.email); END",
+]
+COURSE_FTS_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS course_fts USING fts5("
+    "title, body, content='course_document', content_rowid='course_id', prefix='3')",
+    "CREATE TRIGGER IF NOT EXISTS course_fts_ai AFTER INSERT ON course_document BEGIN "
+    "INSERT INTO course_fts(rowid, title, body) VALUES (new.course_id, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS course_fts_ad AFTER DELETE ON course_document BEGIN "
+    "INSERT INTO course_fts(course_fts, rowid, title, body) VALUES ('delete', old.course_id, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS course_fts_au AFTER UPDATE ON course_document BEGIN "
+    "INSERT INTO course_fts(course_fts, rowid, title, body) VALUES ('delete', old.course_id, old.title, old.body); "
+    "INSERT INTO course_fts(rowid, title, body) VALUES (new.course_id, new.title, new.body); END",
+]
+COURSE_FULLTEXT_MYSQL = "ALTER TABLE course_document ADD FULLTEXT INDEX ft_course_document (title, body)"
+STUDENT_FULLTEXT_MYSQL = "ALTER TABLE student ADD FULLTEXT INDEX ft_student_name_email (first_name, last_name, email)"
+MIN_FULLTEXT_TOKEN = 3
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _tokens(q):
+    return re.findall(r"\w+", q or "")
+
+
+def ensure_search_indexes(connection):
+    """Creates the full-text structures for the connection's backend if they are missing."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        for fts_table, statements in (('student_fts', STUDENT_FTS_SQLITE), ('course_fts', COURSE_FTS_SQLITE)):
+            exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': fts_table}).first()
+            for statement in statements:
+                connection.execute(text(statement))
+            if not exists:
+                connection.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+    elif dialect == 'mysql':
+        inspector = inspect(connection)
+        for table, index_name, statement in (
+            ('student', 'ft_student_name_email', STUDENT_FULLTEXT_MYSQL),
+            ('course_document', 'ft_course_document', COURSE_FULLTEXT_MYSQL),
+        ):
+            if index_name not in {index['name'] for index in inspector.get_indexes(table)}:
+                connection.execute(text(statement))
+
+
+def _fts5_query(tokens):
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def _mysql_query(tokens):
+    return " ".join(f"+{t}*" for t in tokens)
+
+
+def _prefix_filter(q):
+    # 'q%' (unlike '%q%') can use the name and email indexes
+    pattern = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return or_(
+        Student.last_name.like(pattern, escape='\\'),
+        Student.first_name.like(pattern, escape='\\'),
+        Student.email.like(pattern, escape='\\'),
+    )
+
+
+def _use_fulltext(dialect, tokens):
+    if dialect == 'sqlite':
+        return bool(tokens)
+    if dialect == 'mysql':
+        # InnoDB does not index tokens shorter than innodb_ft_min_token_size
+        return bool(tokens) and all(len(t) >= MIN_FULLTEXT_TOKEN for t in tokens)
+    return False
+
+
+def student_search_filter(q):
+    """A WHERE clause matching students for q; combine with any ordering or pagination."""
+    q = q.strip()
+    tokens = _tokens(q)
+    dialect = _dialect()
+    if not _use_fulltext(dialect, tokens):
+        return _prefix_filter(q)
+    if dialect == 'sqlite':
+        ids = text("SELECT rowid FROM student_fts WHERE student_fts MATCH :fts").bindparams(fts=_fts5_query(tokens))
+    else:
+        ids = text(
+            "SELECT id FROM student WHERE MATCH (first_name, last_name, email) AGAINST (:fts IN BOOLEAN MODE)"
+        ).bindparams(fts=_mysql_query(tokens))
+    clause = Student.id.in_(ids.columns(id=db.Integer))
+    if '@' in q:
+        clause = or_(clause, Student.email == q)
+    return clause
+
+
+def course_search_filter(q):
+    """A WHERE clause matching courses whose title or material text match q."""
+    q = q.strip()
+    tokens = _tokens(q)
+    dialect = _dialect()
+    if not _use_fulltext(dialect, tokens):
+        words = tokens or [q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')]
+        return and_(*[Course.title.like(f"%{word}%", escape='\\') for word in words])
+    if dialect == 'sqlite':
+        ids = text("SELECT rowid FROM course_fts WHERE course_fts MATCH :fts").bindparams(fts=_fts5_query(tokens))
+    else:
+        ids = text(
+            "SELECT course_id FROM course_document WHERE MATCH (title, body) AGAINST (:fts IN BOOLEAN MODE)"
+        ).bindparams(fts=_mysql_query(tokens))
+    return Course.id.in_(ids.columns(course_id=db.Integer))
+
+
+def search_students(q, limit=10):
+    """Students matching q, best match first. An exact email match always comes first."""
+    q = (q or '').strip()
+    if not q:
+        return []
+    tokens = _tokens(q)
+    dialect = _dialect()
+    results = []
+    if '@' in q:
+        exact = Student.query.filter_by(email=q).first()
+        if exact:
+            results.append(exact)
+
+    if not _use_fulltext(dialect, tokens):
+        query = Student.query.filter(_prefix_filter(q)).order_by(Student.last_name, Student.first_name, Student.id)
+        rows = query.limit(limit).all()
+    else:
+        if dialect == 'sqlite':
+            ranked = text(
+                "SELECT rowid AS id, bm25(student_fts, 2.0, 3.0, 1.0) AS score FROM student_fts "
+                "WHERE student_fts MATCH :fts ORDER BY score LIMIT :limit"
+            ).bindparams(fts=_fts5_query(tokens), limit=limit)
+        else:
+            ranked = text(
+                "SELECT id, MATCH (first_name, last_name, email) AGAINST (:fts IN BOOLEAN MODE) AS score FROM student "
+                "WHERE MATCH (first_name, last_name, email) AGAINST (:fts IN BOOLEAN MODE) ORDER BY score DESC LIMIT :limit"
+            ).bindparams(fts=_mysql_query(tokens), limit=limit)
+        ids = [row.id for row in db.session.execute(ranked)]
+        by_id = {s.id: s for s in Student.query.filter(Student.id.in_(ids)).all()} if ids else {}
+        rows = [by_id[i] for i in ids if i in by_id]
+
+    seen = {s.id for s in results}
+    results.extend(s for s in rows if s.id not in seen)
+    return results[:limit]
+
+
+def _highlight(snippet):
+    """Escapes a snippet whose matches are delimited by \x02 ... \x03 and marks them up."""
+    return Markup(str(escape(snippet)).replace('\x02', '<mark>').replace('\x03', '</mark>'))
+
+
+def _python_snippet(body, tokens, width=160):
+    lowered = body.lower()
+    positions = [lowered.find(t.lower()) for t in tokens]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - width // 3) if positions else 0
+    fragment = body[start:start + width]
+    pattern = re.compile("|".join(re.escape(t) for t in tokens), re.IGNORECASE)
+    fragment = pattern.sub(lambda m: f"\x02{m.group(0)}\x03", fragment)
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if start + width < len(body) else ''
+    return prefix + " ".join(fragment.split()) + suffix
+
+
+def search_courses(q, limit=20):
+    """Courses whose title or material text match q, best first, as (course, highlighted snippet)."""
+    tokens = _tokens(q)
+    if not tokens:
+        return []
+    dialect = _dialect()
+    if dialect == 'sqlite':
+        ranked = text(
+            "SELECT rowid AS id, snippet(course_fts, -1, char(2), char(3), '…', 24) AS snippet, "
+            "bm25(course_fts, 5.0, 1.0) AS score FROM course_fts "
+            "WHERE course_fts MATCH :fts ORDER BY score LIMIT :limit"
+        ).bindparams(fts=_fts5_query(tokens), limit=limit)
+        hits = [(row.id, row.snippet) for row in db.session.execute(ranked)]
+    elif dialect == 'mysql' and all(len(t) >= MIN_FULLTEXT_TOKEN for t in tokens):
+        ranked = text(
+            "SELECT course_id AS id, title, body, MATCH (title, body) AGAINST (:fts IN BOOLEAN MODE) AS score "
+            "FROM course_document WHERE MATCH (title, body) AGAINST (:fts IN BOOLEAN MODE) "
+            "ORDER BY score DESC LIMIT :limit"
+        ).bindparams(fts=_mysql_query(tokens), limit=limit)
+        hits = [(row.id, _python_snippet(row.body or row.title, tokens)) for row in db.session.execute(ranked)]
+    else:
+        title_filter = [Course.title.like(f"%{t}%") for t in tokens]
+        hits = [(c.id, _python_snippet(c.title, tokens)) for c in Course.query.filter(*title_filter).limit(limit)]
+
+    ids = [course_id for course_id, _ in hits]
+    courses = {c.id: c for c in Course.query.filter(Course.id.in_(ids)).all()} if ids else {}
+    return [(courses[course_id], _highlight(snippet)) for course_id, snippet in hits if course_id in courses]
@@ -0,0 +1,110 @@
+// enrollment pickers on the course and student detail pages: search and "more"
+// load pages of the available_*.json endpoints instead of reloading the page
+(function () {
+  function build(picker, item) {
+    var li = document.createElement('li');
+    li.className = 'list-group-item d-flex justify-content-between align-items-center';
+    var label = item.name || item.title;
+
+    var info = document.createElement('div');
+    if (item.enroll_url) {
+      var box = document.createElement('input');
+      box.className = 'form-check-input me-1';
+      box.type = 'checkbox';
+      box.name = picker.dataset.field;
+      box.value = item.id;
+      box.setAttribute('form', 'bulkEnrollForm');
+      box.setAttribute('aria-label', 'Select ' + label);
+      info.appendChild(box);
+      info.appendChild(document.createTextNode(' '));
+    }
+    var link = document.createElement('a');
+    link.href = item.url;
+    link.textContent = label;
+    var detail = document.createElement('span');
+    detail.className = 'text-muted small';
+    detail.textContent = item.email ? '(' + item.email + ')' : '(Starts: ' + (item.start_date || 'N/A') + ')';
+    info.appendChild(link);
+    info.appendChild(document.createTextNode(' '));
+    info.appendChild(detail);
+    li.appendChild(info);
+
+    if (item.enroll_url) {
+      var form = document.createElement('form');
+      form.method = 'POST';
+      form.action = item.enroll_url;
+      form.className = 'd-inline';
+      var token = document.createElement('input');
+      token.type = 'hidden';
+      token.name = 'csrf_token';
+      token.value = picker.dataset.csrf;
+      var button = document.createElement('button');
+      button.type = 'submit';
+      button.className = 'btn btn-sm btn-success';
+      button.innerHTML = '<i class="fas fa-plus"></i> Enroll';
+      form.appendChild(token);
+      form.appendChild(button);
+      li.appendChild(form);
+    } else {
+      var denied = document.createElement('p');
+      denied.className = 'm-auto';
+      denied.textContent = ' You have no such rights! ';
+      li.appendChild(denied);
+    }
+    return li;
+  }
+
+  document.querySelectorAll('[data-picker]').forEach(function (picker) {
+    var list = picker.querySelector('[data-picker-list]');
+    var empty = picker.querySelector('[data-picker-empty]');
+    var bulk = picker.querySelector('[data-picker-bulk]');
+    var more = picker.querySelector('[data-picker-more]');
+    var first = picker.querySelector('[data-picker-first]');
+    var search = picker.querySelector('[data-picker-search]');
+    var input = search.querySelector('input');
+    var emptyHtml = empty.innerHTML;
+    var cursor = more.dataset.cursor;
+    var latest = 0;
+    var timer = null;
+
+    function load(reset) {
+      var request = ++latest;
+      var params = new URLSearchParams({q: input.value.trim()});
+      if (!reset && cursor) { params.set('cursor', cursor); }
+      fetch(picker.dataset.url + '?' + params, {credentials: 'same-origin'})
+        .then(function (r) { return r.json(); })
+        .then(function (data) {
+          if (request !== latest) { return; }  // a newer search already replaced this one
+          if (reset) {
+            list.innerHTML = '';
+            if (first) { first.classList.add('d-none'); }
+          }
+          data.items.forEach(function (item) { list.appendChild(build(picker, item)); });
+          cursor = data.next_cursor;
+          var none = !list.children.length;
+          empty.classList.toggle('d-none', !none);
+          if (input.value.trim()) {
+            empty.textContent = picker.dataset.noneText;
+          } else {
+            empty.innerHTML = emptyHtml;
+          }
+          if (bulk) { bulk.classList.toggle('d-none', none); }
+          more.classList.toggle('d-none', !cursor);
+        });
+    }
+
+    search.addEventListener('submit', function (event) {
+      event.preventDefault();
+      clearTimeout(timer);
+      load(true);
+    });
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () { load(true); }, 250);
+    });
+    more.addEventListener('click', function (event) {
+      event.preventDefault();
+      load(false);
+    });
+  });
+})();
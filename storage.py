@@ -0,0 +1,215 @@
+# content-addressed upload store
+import hashlib
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Blob
+
+CHUNK_SIZE = 1024 * 1024
+TMP_DIR = '.tmp'
+PART_SUFFIX = '.part'
+COLLECTING = -1
+ACQUIRE_RETRIES = 100
+SHARD_DIR = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}$')
+
+
+class BlobStore:
+    """
+    Stores uploads once per content under UPLOAD_FOLDER/ab/cd/<sha256>.<ext>.
+    Files are streamed to a temp file while hashing and renamed into place, so
+    readers never see a partial file. Blob rows count the courses using a file;
+    collect_garbage() removes files nobody references any more.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['blob_store'] = self
+
+    @property
+    def root(self):
+        return os.path.join(self.app.root_path, self.app.config['UPLOAD_FOLDER'])
+
+    @property
+    def tmp_dir(self):
+        return os.path.join(self.root, TMP_DIR)
+
+    def full_path(self, relative_path):
+        return os.path.join(self.root, *relative_path.split('/'))
+
+    def save(self, stream, extension):
+        """
+        Writes the stream to the store and takes a reference on its blob.
+        Returns the Blob; the caller commits.
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+            blob = self._place(tmp_path, digest.hexdigest(), size, extension)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob
+
+    def adopt(self, path, extension):
+        """
+        Moves a finished file that already sits in the store's temp directory into
+        the store (a rename, no copy) and takes a reference on its blob.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return self._place(path, digest.hexdigest(), os.path.getsize(path), extension)
+
+    def _place(self, tmp_path, sha256, size, extension):
+        relative_path = f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{extension.lower()}"
+        blob = self._acquire(sha256, relative_path, size)
+        # renamed only after the reference is taken, so a concurrent
+        # collect_garbage() cannot unlink it from under us
+        final_path = self.full_path(relative_path)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+        return blob
+
+    def _acquire(self, sha256, relative_path, size):
+        for _ in range(ACQUIRE_RETRIES):
+            # a locking read sees rows committed after this transaction began
+            blob = Blob.query.filter_by(path=relative_path).with_for_update().populate_existing().first()
+            if blob is None:
+                try:
+                    with db.session.begin_nested():
+                        blob = Blob(sha256=sha256, path=relative_path, size=size, refcount=1)
+                        db.session.add(blob)
+                    return blob
+                except IntegrityError:
+                    continue
+            taken = db.session.execute(
+                update(Blob)
+                .where(Blob.id == blob.id, Blob.refcount >= 0)
+                .values(refcount=Blob.refcount + 1, updated_on=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if taken:
+                db.session.refresh(blob)
+                return blob
+            # being collected right now; wait for the row to go and store it again
+            time.sleep(0.05)
+        raise RuntimeError(f"Could not store blob {relative_path}: it is still being collected.")
+
+    def retain(self, blob):
+        """Takes another reference on a blob the caller already knows to be referenced."""
+        db.session.execute(
+            update(Blob)
+            .where(Blob.id == blob.id, Blob.refcount >= 0)
+            .values(refcount=Blob.refcount + 1, updated_on=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(blob)
+
+    def release(self, blob):
+        """Drops one reference. The file stays until collect_garbage() runs."""
+        db.session.execute(
+            update(Blob)
+            .where(Blob.id == blob.id, Blob.refcount > 0)
+            .values(refcount=Blob.refcount - 1, updated_on=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(blob)
+
+    def collect_garbage(self, grace_seconds=None):
+        """
+        Deletes blobs that have had no references for grace_seconds, and files in the
+        store that have no blob row (left by rolled-back requests). Returns the number
+        of files removed.
+        """
+        grace = self.app.config['BLOB_GC_GRACE'] if grace_seconds is None else grace_seconds
+        cutoff = datetime.utcnow() - timedelta(seconds=grace)
+        removed = 0
+        candidates = db.session.query(Blob.id, Blob.path).filter(Blob.refcount == 0, Blob.updated_on <= cutoff).all()
+        for blob_id, relative_path in candidates:
+            claimed = db.session.execute(
+                update(Blob).where(Blob.id == blob_id, Blob.refcount == 0).values(refcount=COLLECTING)
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                continue
+            try:
+                self._remove(self.full_path(relative_path))
+                removed += 1
+            except FileNotFoundError:
+                pass
+            db.session.execute(delete(Blob).where(Blob.id == blob_id))
+            db.session.commit()
+
+        known = {path for (path,) in db.session.query(Blob.path)}
+        db.session.commit()
+        oldest = time.time() - grace
+        for directory, subdirs, files in os.walk(self.root):
+            relative_dir = os.path.relpath(directory, self.root).replace(os.sep, '/')
+            if relative_dir != TMP_DIR and not SHARD_DIR.match(relative_dir):
+                continue
+            for name in files:
+                if name.endswith(PART_SUFFIX):
+                    # resumable uploads in progress; expired by resumable.expire_uploads()
+                    continue
+                relative_path = f"{relative_dir}/{name}"
+                path = os.path.join(directory, name)
+                if relative_path not in known and os.path.getmtime(path) < oldest:
+                    self._remove(path)
+                    removed += 1
+        return removed
+
+    def _remove(self, path):
+        os.remove(path)
+        # drop the ab/cd shard directories once they are empty
+        for directory in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+            if os.path.normpath(directory) == os.path.normpath(self.root):
+                break
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+
+
+def attach_material(course, blob, name):
+    """Points the course at a stored blob, releasing the one it used before."""
+    if course.material_blob is not None and course.material_blob_id != blob.id:
+        blob_store.release(course.material_blob)
+    elif course.material_blob_id == blob.id:
+        # same content uploaded again: keep one reference
+        blob_store.release(blob)
+    course.material_blob = blob
+    course.material_path = blob.path
+    course.material_name = name
+
+
+def detach_material(course):
+    if course.material_blob is not None:
+        blob_store.release(course.material_blob)
+    course.material_blob = None
+    course.material_path = None
+    course.material_name = None
+
+
+blob_store = BlobStore()
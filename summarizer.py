@@ -0,0 +1,381 @@
+# summarization backends and map-reduce summarization of long documents
+import json
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import current_app
+from summary_cache import summary_cache, sha256_text, summary_key
+from metrics import metrics
+
+SUMMARY_MODEL_NAME = "gemma-3-27b-it"
+SUMMARY_MAX_CHARS = 15000
+SUMMARY_PROMPT = "Please provide a concise summary (around 150-200 words), do not include preambule like 'here is your summary' for the following document content:\n\n{text}"
+CHUNK_PROMPT = "The following text is one part of a longer document. Summarize it in a few sentences, keeping names, terms and key points. Do not include a preamble:\n\n{text}"
+REDUCE_PROMPT = "The following are summaries of consecutive parts of one document. Combine them into a single concise summary (around 150-200 words) of the whole document, do not include preambule like 'here is your summary':\n\n{text}"
+GENERATION_CONFIG = {
+    "temperature": 0.3,
+    "top_p": 1.0,
+    "top_k": 32,
+    "max_output_tokens": 300,
+}
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+]
+
+
+class SummarizationError(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class GeminiBackend:
+    """Google Generative AI backend. generate() returns the response text or raises SummarizationError."""
+
+    def __init__(self, api_key, model_name=SUMMARY_MODEL_NAME, generation_config=None, safety_settings=None, timeout=None):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.timeout = timeout
+        self.model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config or GENERATION_CONFIG,
+            safety_settings=safety_settings or SAFETY_SETTINGS
+        )
+
+    def generate(self, prompt):
+        request_options = {"timeout": self.timeout} if self.timeout else None
+        response = self.model.generate_content(prompt, request_options=request_options)
+
+        if response.prompt_feedback and response.prompt_feedback.block_reason:
+            block_reason_message = f"Content generation blocked. Reason: {response.prompt_feedback.block_reason}."
+            if response.prompt_feedback.safety_ratings:
+                block_reason_message += f" Safety Ratings: {response.prompt_feedback.safety_ratings}"
+            raise SummarizationError(block_reason_message)
+
+        if response.parts:
+            return "".join(part.text for part in response.parts)
+        if hasattr(response, 'text'):
+            return response.text
+        if response.candidates and response.candidates[0].content.parts:
+            return "".join(part.text for part in response.candidates[0].content.parts)
+        raise SummarizationError("Could not extract summary from Google AI response.")
+
+
+class FakeBackend:
+    """Offline backend for tests and local development: echoes the start of the prompt's text."""
+
+    def __init__(self, model_name="fake", delay=0.0, **kwargs):
+        self.model_name = model_name
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        text = prompt.split("\n\n", 1)[-1]
+        return f"Summary ({len(text)} chars): {' '.join(text.split()[:12])}"
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for `reset_after`
+    seconds; then lets a single trial call through (half-open) and closes on success.
+    """
+
+    def __init__(self, threshold=5, reset_after=60.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial_running):
+                raise CircuitOpenError("Summarizer temporarily disabled after repeated failures.")
+            if state == "half-open":
+                self._trial_running = True
+
+    def record(self, success):
+        with self._lock:
+            self._trial_running = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class RateLimiter:
+    """Spaces out calls so that at most `per_minute` start in any minute. Thread-safe."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _ServiceBackend:
+    """Backend handed out by SummarizerService: a pooled client behind the breaker and metrics."""
+
+    def __init__(self, service, key):
+        self.service = service
+        self.key = key
+        self.model_name = key[0]
+
+    def generate(self, prompt):
+        return self.service.generate(self.key, prompt)
+
+
+class SummarizerService:
+    """
+    Created once in create_app and stored in app.extensions['summarizer'].
+    Keeps one client per (model_name, generation_config, safety_settings),
+    guards all calls with a circuit breaker, spaces them out to at most
+    SUMMARY_RATE_PER_MINUTE per process and records per-call latency.
+    """
+
+    backends = {
+        "gemini": GeminiBackend,
+        "fake": FakeBackend,
+    }
+
+    def __init__(self, app=None):
+        self.app = None
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker()
+        self.limiter = RateLimiter(0)
+        self.latencies = deque(maxlen=1000)
+        self.counters = {"calls": 0, "failures": 0, "rejected": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.breaker = CircuitBreaker(
+            app.config["SUMMARIZER_FAILURE_THRESHOLD"],
+            app.config["SUMMARIZER_RESET_AFTER"]
+        )
+        self.limiter = RateLimiter(app.config["SUMMARY_RATE_PER_MINUTE"])
+        app.extensions["summarizer"] = self
+
+    def register_backend(self, name, factory):
+        """factory(api_key=..., model_name=..., generation_config=..., safety_settings=..., timeout=...)"""
+        self.backends = {**self.backends, name: factory}
+        with self._lock:
+            self._clients.clear()
+
+    def backend(self, model_name=SUMMARY_MODEL_NAME, generation_config=None, safety_settings=None):
+        key = (
+            model_name,
+            json.dumps(generation_config or GENERATION_CONFIG, sort_keys=True),
+            json.dumps(safety_settings or SAFETY_SETTINGS, sort_keys=True),
+        )
+        self._client(key)
+        return _ServiceBackend(self, key)
+
+    def _client(self, key):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                config = self.app.config
+                factory = self.backends[config["SUMMARIZER_BACKEND"]]
+                client = factory(
+                    api_key=config.get("GOOGLE_API_KEY"),
+                    model_name=key[0],
+                    generation_config=json.loads(key[1]),
+                    safety_settings=json.loads(key[2]),
+                    timeout=config["SUMMARIZER_TIMEOUT"]
+                )
+                self._clients[key] = client
+            return client
+
+    def generate(self, key, prompt):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+        client = self._client(key)
+        self.limiter.acquire()
+        start = time.perf_counter()
+        success = False
+        try:
+            with metrics.span("llm_generate"):
+                result = client.generate(prompt)
+            success = True
+            return result
+        except SummarizationError:
+            # the model answered (e.g. blocked content); not a service failure
+            success = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.breaker.record(success)
+            with self._lock:
+                self.latencies.append(elapsed)
+                self.counters["calls"] += 1
+                if not success:
+                    self.counters["failures"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def metric_samples(self):
+        samples = self.metrics()
+        rows = [
+            ("summarizer_calls_total", "LLM calls made.", "counter", {}, samples["calls"]),
+            ("summarizer_failures_total", "LLM calls that failed.", "counter", {}, samples["failures"]),
+            ("summarizer_rejected_total", "LLM calls rejected by the open circuit.", "counter", {}, samples["rejected"]),
+        ]
+        for state in ("closed", "half-open", "open"):
+            rows.append(("summarizer_circuit_state", "Circuit breaker state.", "gauge",
+                         {"state": state}, int(samples["circuit"] == state)))
+        return rows
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            metrics = dict(self.counters)
+        metrics["circuit"] = self.breaker.state
+        if latencies:
+            metrics["latency_avg"] = sum(latencies) / len(latencies)
+            metrics["latency_p50"] = latencies[len(latencies) // 2]
+            metrics["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return metrics
+
+
+summarizer_service = SummarizerService()
+
+
+def _lines(text, max_len):
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_len:
+            cut = line.rfind(' ', 0, max_len)
+            cut = cut + 1 if cut > 0 else max_len
+            yield line[:cut]
+            line = line[cut:]
+        if line:
+            yield line
+
+
+def split_text(text, chunk_chars=12000, overlap=500):
+    """
+    Splits text into chunks of at most chunk_chars characters, each prefixed by the
+    last `overlap` characters of the previous chunk. Boundaries are picked from the
+    content (a line whose hash hits a target once the chunk is half full) rather than
+    from absolute offsets, so an edit early in a document shifts only the chunks
+    around it and the remaining chunk summaries stay cached.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for line in _lines(text, chunk_chars):
+        if size and size + len(line) > chunk_chars:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+        if size >= chunk_chars // 2 and zlib.crc32(line.encode('utf-8')) % 8 == 0:
+            chunks.append("".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("".join(current))
+    if overlap <= 0:
+        return chunks
+    return chunks[:1] + [chunks[i - 1][-overlap:] + chunks[i] for i in range(1, len(chunks))]
+
+
+def _cached_generate(prompts, backend, model_name, params, stage):
+    """
+    Runs backend.generate for every prompt, skipping those already in the summary
+    cache. Cache access stays in the calling thread (it needs the app context);
+    only the model calls run in the pool.
+    """
+    config = current_app.config
+    results = [None] * len(prompts)
+    keys = []
+    todo = []
+    for i, prompt in enumerate(prompts):
+        text_sha256 = sha256_text(prompt)
+        key = summary_key(text_sha256, model_name, {**params, "stage": stage})
+        keys.append((key, text_sha256))
+        results[i] = summary_cache.get_summary(key)
+        if results[i] is None:
+            todo.append(i)
+
+    if todo:
+        def call(prompt):
+            return backend.generate(prompt).strip()
+
+        with ThreadPoolExecutor(max_workers=config['SUMMARY_CONCURRENCY']) as executor:
+            futures = {executor.submit(call, prompts[i]): i for i in todo}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                # store as we go so a failed run keeps the chunks it finished
+                summary_cache.put_summary(keys[i][0], keys[i][1], model_name, results[i])
+
+    current_app.logger.info(f"{stage}: {len(prompts)} prompts, {len(prompts) - len(todo)} cached.")
+    return results
+
+
+def map_reduce_summarize(text, backend, model_name, params):
+    """Summarizes each chunk concurrently, then combines the partial summaries into one."""
+    config = current_app.config
+    chunk_chars = config['SUMMARY_CHUNK_CHARS']
+    chunks = split_text(text, chunk_chars, config['SUMMARY_CHUNK_OVERLAP'])
+    partials = _cached_generate([CHUNK_PROMPT.format(text=c) for c in chunks], backend, model_name, params, "map")
+
+    # combine in groups until the partial summaries fit in a single prompt
+    level = 0
+    while len(partials) > 1 and sum(len(p) for p in partials) > chunk_chars:
+        groups = []
+        for partial in partials:
+            if groups and sum(len(p) for p in groups[-1]) + len(partial) <= chunk_chars:
+                groups[-1].append(partial)
+            else:
+                groups.append([partial])
+        if len(groups) == len(partials):
+            break
+        level += 1
+        prompts = [CHUNK_PROMPT.format(text="\n\n".join(g)) for g in groups]
+        partials = _cached_generate(prompts, backend, model_name, params, f"combine-{level}")
+
+    final_prompt = REDUCE_PROMPT.format(text="\n\n".join(partials)[:chunk_chars])
+    return _cached_generate([final_prompt], backend, model_name, params, "reduce")[0]
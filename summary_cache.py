@@ -0,0 +1,166 @@
+# content-addressed summary cache
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func, delete
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import ExtractedText, SummaryCacheEntry
+
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def summary_key(text_sha256, model_name, params):
+    """Key for a summary: hash of the text plus everything that changes the model output."""
+    payload = json.dumps([text_sha256, model_name, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """
+    Persistent cache with two levels:
+    - extracted PDF text keyed by SHA-256 of the file, so re-uploads skip PyMuPDF;
+    - summaries keyed by SHA-256 of the text + model name + generation params,
+      so a model or prompt change only re-runs the LLM step.
+    Entries are evicted by age, count and total size (least recently used first).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self.counters = {'text_hits': 0, 'text_misses': 0, 'summary_hits': 0, 'summary_misses': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['summary_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['SUMMARY_CACHE_ENABLED']
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        for level in ('text', 'summary'):
+            total = stats[f'{level}_hits'] + stats[f'{level}_misses']
+            stats[f'{level}_hit_rate'] = stats[f'{level}_hits'] / total if total else 0.0
+        return stats
+
+    def metric_samples(self):
+        stats = self.stats()
+        return [
+            ("summary_cache_requests_total", "Summary cache lookups.", "counter",
+             {"level": level, "result": result}, stats[f"{level}_{result}"])
+            for level in ("text", "summary") for result in ("hits", "misses")
+        ]
+
+    def get_text(self, file_sha256, max_chars=None):
+        """Returns cached text if it covers the requested budget (None = whole document)."""
+        if not self.enabled:
+            return None
+        entry = db.session.get(ExtractedText, file_sha256)
+        usable = entry is not None and (
+            entry.complete or (max_chars is not None and len(entry.text) >= max_chars)
+        )
+        if not usable:
+            self._count('text_misses')
+            return None
+        self._count('text_hits')
+        entry.hits += 1
+        entry.last_used_on = datetime.utcnow()
+        return entry.text[:max_chars] if max_chars is not None else entry.text
+
+    def put_text(self, file_sha256, text, complete=True):
+        if not self.enabled:
+            return
+        entry = db.session.get(ExtractedText, file_sha256)
+        if entry is not None:
+            # a longer budget replaces a truncated extraction
+            entry.text = text
+            entry.text_sha256 = sha256_text(text)
+            entry.size = len(text.encode('utf-8'))
+            entry.complete = complete
+            entry.last_used_on = datetime.utcnow()
+            return
+        self._insert(ExtractedText(
+            file_sha256=file_sha256,
+            text_sha256=sha256_text(text),
+            text=text,
+            complete=complete,
+            size=len(text.encode('utf-8'))
+        ))
+        self.evict(ExtractedText)
+
+    def get_summary(self, key):
+        if not self.enabled:
+            return None
+        entry = db.session.get(SummaryCacheEntry, key)
+        if entry is None:
+            self._count('summary_misses')
+            return None
+        self._count('summary_hits')
+        entry.hits += 1
+        entry.last_used_on = datetime.utcnow()
+        return entry.summary
+
+    def put_summary(self, key, text_sha256, model_name, summary):
+        if not self.enabled:
+            return
+        self._insert(SummaryCacheEntry(
+            key=key,
+            text_sha256=text_sha256,
+            model_name=model_name,
+            summary=summary,
+            size=len(summary.encode('utf-8'))
+        ))
+        self.evict(SummaryCacheEntry)
+
+    def _insert(self, entry):
+        # another worker may have cached the same content in the meantime
+        try:
+            with db.session.begin_nested():
+                db.session.add(entry)
+        except IntegrityError:
+            pass
+
+    def evict(self, model):
+        config = self.app.config
+        cutoff = datetime.utcnow() - timedelta(days=config['SUMMARY_CACHE_MAX_AGE_DAYS'])
+        db.session.execute(delete(model).where(model.last_used_on < cutoff))
+
+        count, total_size = db.session.query(func.count(), func.coalesce(func.sum(model.size), 0)).select_from(model).one()
+        excess_count = count - config['SUMMARY_CACHE_MAX_ENTRIES']
+        excess_size = total_size - config['SUMMARY_CACHE_MAX_BYTES']
+        if excess_count <= 0 and excess_size <= 0:
+            return
+
+        pk = model.__mapper__.primary_key[0]
+        doomed = []
+        for key, size in db.session.query(pk, model.size).order_by(model.last_used_on).all():
+            if excess_count <= 0 and excess_size <= 0:
+                break
+            doomed.append(key)
+            excess_count -= 1
+            excess_size -= size
+        for i in range(0, len(doomed), 500):
+            db.session.execute(delete(model).where(pk.in_(doomed[i:i + 500])))
+
+
+summary_cache = SummaryCache()
@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Config reads the environment at import: a private in-memory database per app,
+# no background threads, cheap password hashes and no start-up warmup
+os.environ.update(
+    DATABASE_URI='sqlite://',
+    AUTO_MIGRATE='1',
+    JOB_WORKERS='0',
+    WARMUP_ON_START='0',
+    TEMPLATE_CACHE_DIR='',
+    PASSWORD_HASH_METHOD='pbkdf2:sha256:1000',
+    PASSWORD_HASH_PROCESSES='0',
+)
+
+from config import Config  # noqa: E402
+
+PASSWORD = 'test-password'
+
+
+@pytest.fixture
+def make_app(monkeypatch):
+    """create_app() with Config attributes overridden, e.g. make_app(FRAGMENT_CACHE_BACKEND='none')."""
+    def make(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(Config, name, value)
+        from app import create_app
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        return app
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    # no app context is held here: requests share the g of an outer context,
+    # so tests open one only around their own database work
+    return make_app()
+
+
+def add_user(app, username='teacher', password=PASSWORD):
+    from extensions import db
+    from models import User
+    with app.app_context():
+        user = User(username=username)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def login(app, username='teacher', password=PASSWORD):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302, response.status_code
+    return client
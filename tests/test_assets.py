@@ -0,0 +1,80 @@
+import base64
+import hashlib
+import io
+import logging
+
+from assets import VENDOR, assets
+from conftest import add_user, login
+
+FONTAWESOME = 'vendor/fontawesome/css/all.min.css'
+
+
+def test_compile_templates_fills_the_bytecode_cache(make_app, tmp_path):
+    make_app(TEMPLATE_CACHE_DIR=str(tmp_path))
+    compiled = assets.compile_templates()
+    assert compiled == len(assets.template_names()) > 0
+    assert len(list(tmp_path.iterdir())) == compiled
+
+
+def test_cdn_stylesheet_keeps_its_integrity_hash(app):
+    from extensions import db
+    from models import Student
+    add_user(app)
+    with app.app_context():
+        student = Student(first_name='Anna', last_name='Student', email='anna@example.org')
+        db.session.add(student)
+        db.session.commit()
+        student_id = student.id
+    page = login(app).get(f'/students/{student_id}').get_data(as_text=True)
+    url, integrity = VENDOR[FONTAWESOME]
+    assert f'href="{url}" integrity="{integrity}" crossorigin="anonymous"' in page
+    bootstrap_url, bootstrap_integrity = VENDOR['vendor/bootstrap/js/bootstrap.bundle.min.js']
+    assert f'src="{bootstrap_url}" integrity="{bootstrap_integrity}"' in page
+
+
+def test_self_hosted_stylesheet_has_no_integrity_hash(app, monkeypatch):
+    monkeypatch.setattr(assets, 'manifest', {FONTAWESOME: 'vendor/fontawesome/css/all.min.0123456789ab.css'})
+    with app.test_request_context():
+        assert assets.url(FONTAWESOME).startswith('/static/dist/')
+        assert assets.integrity(FONTAWESOME) == ''
+
+
+def serve(monkeypatch, content):
+    import assets as assets_module
+    monkeypatch.setattr(assets_module.urllib.request, 'urlopen', lambda url, timeout: io.BytesIO(content))
+
+
+def test_fetch_vendor_rejects_content_that_does_not_match_its_hash(app, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    serve(monkeypatch, b'tampered')
+    assert assets.fetch_vendor() == ([], list(VENDOR))
+    assert list(tmp_path.rglob('*.*')) == []
+
+
+def test_fetch_vendor_keeps_content_that_matches_its_hash(app, monkeypatch, tmp_path):
+    import assets as assets_module
+    content = b'/* vendor */'
+    integrity = 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode()
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    monkeypatch.setattr(assets_module, 'VENDOR', {FONTAWESOME: (VENDOR[FONTAWESOME][0], integrity)})
+    serve(monkeypatch, content)
+    assert assets.fetch_vendor() == ([FONTAWESOME], [])
+    assert (tmp_path / FONTAWESOME).read_bytes() == content
+
+
+def test_start_up_warmup_is_off_unless_enabled(make_app, caplog):
+    with caplog.at_level(logging.INFO):
+        make_app()
+        assert 'Warmed up' not in caplog.text
+        make_app(WARMUP_ON_START=True)
+        assert 'Warmed up' in caplog.text
+
+
+def test_warmup_request_is_left_out_of_the_metrics(make_app):
+    from metrics import metrics
+    app = make_app(WARMUP_ON_START=True)
+    counts = dict(metrics.requests._values)
+    assets.warm_up()
+    assert metrics.requests._values == counts
+    app.test_client().get(app.config['WARMUP_PATH'])
+    assert metrics.requests._values != counts
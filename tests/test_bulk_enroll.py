@@ -0,0 +1,32 @@
+from datetime import date
+
+from conftest import add_user, login
+
+
+def seed(app):
+    from extensions import db
+    from models import Course, Student, Enrollment
+    teacher, colleague = add_user(app), add_user(app, 'colleague')
+    with app.app_context():
+        own = [Course(title=f'Own {i}', start_date=date(2025, 9, 1), user_id=teacher) for i in range(2)]
+        foreign = Course(title='Foreign', start_date=date(2025, 9, 1), user_id=colleague)
+        students = [Student(first_name='Anna', last_name=f'Student {i}', email=f's{i}@example.org') for i in range(2)]
+        db.session.add_all(own + [foreign] + students)
+        db.session.flush()
+        db.session.add(Enrollment(course_id=own[1].id, student_id=students[0].id))
+        db.session.commit()
+        return [c.id for c in own], foreign.id, [s.id for s in students]
+
+
+def test_student_enroll_bulk_reports_each_course(app):
+    own, foreign, students = seed(app)
+    response = login(app).post(f'/students/{students[0]}/enroll_bulk', json={'course_ids': own + [foreign, 999]})
+    assert response.get_json() == {
+        'enrolled': [own[0]], 'already_enrolled': [own[1]], 'not_allowed': [foreign], 'unknown': [999]
+    }
+
+
+def test_course_enroll_bulk_reports_each_student(app):
+    own, foreign, students = seed(app)
+    response = login(app).post(f'/courses/{own[1]}/enroll_bulk', json={'student_ids': students + [999]})
+    assert response.get_json() == {'enrolled': [students[1]], 'already_enrolled': [students[0]], 'unknown': [999]}
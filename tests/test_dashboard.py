@@ -0,0 +1,87 @@
+from datetime import date
+
+from sqlalchemy import event
+
+from conftest import add_user, login
+
+
+def seed(app):
+    """Two courses of one teacher and three students, the first of whom takes the first course."""
+    from extensions import db
+    from models import Course, Student, Enrollment
+    teacher = add_user(app)
+    with app.app_context():
+        courses = [Course(title=f'Course {i}', start_date=date(2025, 9, 1), user_id=teacher) for i in range(2)]
+        students = [Student(first_name='Anna', last_name=f'Student {i}', email=f's{i}@example.org') for i in range(3)]
+        db.session.add_all(courses + students)
+        db.session.flush()
+        db.session.add(Enrollment(course_id=courses[0].id, student_id=students[0].id))
+        db.session.commit()
+        return [c.id for c in courses], [s.id for s in students]
+
+
+def totals(client):
+    response = client.get('/dashboard.json')
+    assert response.status_code == 200
+    data = response.get_json()['totals']
+    return data['courses'], data['students'], data['enrollments']
+
+
+def test_totals_follow_enrollments(app):
+    courses, students = seed(app)
+    client = login(app)
+    assert totals(client) == (2, 3, 1)
+    assert client.post(f'/courses/{courses[1]}/add_student/{students[1]}').status_code == 302
+    assert totals(client) == (2, 3, 2)
+    client.post(f'/courses/{courses[1]}/enroll_bulk', json={'student_ids': students})
+    assert totals(client) == (2, 3, 4)
+    assert client.post(f'/courses/{courses[1]}/unenroll/{students[0]}').status_code == 302
+    assert totals(client) == (2, 3, 3)
+
+
+def test_totals_follow_deletes(app):
+    courses, students = seed(app)
+    client = login(app)
+    assert client.post(f'/students/{students[0]}/delete').status_code == 302
+    assert totals(client) == (2, 2, 0)
+    client.post(f'/courses/{courses[1]}/enroll_bulk', json={'student_ids': students[1:]})
+    assert client.post(f'/courses/{courses[1]}/delete').status_code == 302
+    assert totals(client) == (1, 2, 0)
+
+
+def test_totals_count_imported_students(app):
+    from bulk_io import import_students
+    seed(app)
+    rows = [{'first_name': 'Ivan', 'last_name': f'Import {i}', 'email': f'import{i}@example.org'} for i in range(3)]
+    with app.test_request_context():
+        assert import_students(rows, batch_size=2)[0] == 3
+    assert totals(login(app)) == (2, 6, 1)
+
+
+def test_dashboard_does_not_count_tables(app):
+    from extensions import db
+    seed(app)
+    client = login(app)
+    statements = []
+    with app.app_context():
+        engine = db.engines[None]
+    listener = lambda conn, cursor, statement, *args: statements.append(statement.lower())
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        totals(client)
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert not [s for s in statements if 'count(' in s or 'sum(course' in s]
+
+
+def test_reconcile_fixes_drifted_totals(app):
+    from extensions import db
+    from models import Total
+    seed(app)
+    with app.app_context():
+        db.session.query(Total).filter_by(name='students').update({'value': 99})
+        db.session.query(Total).filter_by(name='courses').delete()
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['reconcile-counters'])
+    assert '2 total(s)' in result.output
+    assert totals(login(app)) == (2, 3, 1)
@@ -0,0 +1,74 @@
+import re
+import shutil
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from conftest import add_user, login
+
+
+def add_course(app, title):
+    from extensions import db
+    from models import Course
+    with app.app_context():
+        db.session.add(Course(title=title, start_date=date(2025, 1, 1)))
+        db.session.commit()
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    """primary.db and a copy of it, replica.db; the primary then gets a row the replica lacks."""
+    from extensions import db
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    app = make_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{primary}')
+    add_user(app)
+    add_course(app, 'Replicated course')
+    with app.app_context():
+        db.engine.dispose()
+    shutil.copyfile(primary, replica)
+
+    app = make_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{primary}', DATABASE_REPLICA_URI=f'sqlite:///{replica}',
+                   DB_REPLICA_STICKY_SECONDS=1, DB_POOL_SIZE=1, DB_MAX_OVERFLOW=0,
+                   FRAGMENT_CACHE_BACKEND='none')  # show which database answered, not what was cached
+    add_course(app, 'Primary-only course')
+    return app
+
+
+def test_read_only_views_use_the_replica(app):
+    client = login(app)
+    page = client.get('/courses/').get_data(as_text=True)
+    assert 'Replicated course' in page
+    assert 'Primary-only course' not in page
+    assert 'Primary-only course' in client.get('/courses/export.csv').get_data(as_text=True)
+
+
+def test_reads_stay_on_the_primary_right_after_a_write(app):
+    client = login(app)
+    client.post('/courses/add', data={'title': 'My new course', 'start_date': '2025-09-01'})
+    assert 'My new course' in client.get('/courses/').get_data(as_text=True)
+    time.sleep(1.1)
+    assert 'My new course' not in client.get('/courses/').get_data(as_text=True)
+
+
+def test_pool_waits_are_exported(app):
+    errors = []
+
+    def browse():
+        client = login(app)
+        for _ in range(10):
+            if client.get('/courses/search?q=course').status_code != 200:
+                errors.append(1)
+
+    threads = [threading.Thread(target=browse) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    metrics = app.test_client().get('/metrics').get_data(as_text=True)
+    count = float(re.search(r'db_pool_wait_seconds_count\{pool="primary"\} (\S+)', metrics).group(1))
+    assert count > 0
+    assert 'db_pool_checked_out{pool="replica"}' in metrics
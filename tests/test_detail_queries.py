@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from conftest import add_user, login
+
+
+@pytest.fixture
+def app(make_app):
+    # without the fragment cache every request renders, and queries, the roster
+    return make_app(FRAGMENT_CACHE_BACKEND='none')
+
+
+def seed(app, size):
+    """A course with `size` students and a student in `size` courses."""
+    from extensions import db
+    from models import Course, Student, Enrollment
+    with app.app_context():
+        courses = [Course(title=f'Course {size}-{i}', start_date=date(2025, 9, 1)) for i in range(size)]
+        students = [Student(first_name='Anna', last_name=f'Student {size}-{i}', email=f's{size}-{i}@example.org')
+                    for i in range(size)]
+        db.session.add_all(courses + students)
+        db.session.flush()
+        db.session.add_all([Enrollment(course_id=courses[0].id, student_id=s.id) for s in students])
+        db.session.add_all([Enrollment(course_id=c.id, student_id=students[0].id) for c in courses[1:]])
+        db.session.commit()
+        return courses[0].id, students[0].id
+
+
+def count_statements(app, client, url):
+    from extensions import db
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_detail_pages_use_a_fixed_number_of_queries(app):
+    add_user(app)
+    small_course, small_student = seed(app, 1)
+    large_course, large_student = seed(app, 50)
+    client = login(app)
+    client.get('/')  # fills the login user cache
+
+    assert count_statements(app, client, f'/courses/{small_course}') == \
+        count_statements(app, client, f'/courses/{large_course}')
+    assert count_statements(app, client, f'/students/{small_student}') == \
+        count_statements(app, client, f'/students/{large_student}')
@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+
+from enrollment import bulk_enroll, _insert_ignoring_duplicates
+
+
+@pytest.fixture
+def db_session(app):
+    from extensions import db
+    with app.app_context():
+        yield db.session
+
+
+def seed(session, courses=2, students=3):
+    from models import Course, Student
+    course_rows = [Course(title=f'Course {i}', start_date=date(2025, 9, 1)) for i in range(courses)]
+    student_rows = [Student(first_name='Anna', last_name=f'Student {i}', email=f's{i}@example.org')
+                    for i in range(students)]
+    session.add_all(course_rows + student_rows)
+    session.commit()
+    return [c.id for c in course_rows], [s.id for s in student_rows]
+
+
+def enrolled_today(session):
+    from models import EnrollmentDaily
+    rows = session.query(EnrollmentDaily.course_id, EnrollmentDaily.enrolled).all()
+    return {course_id: enrolled for course_id, enrolled in rows}
+
+
+@pytest.mark.parametrize('returning', [True, False], ids=['returning', 'rowcount'])
+def test_rows_lost_to_a_concurrent_insert_are_not_counted(db_session, monkeypatch, returning):
+    from models import Course, Student
+    courses, students = seed(db_session)
+    monkeypatch.setattr(db_session.connection().dialect, 'insert_executemany_returning', returning)
+    bulk_enroll(course_id=courses[0], student_ids=students[:1])
+    db_session.commit()
+
+    # as if another request enrolled students[0] between bulk_enroll's check and its INSERT
+    rows = ([{'course_id': courses[0], 'student_id': s} for s in students]
+            + [{'course_id': courses[1], 'student_id': students[0]}])
+    inserted = _insert_ignoring_duplicates(rows)
+    db_session.commit()
+
+    assert inserted == rows[1:]
+
+    assert enrolled_today(db_session) == {courses[0]: 3, courses[1]: 1}
+    assert db_session.get(Course, courses[0]).enrollment_count == 3
+    assert db_session.get(Student, students[0]).enrollment_count == 2
+
+
+def test_bulk_enroll_in_many_courses_counts_each_course(db_session):
+    courses, students = seed(db_session, courses=3)
+    enrolled, already, unknown = bulk_enroll(student_id=students[0], course_ids=courses + [999])
+    db_session.commit()
+    assert (enrolled, already, unknown) == (courses, [], [999])
+    assert enrolled_today(db_session) == {course_id: 1 for course_id in courses}
+
+
+@pytest.mark.parametrize('returning', [True, False], ids=['returning', 'rowcount'])
+def test_students_enrolled_first_by_a_concurrent_request_are_already_enrolled(db_session, monkeypatch, returning):
+    import enrollment
+    from models import Enrollment
+    courses, students = seed(db_session)
+    monkeypatch.setattr(db_session.connection().dialect, 'insert_executemany_returning', returning)
+    insert = enrollment._insert_ignoring_duplicates
+
+    def racing_insert(rows):
+        db_session.execute(Enrollment.__table__.insert(), [{'course_id': courses[0], 'student_id': students[1]}])
+        return insert(rows)
+
+    monkeypatch.setattr(enrollment, '_insert_ignoring_duplicates', racing_insert)
+    enrolled, already, unknown = bulk_enroll(course_id=courses[0], student_ids=students + [999])
+    db_session.commit()
+    assert (enrolled, already, unknown) == ([students[0], students[2]], [students[1]], [999])
+    assert enrolled_today(db_session) == {courses[0]: 2}
@@ -0,0 +1,96 @@
+from datetime import date
+import re
+
+import pytest
+
+from conftest import add_user, login
+from fragment_cache import fragment_cache
+
+# tokens carry a timestamp, so two renders a second apart differ in them alone
+CSRF_TOKEN = re.compile(r'(name="csrf_token" type="hidden" value|data-csrf)="[^"]+"')
+
+
+@pytest.fixture
+def school(app):
+    """The teacher's course with one student enrolled, a second course and a student in neither."""
+    from extensions import db
+    from models import Course, Student, Enrollment
+    teacher = add_user(app)
+    with app.app_context():
+        harmony = Course(title='Harmony I', start_date=date(2025, 9, 1), user_id=teacher)
+        solfege = Course(title='Solfege I', start_date=date(2025, 9, 2), user_id=teacher)
+        anna = Student(first_name='Anna', last_name='Petrova', email='anna@example.org')
+        ivan = Student(first_name='Ivan', last_name='Kim', email='ivan@example.org')
+        db.session.add_all([harmony, solfege, anna, ivan])
+        db.session.flush()
+        db.session.add(Enrollment(course_id=harmony.id, student_id=anna.id))
+        db.session.commit()
+        return {'harmony': harmony.id, 'solfege': solfege.id, 'anna': anna.id, 'ivan': ivan.id}
+
+
+def page(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return CSRF_TOKEN.sub(r'\1=""', response.get_data(as_text=True))
+
+
+def test_unchanged_fragments_are_served_from_the_cache(app, school):
+    client = login(app)
+    first = page(client, f"/courses/{school['harmony']}")
+    hits = fragment_cache.counters['hits']
+    assert page(client, f"/courses/{school['harmony']}") == first
+    assert fragment_cache.counters['hits'] == hits + 2  # roster and picker
+
+
+def test_student_rename_updates_the_course_roster(app, school):
+    client = login(app)
+    assert 'Petrova' in page(client, f"/courses/{school['harmony']}")
+    response = client.post(f"/students/{school['anna']}/edit",
+                           data={'first_name': 'Anna', 'last_name': 'Sadykova', 'email': 'anna@example.org'})
+    assert response.status_code == 302
+    roster = page(client, f"/courses/{school['harmony']}")
+    assert 'Sadykova' in roster
+    assert 'Petrova' not in roster
+
+
+def pickers_offer_ivan(client, school, course):
+    course_page = page(client, f"/courses/{school[course]}")
+    student_page = page(client, f"/students/{school['ivan']}")
+    return (f"/courses/{school[course]}/add_student/{school['ivan']}" in course_page,
+            f"/students/{school['ivan']}/enroll/{school[course]}" in student_page)
+
+
+def test_enroll_updates_both_pickers(app, school):
+    client = login(app)
+    assert pickers_offer_ivan(client, school, 'harmony') == (True, True)
+    assert client.post(f"/courses/{school['harmony']}/add_student/{school['ivan']}").status_code == 302
+    assert pickers_offer_ivan(client, school, 'harmony') == (False, False)
+    assert f"/courses/{school['harmony']}/unenroll/{school['ivan']}" in page(client, f"/courses/{school['harmony']}")
+
+
+def test_bulk_enroll_of_students_updates_both_pickers(app, school):
+    client = login(app)
+    assert pickers_offer_ivan(client, school, 'harmony') == (True, True)
+    response = client.post(f"/courses/{school['harmony']}/enroll_bulk", json={'student_ids': [school['ivan']]})
+    assert response.get_json()['enrolled'] == [school['ivan']]
+    assert pickers_offer_ivan(client, school, 'harmony') == (False, False)
+
+
+def test_bulk_enroll_in_courses_updates_both_pickers(app, school):
+    client = login(app)
+    assert pickers_offer_ivan(client, school, 'solfege') == (True, True)
+    response = client.post(f"/students/{school['ivan']}/enroll_bulk", json={'course_ids': [school['solfege']]})
+    assert response.get_json()['enrolled'] == [school['solfege']]
+    assert pickers_offer_ivan(client, school, 'solfege') == (False, False)
+
+
+def test_course_edit_updates_the_student_page_and_the_course_list(app, school):
+    client = login(app)
+    for url in (f"/students/{school['anna']}", f"/students/{school['ivan']}", '/courses/'):
+        assert 'Harmony I' in page(client, url)
+    response = client.post(f"/courses/{school['harmony']}/edit", data={'title': 'Counterpoint', 'start_date': '2025-09-01'})
+    assert response.status_code == 302
+    for url in (f"/students/{school['anna']}", f"/students/{school['ivan']}", '/courses/'):
+        html = page(client, url)
+        assert 'Counterpoint' in html
+        assert 'Harmony I' not in html
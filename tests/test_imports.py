@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY = ('fitz', 'pymupdf', 'google.generativeai')
+
+
+def test_start_up_does_not_import_heavy_modules():
+    # a fresh interpreter: this one has imported whatever earlier tests needed
+    code = ("import sys; from app import create_app; create_app(); "
+            f"print([name for name in {LAZY!r} if name in sys.modules])")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=os.environ.copy(),
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == '[]'
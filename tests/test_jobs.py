@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+
+import transcode
+from jobs import job_queue, JobError, FAILED, PENDING
+
+
+@pytest.fixture
+def course(app):
+    from extensions import db
+    from models import Course
+    with app.app_context():
+        course = Course(title='Harmony I', start_date=date(2025, 9, 1))
+        db.session.add(course)
+        db.session.commit()
+        yield course
+
+
+def run(kind, course):
+    from extensions import db
+    job = job_queue.enqueue(kind, course)
+    db.session.commit()
+    job_queue.run_pending()
+    db.session.refresh(job)
+    return job
+
+
+def test_exception_message_becomes_the_error(app, course):
+    def handler(course):
+        raise JobError("Source is gone.")
+    job_queue.register('test-raise', handler, status_attr=None)
+    job = run('test-raise', course)
+    assert job.status == PENDING
+    assert job.last_error == "Source is gone."
+
+
+def test_false_without_error_attr_is_a_generic_error(app, course):
+    course.material_summary = "A summary, not an error."
+    job_queue.register('test-false', lambda course: False, status_attr=None)
+    job = run('test-false', course)
+    assert job.last_error == "Handler reported failure."
+
+
+def test_summary_job_reports_the_summary_error(app, course):
+    course.material_path = 'missing.pdf'
+    app.config['JOB_MAX_ATTEMPTS'] = 1
+    job = run('summary', course)
+    assert job.status == FAILED
+    assert job.last_error == course.material_summary == "Error: PDF file not found for summarization."
+
+
+def test_media_job_reports_missing_media(app, course, monkeypatch):
+    monkeypatch.setattr(transcode, 'ffmpeg_available', lambda binary: True)
+    course.material_path = 'missing.mp4'
+    course.material_summary = "A summary, not an error."
+    job = run('media', course)
+    assert job.last_error.startswith("Media not found at ")
+    assert course.media_status == PENDING
@@ -0,0 +1,129 @@
+import threading
+
+from werkzeug.security import generate_password_hash
+
+from conftest import PASSWORD, add_user
+from passwords import passwords
+
+
+def post_login(app, username='teacher', password=PASSWORD, **kwargs):
+    return app.test_client().post('/login', data={'username': username, 'password': password}, **kwargs)
+
+
+def stored_hash(app, username='teacher'):
+    from extensions import db
+    from models import User
+    with app.app_context():
+        return db.session.execute(db.select(User.password_hash).filter_by(username=username)).scalar_one()
+
+
+def set_hash(app, pwhash, username='teacher'):
+    from extensions import db
+    from models import User
+    with app.app_context():
+        db.session.execute(db.update(User).filter_by(username=username).values(password_hash=pwhash))
+        db.session.commit()
+
+
+def test_old_hash_is_upgraded_on_login(app):
+    add_user(app)
+    set_hash(app, generate_password_hash(PASSWORD, 'pbkdf2:sha256:500'))
+    rehashes = passwords.counters['rehashes']
+
+    assert post_login(app).status_code == 302
+    assert stored_hash(app).startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert passwords.counters['rehashes'] == rehashes + 1
+
+    assert post_login(app).status_code == 302
+    assert passwords.counters['rehashes'] == rehashes + 1
+
+
+def test_wrong_password_keeps_the_old_hash(app):
+    old = generate_password_hash(PASSWORD, 'pbkdf2:sha256:500')
+    add_user(app)
+    set_hash(app, old)
+    assert post_login(app, password='wrong').status_code == 200
+    assert stored_hash(app) == old
+
+
+def test_username_is_throttled_after_repeated_failures(make_app):
+    app = make_app(LOGIN_MAX_FAILURES_PER_USER=3)
+    add_user(app)
+    add_user(app, 'other')
+    for _ in range(3):
+        assert post_login(app, password='wrong').status_code == 200
+    response = post_login(app)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert post_login(app, 'other').status_code == 302
+
+
+def test_success_resets_the_failure_count(make_app):
+    app = make_app(LOGIN_MAX_FAILURES_PER_USER=3)
+    add_user(app)
+    for _ in range(2):
+        post_login(app, password='wrong')
+    assert post_login(app).status_code == 302
+    for _ in range(2):
+        post_login(app, password='wrong')
+    assert post_login(app).status_code == 302
+
+
+def test_client_ip_is_throttled(make_app):
+    app = make_app(LOGIN_MAX_ATTEMPTS_PER_IP=3)
+    add_user(app)
+    for _ in range(3):
+        assert post_login(app).status_code == 302
+    assert post_login(app).status_code == 429
+    assert post_login(app, environ_base={'REMOTE_ADDR': '203.0.113.5'}).status_code == 302
+
+
+def test_filesystem_backend_shares_counts_between_workers(make_app, tmp_path):
+    settings = dict(LOGIN_THROTTLE_BACKEND='filesystem', LOGIN_THROTTLE_DIR=str(tmp_path), LOGIN_MAX_ATTEMPTS_PER_IP=2)
+    app = make_app(**settings)
+    add_user(app)
+    assert post_login(app).status_code == 302
+    assert post_login(app).status_code == 302
+    other_worker = make_app(**settings)
+    add_user(other_worker)
+    assert post_login(other_worker).status_code == 429
+
+
+def test_client_ip_behind_a_proxy_is_the_forwarded_one(make_app):
+    app = make_app(LOGIN_MAX_ATTEMPTS_PER_IP=3, PROXY_HOPS=1)
+    add_user(app)
+    proxy = {'REMOTE_ADDR': '10.0.0.2'}
+    for _ in range(3):
+        assert post_login(app, environ_base=proxy, headers={'X-Forwarded-For': '203.0.113.5'}).status_code == 302
+    assert post_login(app, environ_base=proxy, headers={'X-Forwarded-For': '203.0.113.5'}).status_code == 429
+    assert post_login(app, environ_base=proxy, headers={'X-Forwarded-For': '203.0.113.6'}).status_code == 302
+    # a client cannot pick its address by sending the header past the proxy
+    spoofed = {'X-Forwarded-For': '203.0.113.5, 198.51.100.7'}
+    assert post_login(app, environ_base=proxy, headers=spoofed).status_code == 302
+
+
+def test_overflow_gets_busy_when_every_hashing_slot_is_taken(make_app):
+    # a slow hash and one slot: concurrent logins cannot all get in within 10 ms
+    app = make_app(PASSWORD_HASH_METHOD='pbkdf2:sha256:300000', PASSWORD_HASH_QUEUE=1, PASSWORD_HASH_WAIT=0.01)
+    for i in range(8):
+        add_user(app, f'user{i}')
+    statuses = []
+    threads = [threading.Thread(target=lambda i=i: statuses.append(post_login(app, f'user{i}').status_code))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 302 in statuses
+    assert 503 in statuses
+    assert set(statuses) == {302, 503}
+
+
+def test_hashing_processes_are_not_forked_from_the_web_process(make_app):
+    app = make_app(PASSWORD_HASH_PROCESSES=1)
+    try:
+        add_user(app)
+        assert post_login(app).status_code == 302
+        assert passwords._executor._mp_context.get_start_method() == 'forkserver'
+    finally:
+        passwords.shutdown()
@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import subprocess
+from datetime import date
+
+import pytest
+
+FFMPEG = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+SECONDS = 3
+
+pytestmark = pytest.mark.skipif(shutil.which(FFMPEG) is None, reason="ffmpeg not installed")
+
+
+@pytest.fixture
+def app(app, tmp_path):
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    app.config['MEDIA_PROCESSES'] = 1
+    with app.app_context():
+        yield app
+
+
+def sample(tmp_path, name, *arguments):
+    path = str(tmp_path / name)
+    subprocess.run([FFMPEG, '-hide_banner', '-loglevel', 'error', '-y', *arguments, path], check=True)
+    return path
+
+
+@pytest.fixture
+def video(tmp_path):
+    return sample(tmp_path, 'lesson.mp4',
+                  '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={SECONDS}',
+                  '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={SECONDS}',
+                  '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '4M', '-c:a', 'aac', '-b:a', '192k')
+
+
+@pytest.fixture
+def audio(tmp_path):
+    return sample(tmp_path, 'scales.mp3',
+                  '-f', 'lavfi', '-i', f"aevalsrc='sin(2*PI*(220+110*floor(t))*t)':s=44100:d={SECONDS}",
+                  '-ac', '2', '-c:a', 'libmp3lame', '-b:a', '320k')
+
+
+def process(path, title='Lesson'):
+    from extensions import db
+    from jobs import job_queue
+    from models import Course
+    from storage import blob_store, attach_material
+    course = Course(title=title, start_date=date(2025, 9, 1))
+    with open(path, 'rb') as f:
+        attach_material(course, blob_store.save(f, path.rsplit('.', 1)[1]), os.path.basename(path))
+    db.session.add(course)
+    db.session.flush()
+    job_queue.enqueue('media', course)
+    db.session.commit()
+    job_queue.run_pending()
+    db.session.refresh(course)
+    return course
+
+
+def size(relative_path):
+    from storage import blob_store
+    return os.path.getsize(blob_store.full_path(relative_path))
+
+
+def test_video_gets_a_smaller_rendition_and_a_poster(app, video):
+    from storage import blob_store
+    course = process(video)
+    assert course.media_status == 'done'
+    assert size(course.rendition_path) < size(course.material_path)
+    with open(blob_store.full_path(course.poster_path), 'rb') as f:
+        assert f.read(3) == b'\xff\xd8\xff'
+
+
+def test_audio_gets_a_smaller_rendition_and_a_waveform(app, audio):
+    from storage import blob_store
+    course = process(audio)
+    assert course.media_status == 'done'
+    assert size(course.rendition_path) < size(course.material_path)
+    with open(blob_store.full_path(course.waveform_path)) as f:
+        waveform = json.load(f)
+    assert abs(waveform['duration'] - SECONDS) < 1
+    assert 0 < len(waveform['peaks']) <= app.config['WAVEFORM_POINTS']
+    assert max(waveform['peaks']) == 1.0
+
+
+def test_identical_upload_reuses_the_renditions(app, video):
+    first = process(video)
+    twin = process(video, 'Lesson (copy)')
+    assert twin.media_status == 'done'
+    assert twin.rendition_path == first.rendition_path
+    assert twin.poster_path == first.poster_path
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+from werkzeug.exceptions import NotFound
+
+from media import send_media
+
+SIZE = 256 * 1024
+
+
+@pytest.fixture
+def media(app, tmp_path):
+    """(client, url, data): a random file served by send_media from a temporary upload folder."""
+    upload_dir = tmp_path / 'uploads'
+    upload_dir.mkdir()
+    (tmp_path / 'secret.txt').write_text('not for download')
+    data = os.urandom(SIZE)
+    (upload_dir / 'lecture.mp4').write_bytes(data)
+    app.add_url_rule('/media/<path:filename>', 'test_media', lambda filename: send_media(str(upload_dir), filename))
+    return app.test_client(), '/media/lecture.mp4', data
+
+
+def test_full_download(media):
+    client, url, data = media
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'] and not response.headers['ETag'].startswith('W/')
+    assert 'max-age' in response.headers['Cache-Control']
+
+
+@pytest.mark.parametrize('header, start, end', [
+    ('bytes=0-99', 0, 99),
+    (f'bytes={SIZE // 2}-{SIZE // 2 + 4095}', SIZE // 2, SIZE // 2 + 4095),
+    (f'bytes={SIZE - 10}-', SIZE - 10, SIZE - 1),
+    ('bytes=-500', SIZE - 500, SIZE - 1),
+    (f'bytes={SIZE - 5}-{SIZE + 100}', SIZE - 5, SIZE - 1),
+])
+def test_range_returns_partial_content(media, header, start, end):
+    client, url, data = media
+    response = client.get(url, headers={'Range': header})
+    assert response.status_code == 206
+    assert response.data == data[start:end + 1]
+    assert response.headers['Content-Range'] == f'bytes {start}-{end}/{SIZE}'
+    assert int(response.headers['Content-Length']) == end - start + 1
+
+
+def test_range_past_the_end_is_not_satisfiable(media):
+    client, url, _ = media
+    assert client.get(url, headers={'Range': f'bytes={SIZE}-'}).status_code == 416
+
+
+def test_conditional_requests(media):
+    client, url, _ = media
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': etag}).status_code == 206
+    response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert len(response.data) == SIZE
+
+
+def test_etag_changes_with_the_file(media, tmp_path):
+    client, url, _ = media
+    etag = client.get(url).headers['ETag']
+    path = tmp_path / 'uploads' / 'lecture.mp4'
+    path.write_bytes(os.urandom(SIZE + 1))
+    assert client.get(url).headers['ETag'] != etag
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_missing_and_outside_paths_are_not_found(app, media, tmp_path):
+    client, _, _ = media
+    assert client.get('/media/missing.mp4').status_code == 404
+    assert client.get('/media/../secret.txt').status_code == 404
+    assert client.get('/media/..%2Fsecret.txt').status_code == 404
+    assert client.get('/uploads/../config.py').status_code == 404
+    assert client.get('/uploads/..%2Fconfig.py').status_code == 404
+    with app.test_request_context():
+        for filename in ('../secret.txt', str(tmp_path / 'secret.txt'), 'uploads/../../secret.txt'):
+            with pytest.raises(NotFound):
+                send_media(str(tmp_path / 'uploads'), filename)
+
+
+@pytest.mark.parametrize('mode, header', [('x-sendfile', 'X-Sendfile'), ('x-accel', 'X-Accel-Redirect')])
+def test_offload_leaves_the_body_to_the_web_server(app, media, mode, header):
+    client, url, _ = media
+    etag = client.get(url).headers['ETag']
+    app.config['MEDIA_OFFLOAD'] = mode
+    response = client.get(url, headers={'Range': 'bytes=0-99'})
+    assert response.status_code == 200
+    assert header in response.headers
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert header not in response.headers
@@ -0,0 +1,34 @@
+from conftest import add_user, login
+
+REMOTE = {'REMOTE_ADDR': '203.0.113.5'}
+
+
+def test_metrics_are_denied_to_anonymous_remote_clients(app):
+    response = app.test_client().get('/metrics', environ_base=REMOTE)
+    assert response.status_code == 403
+    assert b'http_requests_total' not in response.data
+
+
+def test_metrics_are_served_to_local_scrapers(app):
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 200
+    # a reverse proxy on the same host connects from loopback too
+    assert client.get('/metrics', headers={'X-Forwarded-For': '203.0.113.5'}).status_code == 403
+
+
+def test_metrics_are_served_to_admins(make_app):
+    app = make_app(ADMIN_USERNAMES={'admin'})
+    add_user(app, 'admin')
+    add_user(app, 'teacher')
+    assert login(app, 'teacher').get('/metrics', environ_base=REMOTE).status_code == 403
+    assert login(app, 'admin').get('/metrics', environ_base=REMOTE).status_code == 200
+
+
+def test_metrics_token_is_required_when_set(make_app):
+    app = make_app(METRICS_TOKEN='s3cret')
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}, environ_base=REMOTE)
+    assert response.status_code == 200
+    assert b'http_requests_total' in response.data
@@ -0,0 +1,39 @@
+import threading
+import time
+
+from summarizer import map_reduce_summarize
+
+
+def test_rate_limit_is_shared_by_every_caller_in_the_process(make_app):
+    app = make_app(SUMMARIZER_BACKEND='fake', SUMMARY_RATE_PER_MINUTE=1200, SUMMARY_CACHE_ENABLED=False)
+    service = app.extensions['summarizer']
+    backends = [service.backend('model-a'), service.backend('model-b')]
+
+    def call(backend):
+        for i in range(3):
+            backend.generate(f"prompt {i}\n\ntext")
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=call, args=(backend,)) for backend in backends]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # six calls at one per 50 ms: the first starts at once, the others wait their turn
+    assert time.monotonic() - start >= 5 * 0.05
+
+
+def test_map_and_reduce_stages_use_the_same_limiter(make_app):
+    app = make_app(SUMMARIZER_BACKEND='fake', SUMMARY_RATE_PER_MINUTE=1200, SUMMARY_CACHE_ENABLED=False,
+                   SUMMARY_CHUNK_CHARS=200, SUMMARY_CHUNK_OVERLAP=0)
+    text = "\n".join(f"Line {i} of a long document about harmony." for i in range(40))
+    service = app.extensions['summarizer']
+    before = service.metrics()['calls']
+    with app.app_context():
+        backend = service.backend()
+        start = time.monotonic()
+        map_reduce_summarize(text, backend, backend.model_name, {})
+        elapsed = time.monotonic() - start
+    calls = service.metrics()['calls'] - before
+    assert calls > 2
+    assert elapsed >= (calls - 1) * 0.05
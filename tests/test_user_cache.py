@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import add_user, login
+from user_cache import user_cache
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(USER_CACHE_BACKEND='memory')
+
+
+def test_logged_in_user_is_served_from_the_cache(app):
+    add_user(app)
+    client = login(app)
+    client.get('/courses/')
+    hits, misses = user_cache.counters['hits'], user_cache.counters['misses']
+    assert client.get('/courses/').status_code == 200
+    assert user_cache.counters['hits'] == hits + 1
+    assert user_cache.counters['misses'] == misses
+
+
+def test_password_change_drops_the_cached_user(app):
+    from extensions import db
+    from models import User
+    user_id = add_user(app)
+    client = login(app)
+    client.get('/courses/')
+    invalidations, misses = user_cache.counters['invalidations'], user_cache.counters['misses']
+    with app.app_context():
+        db.session.get(User, user_id).set_password('changed')
+        db.session.commit()
+    assert user_cache.counters['invalidations'] == invalidations + 1
+    assert client.get('/courses/').status_code == 200
+    assert user_cache.counters['misses'] == misses + 1
+
+
+def test_deleted_user_is_logged_out(app):
+    from extensions import db
+    from models import User
+    user_id = add_user(app)
+    client = login(app)
+    client.get('/courses/')
+    with app.app_context():
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+    assert client.get('/courses/').status_code == 302
+
+
+def test_password_hash_is_not_cached(app):
+    user_id = add_user(app)
+    login(app).get('/courses/')
+    cached = user_cache.backend.get(f'user:{user_id}')
+    assert 'teacher' in cached
+    assert 'password_hash' not in cached
@@ -0,0 +1,232 @@
+# background media processing: light renditions, video posters and audio waveforms
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from jobs import JobError
+from metrics import timed
+from models import Blob, Course
+from storage import blob_store
+
+VIDEO_EXTENSIONS = ('mp4',)
+AUDIO_EXTENSIONS = ('mp3',)
+MEDIA_EXTENSIONS = VIDEO_EXTENSIONS + AUDIO_EXTENSIONS
+MEDIA_ATTRS = ('rendition_path', 'poster_path', 'waveform_path')
+WAVEFORM_SAMPLE_RATE = 8000
+WAVEFORM_WINDOW = 80  # samples per peak at 8 kHz: 100 peaks per second before downsampling
+READ_SIZE = 64 * 1024
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def is_media(filename):
+    return bool(filename) and filename.rsplit('.', 1)[-1].lower() in MEDIA_EXTENSIONS
+
+
+def ffmpeg_available(binary):
+    return shutil.which(binary) is not None
+
+
+def _run_ffmpeg(binary, args, timeout):
+    try:
+        result = subprocess.run(
+            [binary, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y'] + args,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f"ffmpeg timed out after {timeout}s.")
+    if result.returncode != 0:
+        raise TranscodeError(result.stderr.decode('utf-8', 'replace').strip()[-2000:] or f"ffmpeg exited with {result.returncode}.")
+
+
+def make_video_rendition(binary, src, dst, height, video_bitrate, audio_bitrate, timeout):
+    """H.264/AAC at most `height` pixels high, capped bitrate, moov atom first so playback starts early."""
+    _run_ffmpeg(binary, [
+        '-i', src,
+        '-vf', f"scale=-2:'min({height},ih)'",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+        '-maxrate', video_bitrate, '-bufsize', video_bitrate,
+        '-c:a', 'aac', '-b:a', audio_bitrate, '-ac', '2',
+        '-movflags', '+faststart', '-fflags', '+bitexact',
+        dst
+    ], timeout)
+    return dst
+
+
+def make_poster(binary, src, dst, height, timeout):
+    """A representative JPEG frame from the first seconds of the video."""
+    _run_ffmpeg(binary, [
+        '-i', src,
+        '-vf', f"thumbnail=60,scale=-2:'min({height},ih)'",
+        '-frames:v', '1', '-q:v', '4', '-update', '1',
+        dst
+    ], timeout)
+    return dst
+
+
+def make_audio_rendition(binary, src, dst, audio_bitrate, timeout):
+    _run_ffmpeg(binary, [
+        '-i', src, '-vn',
+        '-c:a', 'libmp3lame', '-b:a', audio_bitrate, '-ac', '1',
+        '-map_metadata', '-1', '-fflags', '+bitexact',
+        dst
+    ], timeout)
+    return dst
+
+
+def _downsample(peaks, points):
+    if len(peaks) <= points:
+        return peaks
+    step = len(peaks) / points
+    return [max(peaks[int(i * step):int((i + 1) * step)] or [0]) for i in range(points)]
+
+
+def make_waveform(binary, src, dst, points, timeout):
+    """
+    Decodes the audio to 8 kHz mono PCM through a pipe and writes normalised peaks
+    as JSON ({"duration": seconds, "peaks": [0..1, ...]}). Memory stays constant:
+    only one read buffer and the peak list are held.
+    """
+    process = subprocess.Popen(
+        [binary, '-hide_banner', '-loglevel', 'error', '-nostdin', '-i', src,
+         '-vn', '-ac', '1', '-ar', str(WAVEFORM_SAMPLE_RATE), '-f', 's16le', '-'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    peaks = []
+    samples = 0
+    window_bytes = WAVEFORM_WINDOW * 2
+    leftover = b''
+    try:
+        for data in iter(lambda: process.stdout.read(READ_SIZE), b''):
+            data = leftover + data
+            usable = len(data) - len(data) % window_bytes
+            leftover = data[usable:]
+            pending = array('h', data[:usable])
+            if sys.byteorder == 'big':
+                pending.byteswap()
+            for start in range(0, len(pending), WAVEFORM_WINDOW):
+                window = pending[start:start + WAVEFORM_WINDOW]
+                peaks.append(max(max(window), -min(window)))
+            samples += len(pending)
+        if len(leftover) >= 2:
+            window = array('h', leftover[:len(leftover) - len(leftover) % 2])
+            if sys.byteorder == 'big':
+                window.byteswap()
+            peaks.append(max(max(window), -min(window)))
+            samples += len(window)
+        stderr = process.stderr.read()
+        process.wait()
+    finally:
+        timer.cancel()
+    if process.returncode != 0:
+        raise TranscodeError(stderr.decode('utf-8', 'replace').strip()[-2000:] or f"ffmpeg exited with {process.returncode}.")
+
+    peaks = _downsample(peaks, points)
+    loudest = max(peaks) if peaks else 0
+    with open(dst, 'w') as f:
+        json.dump({
+            'duration': round(samples / WAVEFORM_SAMPLE_RATE, 2),
+            'peaks': [round(p / loudest, 3) if loudest else 0 for p in peaks]
+        }, f, separators=(',', ':'))
+    return dst
+
+
+def _tasks(source, extension, workdir, config):
+    binary = config['FFMPEG_BINARY']
+    timeout = config['MEDIA_TIMEOUT']
+    if extension in VIDEO_EXTENSIONS:
+        return {
+            'rendition_path': (make_video_rendition, (
+                binary, source, os.path.join(workdir, 'rendition.mp4'), config['MEDIA_VIDEO_HEIGHT'],
+                config['MEDIA_VIDEO_BITRATE'], config['MEDIA_AUDIO_BITRATE'], timeout)),
+            'poster_path': (make_poster, (
+                binary, source, os.path.join(workdir, 'poster.jpg'), config['MEDIA_POSTER_HEIGHT'], timeout)),
+        }
+    return {
+        'rendition_path': (make_audio_rendition, (
+            binary, source, os.path.join(workdir, 'rendition.mp3'), config['MEDIA_AUDIO_BITRATE'], timeout)),
+        'waveform_path': (make_waveform, (
+            binary, source, os.path.join(workdir, 'waveform.json'), config['WAVEFORM_POINTS'], timeout)),
+    }
+
+
+def release_media(course):
+    """Drops the course's references on its derived files. The caller commits."""
+    paths = [getattr(course, attr) for attr in MEDIA_ATTRS if getattr(course, attr)]
+    for blob in Blob.query.filter(Blob.path.in_(paths)).all() if paths else []:
+        blob_store.release(blob)
+    for attr in MEDIA_ATTRS:
+        setattr(course, attr, None)
+
+
+def _reuse_from_twin(course):
+    # another course with the same material already has its variants: share them
+    twin = Course.query.filter(
+        Course.id != course.id,
+        Course.material_blob_id == course.material_blob_id,
+        Course.media_status == 'done',
+        Course.rendition_path.isnot(None)
+    ).first()
+    if twin is None:
+        return False
+    paths = [getattr(twin, attr) for attr in MEDIA_ATTRS if getattr(twin, attr)]
+    blobs = Blob.query.filter(Blob.path.in_(paths)).all()
+    if len(blobs) != len(paths):
+        return False
+    for blob in blobs:
+        blob_store.retain(blob)
+    for attr in MEDIA_ATTRS:
+        setattr(course, attr, getattr(twin, attr))
+    return True
+
+
+@timed('media_process')
+def process_course_media(course):
+    """
+    Job handler for the 'media' queue: builds the light rendition plus a poster
+    (video) or waveform (audio) for the course's mp3/mp4 material. The ffmpeg runs
+    proceed in parallel, each waited on by a thread of its own.
+    """
+    release_media(course)
+    filename = course.material_path
+    extension = filename.rsplit('.', 1)[-1].lower() if filename else ''
+    if extension not in MEDIA_EXTENSIONS:
+        return True
+    config = current_app.config
+    if not ffmpeg_available(config['FFMPEG_BINARY']):
+        current_app.logger.warning(f"ffmpeg not found ({config['FFMPEG_BINARY']}); serving the original media for course ID {course.id}.")
+        return True
+    source = blob_store.full_path(filename)
+    if not os.path.exists(source):
+        raise JobError(f"Media not found at {source}.")
+    if course.material_blob_id is not None and _reuse_from_twin(course):
+        current_app.logger.info(f"Reused media renditions of identical material for course ID {course.id}.")
+        return True
+
+    os.makedirs(blob_store.tmp_dir, exist_ok=True)
+    workdir = tempfile.mkdtemp(dir=blob_store.tmp_dir)
+    try:
+        tasks = _tasks(source, extension, workdir, config)
+        executor = ThreadPoolExecutor(max_workers=max(1, min(config['MEDIA_PROCESSES'], len(tasks))))
+        try:
+            futures = {attr: executor.submit(func, *args) for attr, (func, args) in tasks.items()}
+            outputs = {attr: future.result() for attr, future in futures.items()}
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for attr, output in outputs.items():
+            blob = blob_store.adopt(output, output.rsplit('.', 1)[1])
+            setattr(course, attr, blob.path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    current_app.logger.info(f"Processed {extension} media for course ID {course.id}.")
+    return True
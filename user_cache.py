@@ -0,0 +1,126 @@
+# read-through cache for the Flask-Login user loader
+import json
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from cache_backends import make_backend
+from extensions import db
+from models import User
+
+CACHED_COLUMNS = ('id', 'username')
+PENDING_KEY = 'user_cache_ids'
+
+
+class UserCache:
+    """
+    Keeps the identity columns of logged-in users so load_user does not query the
+    database on every request. A hit is merged into the session without a SELECT;
+    anything not cached (the password hash) loads lazily if it is ever touched.
+    Entries are dropped when a commit changes or deletes the user.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = None
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['user_cache'] = self
+        config = app.config
+        self.backend = make_backend(
+            config['USER_CACHE_BACKEND'], config['USER_CACHE_MAX_ENTRIES'],
+            config['USER_CACHE_DIR'], config['CACHE_REDIS_URL'], config['CACHE_KEY_PREFIX'] + 'users:'
+        )
+        if not getattr(Session, '_user_cache_listening', False):
+            event.listen(Session, 'after_flush', _collect_changes)
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_rollback', _after_rollback)
+            Session._user_cache_listening = True
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / total if total else 0.0
+        return stats
+
+    def metric_samples(self):
+        stats = self.stats()
+        return [
+            ("user_cache_requests_total", "User loader cache lookups.", "counter", {"result": "hit"}, stats['hits']),
+            ("user_cache_requests_total", "User loader cache lookups.", "counter", {"result": "miss"}, stats['misses']),
+            ("user_cache_hit_ratio", "Share of user loads served from the cache.", "gauge", {}, round(stats['hit_rate'], 4)),
+            ("user_cache_invalidations_total", "Users dropped after a commit changed them.", "counter", {}, stats['invalidations']),
+        ]
+
+    def load(self, user_id):
+        if not self.enabled:
+            return db.session.get(User, user_id)
+        key = f'user:{user_id}'
+        try:
+            data = self.backend.get(key)
+        except Exception as e:
+            self._count('errors')
+            self.app.logger.warning(f"User cache unavailable: {e}")
+            return db.session.get(User, user_id)
+
+        if data is not None:
+            self._count('hits')
+            user = User(**json.loads(data))
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+        self._count('misses')
+        user = db.session.get(User, user_id)
+        if user is not None:
+            try:
+                self.backend.set(key, json.dumps({c: getattr(user, c) for c in CACHED_COLUMNS}),
+                                 self.app.config['USER_CACHE_TTL'])
+            except Exception as e:
+                self._count('errors')
+                self.app.logger.warning(f"Could not cache user {user_id}: {e}")
+        return user
+
+    def invalidate(self, *user_ids):
+        if not self.enabled:
+            return
+        for user_id in user_ids:
+            try:
+                self.backend.delete(f'user:{user_id}')
+            except Exception as e:
+                self._count('errors')
+                self.app.logger.error(f"Could not drop cached user {user_id}: {e}")
+        self._count('invalidations', len(user_ids))
+
+
+user_cache = UserCache()
+
+
+def _collect_changes(session, flush_context):
+    # password changes, renames and deletions
+    changed = {obj.id for obj in session.dirty if isinstance(obj, User) and session.is_modified(obj)}
+    changed.update(obj.id for obj in session.deleted if isinstance(obj, User))
+    if changed:
+        session.info.setdefault(PENDING_KEY, set()).update(changed)
+
+
+def _after_commit(session):
+    user_ids = session.info.pop(PENDING_KEY, None)
+    if user_ids:
+        user_cache.invalidate(*sorted(user_ids))
+
+
+def _after_rollback(session):
+    session.info.pop(PENDING_KEY, None)
@@ -1,90 +1,155 @@
 import os
-import fitz  
 from flask import current_app
-import google.generativeai as genai
+from metrics import timed
+from models import CourseDocument
+from summary_cache import summary_cache, sha256_file, sha256_text, summary_key
+from summarizer import (
+    SUMMARY_MODEL_NAME, SUMMARY_MAX_CHARS, SUMMARY_PROMPT, GENERATION_CONFIG, SAFETY_SETTINGS,
+    SummarizationError, CircuitOpenError, map_reduce_summarize
+)
 
-def extract_text_from_pdf(pdf_path):
-    """Extracts all text from a PDF file."""
+
+def iter_pdf_pages(pdf_path, start=0, stop=None):
+    """Yields the text of each page in [start, stop); only one page is held in memory at a time."""
+    import fitz  # PyMuPDF takes a noticeable part of start-up; only job workers need it
+    with fitz.open(pdf_path) as doc:
+        stop = len(doc) if stop is None else min(stop, len(doc))
+        for page_num in range(start, stop):
+            yield doc.load_page(page_num).get_text("text")
+
+
+def _extract_page_range(args):
+    pdf_path, start, stop = args
+    return "".join(iter_pdf_pages(pdf_path, start, stop))
+
+
+def iter_pdf_text(pdf_path, processes=0, min_pages_per_process=50):
+    """
+    Yields page texts in document order. With processes > 1 the document is split
+    into page ranges that are extracted in a process pool; ranges are yielded as
+    they complete in order, so a consumer that stops early cancels the rest.
+    """
+    page_count = 0
+    if processes > 1:
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+    if page_count < 2 * min_pages_per_process:
+        yield from iter_pdf_pages(pdf_path)
+        return
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    workers = min(processes, page_count // min_pages_per_process)
+    # several ranges per worker keep the pool busy and make early exit cheaper
+    step = max(min_pages_per_process, -(-page_count // (workers * 4)))
+    ranges = [(pdf_path, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    # not fork: other job worker threads may hold the logging or connection pool locks
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'))
+    try:
+        yield from executor.map(_extract_page_range, ranges)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@timed('pdf_extract')
+def extract_text_from_pdf(pdf_path, max_chars=None, processes=0):
+    """
+    Extracts text from a PDF file. Stops reading pages once max_chars characters
+    have been collected (the result is cut to exactly max_chars).
+    """
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text += page.get_text("text")
-        doc.close()
-        return text
+        parts = []
+        total = 0
+        for page_text in iter_pdf_text(pdf_path, processes=processes):
+            parts.append(page_text)
+            total += len(page_text)
+            if max_chars is not None and total >= max_chars:
+                break
+        text = "".join(parts)
+        return text[:max_chars] if max_chars is not None else text
     except Exception as e:
         current_app.logger.error(f"Error extracting text from PDF {pdf_path}: {e}")
         return None
 
-def summarize_text_with_google_ai(text_content, model_name="gemma-3-27b-it"): 
-    """Summarizes text using the Google Generative AI API."""
-    api_key = current_app.config.get("GOOGLE_API_KEY")
-    if not api_key:
-        current_app.logger.error("Google API key not configured.")
-        return "Error: Google API key not configured. Please set it in your environment variables."
+@timed('summarize')
+def summarize_text_with_google_ai(text_content, model_name=SUMMARY_MODEL_NAME, backend=None): 
+    """
+    Summarizes text using the Google Generative AI API (or the given backend).
+    Text longer than one chunk is summarized with map-reduce when SUMMARY_MODE is
+    'map_reduce'; in 'truncate' mode only the first SUMMARY_MAX_CHARS are used.
+    """
+    if backend is None and current_app.config.get("SUMMARIZER_BACKEND") == "gemini":
+        api_key = current_app.config.get("GOOGLE_API_KEY")
+        if not api_key:
+            current_app.logger.error("Google API key not configured.")
+            return "Error: Google API key not configured. Please set it in your environment variables."
 
     if not text_content:
         current_app.logger.warning("No text content provided for summarization.")
         return None
 
-    genai.configure(api_key=api_key)
-
-    
-    generation_config = {
-        "temperature": 0.3,
-        "top_p": 1.0,
-        "top_k": 32,  
-        "max_output_tokens": 300,
-    }
-    safety_settings = [ 
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-    ]
-
     try:
-        model = genai.GenerativeModel(
-            model_name=model_name,
-            generation_config=generation_config,
-            safety_settings=safety_settings
-        )
+        if backend is None:
+            backend = current_app.extensions["summarizer"].backend(model_name)
+
+        if current_app.config.get("SUMMARY_MODE") == "map_reduce" and len(text_content) > current_app.config["SUMMARY_CHUNK_CHARS"]:
+            current_app.logger.info(f"Summarizing {len(text_content)} characters with map-reduce.")
+            return map_reduce_summarize(text_content, backend, model_name, summary_params())
 
-        max_chars = 15000
+        max_chars = SUMMARY_MAX_CHARS
         if len(text_content) > max_chars:
             text_content = text_content[:max_chars]
             current_app.logger.info(f"Text content truncated to {max_chars} characters for Google AI summarization.")
 
-        prompt = f"Please provide a concise summary (around 150-200 words), do not include preambule like 'here is your summary' for the following document content:\n\n{text_content}"
-
-        response = model.generate_content(prompt)
-        
-        if response.parts:
-            summary = "".join(part.text for part in response.parts)
-        elif hasattr(response, 'text'):
-             summary = response.text
-        else:
+        prompt = SUMMARY_PROMPT.format(text=text_content)
+        return backend.generate(prompt).strip()
 
-            current_app.logger.warning(f"Could not directly access text from Google AI response. Full response: {response.prompt_feedback}") 
-            if response.candidates and response.candidates[0].content.parts:
-                summary = "".join(part.text for part in response.candidates[0].content.parts)
-            else:
-                summary = "Error: Could not extract summary from Google AI response."
+    except (SummarizationError, CircuitOpenError) as e:
+        current_app.logger.error(str(e))
+        return f"Error: {e}"
+    except Exception as e:
+        current_app.logger.error(f"Error during Google AI summarization: {e}")
+        return f"Error: An issue occurred while generating the summary with Google AI: {str(e)}"
 
-        if response.prompt_feedback and response.prompt_feedback.block_reason:
-            block_reason_message = f"Content generation blocked. Reason: {response.prompt_feedback.block_reason}."
-            if response.prompt_feedback.safety_ratings:
-                block_reason_message += f" Safety Ratings: {response.prompt_feedback.safety_ratings}"
-            current_app.logger.error(block_reason_message)
-            return f"Error: {block_reason_message}"
 
+def get_pdf_text(full_pdf_path, max_chars=None, file_sha256=None):
+    """Extracts text from a PDF through the extracted-text cache, keyed by the file's SHA-256."""
+    file_sha256 = file_sha256 or sha256_file(full_pdf_path)
+    extracted_text = summary_cache.get_text(file_sha256, max_chars)
+    if extracted_text is not None:
+        current_app.logger.info(f"Using cached text for {full_pdf_path}.")
+        return extracted_text
+
+    current_app.logger.info(f"Extracting text from: {full_pdf_path}.")
+    extracted_text = extract_text_from_pdf(
+        full_pdf_path,
+        max_chars=max_chars,
+        processes=current_app.config.get('PDF_EXTRACT_PROCESSES', 0)
+    )
+    if extracted_text:
+        complete = max_chars is None or len(extracted_text) < max_chars
+        summary_cache.put_text(file_sha256, extracted_text, complete)
+    return extracted_text
+
+
+def summary_params():
+    """Everything besides the text and model name that changes the summary; part of the cache key."""
+    return {
+        "generation_config": GENERATION_CONFIG,
+        "safety_settings": SAFETY_SETTINGS,
+        "prompt": SUMMARY_PROMPT,
+        "max_chars": SUMMARY_MAX_CHARS,
+        "mode": current_app.config.get("SUMMARY_MODE"),
+        "chunk_chars": current_app.config.get("SUMMARY_CHUNK_CHARS"),
+        "chunk_overlap": current_app.config.get("SUMMARY_CHUNK_OVERLAP"),
+    }
 
-        return summary.strip()
 
-    except Exception as e:
-        current_app.logger.error(f"Error during Google AI summarization: {e}")
-        return f"Error: An issue occurred while generating the summary with Google AI: {str(e)}"
+def material_sha256(course):
+    """SHA-256 of the course's material when it is in the blob store (legacy uploads return None)."""
+    blob = getattr(course, 'material_blob', None)
+    return blob.sha256 if blob is not None else None
 
 
 def generate_and_store_summary_for_course(course, material_filename):
@@ -107,12 +172,23 @@ def generate_and_store_summary_for_course(course, material_filename):
         course.material_summary = "Error: PDF file not found for summarization."
         return False
 
-    current_app.logger.info(f"Extracting text from: {full_pdf_path} for course ID {getattr(course, 'id', 'None')}.")
-    extracted_text = extract_text_from_pdf(full_pdf_path)
+    max_chars = current_app.config.get('PDF_EXTRACT_MAX_CHARS')
+    if current_app.config.get('SUMMARY_MODE') != 'map_reduce':
+        # only the first SUMMARY_MAX_CHARS are sent to the model
+        max_chars = min(max_chars or SUMMARY_MAX_CHARS, SUMMARY_MAX_CHARS)
+    extracted_text = get_pdf_text(full_pdf_path, max_chars, material_sha256(course))
 
     if extracted_text:
-        current_app.logger.info(f"Text extracted (length: {len(extracted_text)}). Summarizing with Google AI for course ID {getattr(course, 'id', 'None')}...")
-        summary = summarize_text_with_google_ai(extracted_text) 
+        text_sha256 = sha256_text(extracted_text)
+        cache_key = summary_key(text_sha256, SUMMARY_MODEL_NAME, summary_params())
+        summary = summary_cache.get_summary(cache_key)
+        if summary is not None:
+            current_app.logger.info(f"Summary cache hit for course ID {getattr(course, 'id', 'None')}.")
+        else:
+            current_app.logger.info(f"Text extracted (length: {len(extracted_text)}). Summarizing with Google AI for course ID {getattr(course, 'id', 'None')}...")
+            summary = summarize_text_with_google_ai(extracted_text) 
+            if summary and not summary.startswith("Error:"):
+                summary_cache.put_summary(cache_key, text_sha256, SUMMARY_MODEL_NAME, summary)
         if summary and not summary.startswith("Error:"):
             course.material_summary = summary
             current_app.logger.info(f"Google AI summary generated and set for course ID {getattr(course, 'id', 'None')}.")
@@ -125,3 +201,31 @@ def generate_and_store_summary_for_course(course, material_filename):
         course.material_summary = "Error: Failed to extract text from PDF."
         current_app.logger.error(f"Text extraction failed for PDF: {full_pdf_path} (Course ID: {getattr(course, 'id', 'None')}).")
         return False
+
+
+def summarize_course_material(course):
+    """Job handler for the 'summary' queue: summarizes the course's current material."""
+    return generate_and_store_summary_for_course(course, course.material_path)
+
+
+def index_course_material(course):
+    """Job handler for the 'index' queue: stores the course's title and material text for search."""
+    document = course.document or CourseDocument(course_id=course.id)
+    document.title = course.title
+    body = ''
+    filename = course.material_path
+    if filename and filename.lower().endswith(('.pdf', '.txt')):
+        upload_folder_abs = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+        full_path = os.path.join(upload_folder_abs, filename)
+        max_chars = current_app.config.get('PDF_EXTRACT_MAX_CHARS')
+        if not os.path.exists(full_path):
+            current_app.logger.error(f"Material not found at {full_path} for indexing (Course ID: {course.id}).")
+        elif filename.lower().endswith('.pdf'):
+            body = get_pdf_text(full_path, max_chars, material_sha256(course)) or ''
+        else:
+            with open(full_path, encoding='utf-8', errors='replace') as f:
+                body = f.read(max_chars) if max_chars else f.read()
+    document.body = body
+    course.document = document
+    current_app.logger.info(f"Indexed {len(body)} characters of material for course ID {course.id}.")
+    return True